@@ -7,23 +7,42 @@
 #
 # Adapted from: https://raw.githubusercontent.com/yeyu2/Youtube_demos/main/panel_autogen2.py
 #
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import panel as pn
 import asyncio
 import json
 import logging
+import os
+import time
+
+from metrics import REGISTRY, start_http_server
 
 # >>>>>> Constants <<<<<<<
 OPENING_PROMPT = "Send a message!"  # Set to your desired opening prompt.
 LOGGING_LEVEL = logging.DEBUG  # options: logging.DEBUG, logging.INFO
+METRICS_PORT = int(os.environ.get("AUTOGEN_METRICS_PORT", "9464"))  # Prometheus endpoint port, 0 disables it.
 
 logging.basicConfig()
 log = logging.getLogger(__name__)
 log.setLevel(LOGGING_LEVEL)
 
-input_future = None
-initiate_chat_task_created = False
+# >>>>>> Metrics (shared by all sessions of the server process) <<<<<<<
+SESSIONS_ACTIVE = REGISTRY.gauge("autogen_gui_sessions_active", "Open chat sessions.")
+SESSIONS_TOTAL = REGISTRY.counter("autogen_gui_sessions_total", "Chat sessions opened.")
+CHATS_ACTIVE = REGISTRY.gauge("autogen_gui_chats_active", "Running initiate_chat tasks.")
+INPUT_WAITS_PENDING = REGISTRY.gauge("autogen_gui_input_waits_pending", "Agents awaiting human input.")
+INPUT_WAIT_SECONDS = REGISTRY.histogram("autogen_gui_input_wait_seconds", "Time agents waited for human input.")
+USER_MESSAGES = REGISTRY.counter(
+    "autogen_gui_user_messages_total", "Messages typed by the user, by what they did.", ["outcome"]
+)
+MESSAGES = REGISTRY.counter("autogen_messages_total", "Agent messages shown in the chat.", ["sender"])
+REPLIES_PENDING = REGISTRY.gauge("autogen_replies_pending", "Agents generating a reply.")
+REPLY_SECONDS = REGISTRY.histogram(
+    "autogen_reply_seconds", "Time from an agent starting a reply to sending it (LLM latency).", ["agent"]
+)
+LLM_TOKENS = REGISTRY.counter("autogen_llm_tokens_total", "LLM tokens used.", ["model", "type"])
+LLM_COST = REGISTRY.counter("autogen_llm_cost_total", "LLM cost (USD) as estimated by AutoGen.", ["model"])
 
 
 @dataclass
@@ -34,6 +53,10 @@ class AutoGenChatView:
     """
 
     initiate_chat_fn: callable = None
+    # Per session state: `panel serve` runs the app once per browser session in a single process.
+    input_future: asyncio.Future = field(default=None, init=False, repr=False)
+    initiate_chat_task: asyncio.Task = field(default=None, init=False, repr=False)
+    reply_started: dict = field(default_factory=dict, init=False, repr=False)  # agent name -> perf_counter()
 
     def __post_init__(self):
         pn.extension(design="material")
@@ -41,37 +64,80 @@ class AutoGenChatView:
         self.chat_interface.send(OPENING_PROMPT, user="System", respond=False)
         self.chat_interface.servable()
 
+        if METRICS_PORT:
+            start_http_server(METRICS_PORT)
+        SESSIONS_TOTAL.inc()
+        SESSIONS_ACTIVE.inc()
+        if pn.state.curdoc is not None:
+            pn.state.on_session_destroyed(self.on_session_destroyed)
+
+    def on_session_destroyed(self, session_context):
+        SESSIONS_ACTIVE.dec()
+        REPLIES_PENDING.dec(len(self.reply_started))
+        self.reply_started.clear()
+        if self.initiate_chat_task is not None and not self.initiate_chat_task.done():
+            self.initiate_chat_task.cancel()
+
     async def a_get_human_input(self, prompt: str) -> str:
-        global input_future
         print("\n>>>>>>>> Awaiting human input <<<<<<<<")
         self.chat_interface.send(prompt, user="System", respond=False)
         # Create a new Future object for this input operation if none exists
-        if input_future is None or input_future.done():
-            input_future = asyncio.Future()
+        if self.input_future is None or self.input_future.done():
+            self.input_future = asyncio.Future()
 
         # Wait for the callback to set a result on the future
-        await input_future
+        INPUT_WAITS_PENDING.inc()
+        start = time.perf_counter()
+        try:
+            await self.input_future
+        finally:
+            INPUT_WAITS_PENDING.dec()
+            INPUT_WAIT_SECONDS.observe(time.perf_counter() - start)
 
         # Once the result is set, extract the value and reset the future for the next input operation
-        input_value = input_future.result()
-        input_future = None
+        input_value = self.input_future.result()
+        self.input_future = None
         log.debug(f"MyConversableAgent.a_get_human_input returning: '{input_value}'")
         return input_value
 
     async def callback(self, contents: str, user: str, instance: pn.chat.ChatInterface):
-        global initiate_chat_task_created
-        global input_future
-
-        if not initiate_chat_task_created:
-            asyncio.create_task(self.initiate_chat_fn(contents))
-            initiate_chat_task_created = True
+        if self.initiate_chat_task is None:
+            USER_MESSAGES.inc(outcome="started_chat")
+            CHATS_ACTIVE.inc()
+            self.initiate_chat_task = asyncio.create_task(self.initiate_chat_fn(contents))
+            self.initiate_chat_task.add_done_callback(lambda task: CHATS_ACTIVE.dec())
         else:
-            if input_future and not input_future.done():
-                input_future.set_result(contents)
+            if self.input_future and not self.input_future.done():
+                USER_MESSAGES.inc(outcome="answered")
+                self.input_future.set_result(contents)
             else:
+                USER_MESSAGES.inc(outcome="ignored")
                 print("There is currently no input being awaited.")
 
-    def print_messages(self, recipient, messages, sender, avatar, total_usage:str=None):
+    def on_message_sent(self, sender, message, recipient, silent):
+        """Hook for an agent's outgoing messages ("process_message_before_send"): ends the sender's reply timing."""
+        start = self.reply_started.pop(sender.name, None)
+        if start is not None:
+            REPLIES_PENDING.dec()
+            REPLY_SECONDS.observe(time.perf_counter() - start, agent=sender.name)
+        return message
+
+    def on_usage(self, delta: dict):
+        """Listener for a UsageLedger: counts one completion's tokens and cost (see usage_ledger.py)."""
+        for kind in ("prompt", "completion"):
+            if delta[f"{kind}_tokens"]:
+                LLM_TOKENS.inc(delta[f"{kind}_tokens"], model=delta["model"], type=kind)
+        if delta["cost"]:
+            LLM_COST.inc(delta["cost"], model=delta["model"])
+        log.debug(f"Usage: {delta['agent']} used {delta['total_tokens']} tokens of {delta['model']}")
+
+    def print_messages(self, recipient, messages, sender, avatar, total_usage:dict=None):
+        # Called when recipient starts its reply to messages: time it until on_message_sent().
+        if recipient.name not in self.reply_started:
+            REPLIES_PENDING.inc()
+        self.reply_started[recipient.name] = time.perf_counter()
+        MESSAGES.inc(sender=sender.name)
+
         if LOGGING_LEVEL == logging.DEBUG:
             print(f"Messages from: {sender.name} sent to: {recipient.name} | num messages: {len(messages)} | message: {json.dumps(messages[-1], indent=4)}")
         else:
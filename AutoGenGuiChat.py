@@ -13,6 +13,9 @@ from typing import Tuple, Dict
 
 import asyncio
 import logging
+import uuid
+
+from usage_ledger import UsageLedger
 
 logging.basicConfig()
 LOGGING_LEVEL = logging.DEBUG  # options: logging.INFO, logging.DEBUG
@@ -31,6 +34,8 @@ gpt4_config = {"config_list": config_list, "temperature": 0, "cache_seed": None}
 user_proxy = None
 manager = None
 avatar = None
+usage_ledger = UsageLedger()  # this script runs once per browser session
+session_id = uuid.uuid4().hex[:8]
 
 
 class MyConversableAgent(autogen.ConversableAgent):
@@ -40,10 +45,14 @@ class MyConversableAgent(autogen.ConversableAgent):
 
 def print_messages(recipient, messages, sender, config):
     return autogen_chat_view.print_messages(
-        recipient, messages, sender, avatar, total_usage=manager.get_total_usage()
+        recipient, messages, sender, avatar, total_usage=usage_ledger.total(session=session_id).as_dict()
     )
 
 
+def on_message_sent(sender, message, recipient, silent):
+    return autogen_chat_view.on_message_sent(sender, message, recipient, silent)
+
+
 def build_autogen_flow() -> (
     Tuple[autogen.ConversableAgent, autogen.ConversableAgent, Dict]
 ):
@@ -85,6 +94,10 @@ def build_autogen_flow() -> (
         code_execution_config=False,
     )
 
+    # count every completion once, as it happens:
+    for agent in agents + [manager]:
+        usage_ledger.track_agent(agent, session=session_id)
+
     # register replies callback:
     for agent in agents:
         agent.register_reply(
@@ -92,6 +105,9 @@ def build_autogen_flow() -> (
             reply_func=print_messages,
             config={"callback": None},
         )
+        # time replies for the metrics endpoint (hookable methods need a recent pyautogen):
+        if "process_message_before_send" in getattr(agent, "hook_lists", {}):
+            agent.register_hook("process_message_before_send", on_message_sent)
 
     return user_proxy, manager, avatar
 
@@ -104,3 +120,4 @@ async def delayed_initiate_chat(message):
     await user_proxy.a_initiate_chat(manager, message=message)  # Now initiate the chat
 
 autogen_chat_view = AutoGenChatView(initiate_chat_fn=delayed_initiate_chat)
+usage_ledger.subscribe(autogen_chat_view.on_usage)
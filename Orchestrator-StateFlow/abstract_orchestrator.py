@@ -37,6 +37,23 @@ class AbstractOrchestrator(ABC):
     def _broadcast_next_step_and_request_reply(self, next_prompt, next_speaker):
         pass
 
+    @abstractmethod
+    def _broadcast_next_steps_and_request_replies(self, assignments: List[Dict]):
+        """Fan-out variant of _broadcast_next_step_and_request_reply(). Each assignment is a Dict with
+        "speaker" and "instruction" keys."""
+        pass
+
+    @abstractmethod
+    def _select_team(self, context: Dict):
+        """Updates METADATA["team"] and ["names"] to the team members relevant to the next step (if the team is
+        too large to list in full)."""
+        pass
+
+    @abstractmethod
+    def _update_running_summary(self, context: Dict):
+        """Updates context["running_summary"], the rolling "answer so far", with the newest messages."""
+        pass
+
     @abstractmethod
     def _prepare_new_facts_and_plan(self, facts, sender: Optional[Agent], team):
         """Returns tuple as facts, plan"""
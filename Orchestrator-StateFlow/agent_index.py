@@ -0,0 +1,37 @@
+# agent_index.py -- Retrieval of the team members relevant to a task, so prompts list k agents instead of the whole team.
+#
+# Design Notes:
+#   * Agents are indexed by "name: description" with TF-IDF weighted hashed vectors (see text_vectors.py); the
+#       index is built once per session, in well under a millisecond per agent.
+#   * Orchestrator(team_top_k=k) re-ranks the team at every OBTAIN_NEXTSTEP against the task, plan and latest
+#       messages, and lists only the top k in METADATA["team"] / ["names"]. The orchestrator can ask for more
+#       (the "need_other_team_members" step criterion), which doubles k for the rest of the session.
+#   * All agents still receive the broadcast messages; only the prompts shrink.
+#
+# Usage:
+#   index = AgentIndex(agents)
+#   index.top_k("Find the 2023 revenue of ACME on the web", k=5, include=["assistant"])
+
+from typing import Iterable, List, Optional
+
+from autogen import ConversableAgent
+from text_vectors import HashingVectorizer, TfidfIndex
+
+
+class AgentIndex:
+    """TF-IDF index over the names and descriptions of agents."""
+
+    def __init__(self, agents: List[ConversableAgent], vectorizer: Optional[HashingVectorizer] = None):
+        self.agents = list(agents)
+        self._index = TfidfIndex([f"{a.name}: {a.description}" for a in self.agents], vectorizer)
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+    def top_k(self, query: str, k: int, include: Iterable[str] = ()) -> List[ConversableAgent]:
+        """The k agents most relevant to query, plus the agents named in include, in team order."""
+        if k >= len(self.agents):
+            return list(self.agents)
+        include = set(include)
+        selected = set(self._index.top_k(query, k))
+        return [a for i, a in enumerate(self.agents) if i in selected or a.name in include]
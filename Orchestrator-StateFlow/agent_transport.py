@@ -0,0 +1,604 @@
+# agent_transport.py -- Hosts team members in worker processes, so a CPU-heavy agent (web_surfer's page
+#   conversions, computer_terminal's code) doesn't hold the GIL of the Orchestrator and the rest of the team.
+#
+# Design Notes:
+#   * RemoteAgentProxy is a ConversableAgent standing in for an agent hosted elsewhere, so the Orchestrator's
+#       send()/_broadcast()/generate_reply() calls (and checkpoint/resume, which read and write _oai_messages)
+#       work unchanged. The proxy keeps the conversation histories locally, like any agent; generate_reply()
+#       ships the part of the history with the requesting sender that the host hasn't seen yet, and the host
+#       generates the reply with the real agent. reset() and clear_history() are forwarded too.
+#   * What the host has seen is tracked per history list: every list stored in the proxy's _oai_messages (eg. by
+#       resume() or clear_history()) gets a new epoch, and a history whose epoch changed is resent in full.
+#   * Message hooks (process_last_received_message, process_all_messages_before_reply) run on the proxy, like
+#       send()'s process_message_before_send: the processed messages are shipped with the call. Only
+#       update_agent_state hooks are registered on the host, and only importable functions can be sent there.
+#   * A transport carries the calls: transport.call(agent_name, op, **args) -> result. Two are provided:
+#       - QueueTransport: one worker process per agent, talking over multiprocessing queues.
+#       - BrokerTransport: talks to an AgentBroker, a TCP message bus (multiprocessing.connection) that routes
+#         calls to agent hosts by name. Hosts can run on other nodes: python agent_transport.py host ...
+#         If a host disconnects, the broker fails the calls it had routed to it, as QueueTransport does when a
+#         worker dies.
+#   * Agents are built in their worker by a factory (a module-level function, so it can be pickled); a
+#       browser or code executor never crosses the process boundary, only messages and replies do.
+#   * Workers are started with the "spawn" method by default: forking the multi-threaded orchestrator is unsafe.
+#   * Broker connections are authenticated with authkey (HMAC), but not encrypted: keep the broker on a
+#       trusted network.
+#
+# Usage:
+#   def make_web_surfer():   # in an importable module (eg. orchestrator_testbed.make_web_surfer)
+#       return WebSurferAgent("web_surfer", ...)
+#
+#   transport = QueueTransport()
+#   web_surfer = transport.start_agent(make_web_surfer)
+#   maestro = Orchestrator("orchestrator", agents=[assistant, user_proxy, web_surfer], ...)
+#   ...
+#   transport.close()
+#
+#   # Across nodes:
+#   python agent_transport.py broker --port 7070 --authkey secret
+#   python agent_transport.py host --broker broker-host:7070 --authkey secret --factory my_team:make_web_surfer
+#   transport = BrokerTransport(("broker-host", 7070), authkey=b"secret")
+#   web_surfer = transport.proxy("web_surfer")
+
+import argparse
+import asyncio
+import functools
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+from collections import defaultdict
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from autogen import Agent, ConversableAgent
+
+log = logging.getLogger(__name__)
+
+# How often a caller waiting on a QueueTransport reply checks that the worker is still alive (seconds).
+_LIVENESS_POLL = 1.0
+
+# Hookable methods the proxy runs itself; hooks of the other hookable methods are registered on the host.
+_MESSAGE_HOOKS = ("process_last_received_message", "process_all_messages_before_reply")
+_LOCAL_HOOKS = _MESSAGE_HOOKS + ("process_message_before_send",)
+
+
+class RemoteAgentError(RuntimeError):
+    """The hosted agent raised an error, or its worker went away."""
+
+
+################################################################################
+# Hosting side
+
+class AgentHost:
+    """Executes transport calls on a real agent. Senders are represented by stub agents of the same name."""
+
+    def __init__(self, agent: ConversableAgent):
+        self.agent = agent
+        self._peers: Dict[str, ConversableAgent] = {}
+
+    def _peer(self, name: str) -> ConversableAgent:
+        peer = self._peers.get(name)
+        if peer is None:
+            peer = self._peers[name] = ConversableAgent(
+                name, llm_config=False, code_execution_config=False, human_input_mode="NEVER"
+            )
+        return peer
+
+    def handle(self, op: str, args: Dict[str, Any]) -> Any:
+        agent = self.agent
+        if op == "describe":
+            return {"name": agent.name, "description": agent.description}
+        if op == "generate_reply":
+            sender = self._peer(args["sender"])
+            history = agent._oai_messages.setdefault(sender, [])
+            del history[args["history_start"]:]
+            history.extend(args["history"])
+            return agent.generate_reply(messages=args.get("messages"), sender=sender)
+        if op == "reset":
+            agent.reset()
+            return None
+        if op == "clear_history":
+            agent.clear_history(self._peer(args["recipient"]) if args.get("recipient") else None)
+            return None
+        if op == "register_hook":
+            hooks = agent.hook_lists.get(args["hookable_method"], [])
+            if args["hook"] not in hooks:
+                agent.register_hook(args["hookable_method"], args["hook"])
+            return None
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"Unknown operation {op!r}")
+
+    def serve(self, receive: Callable[[], Any], send: Callable[[Any], None]):
+        """Handles (call_id, op, args) requests until a "stop" op or EOF; replies (call_id, ok, result)."""
+        while True:
+            try:
+                call_id, op, args = receive()
+            except (EOFError, OSError):
+                return
+            if op == "stop":
+                send((call_id, True, None))
+                return
+            try:
+                send((call_id, True, self.handle(op, args)))
+            except Exception as e:
+                send((call_id, False, f"{type(e).__name__}: {e}\n{traceback.format_exc()}"))
+
+
+def _build_agent(factory: Callable[..., ConversableAgent], factory_args: Tuple) -> AgentHost:
+    return AgentHost(factory(*factory_args))
+
+
+def _queue_worker(factory, factory_args, requests: multiprocessing.Queue, replies: multiprocessing.Queue):
+    try:
+        host = _build_agent(factory, factory_args)
+    except Exception as e:
+        replies.put((0, False, f"Building the agent failed: {type(e).__name__}: {e}\n{traceback.format_exc()}"))
+        return
+    replies.put((0, True, host.handle("describe", {})))
+    host.serve(requests.get, replies.put)
+
+
+def serve_agent_via_broker(address: Tuple[str, int], authkey: bytes, factory, factory_args: Tuple = (), ready=None):
+    """Builds an agent and serves it through the broker at address until the broker goes away. If given, ready
+    (a queue) gets (True, agent name) once the agent is connected, or (False, error)."""
+    try:
+        host = _build_agent(factory, factory_args)
+    except Exception as e:
+        if ready is None:
+            raise
+        ready.put((False, f"Building the agent failed: {type(e).__name__}: {e}\n{traceback.format_exc()}"))
+        return
+    try:
+        conn = Client(address, authkey=authkey)
+        conn.send(("host", host.agent.name, host.agent.description))
+    except Exception as e:  # Eg. a wrong authkey or an unreachable broker
+        if ready is None:
+            raise
+        ready.put((False, f"Connecting to the broker at {address} failed: {type(e).__name__}: {e}"))
+        return
+    if ready is not None:
+        ready.put((True, host.agent.name))
+    host.serve(conn.recv, conn.send)
+    conn.close()
+
+
+################################################################################
+# Calling side
+
+class _Histories(defaultdict):
+    """An agent's _oai_messages that gives every history list stored in it a new epoch."""
+
+    _epochs = itertools.count(1)
+
+    def __init__(self, histories: Dict):
+        super().__init__(list, histories)
+        self.epochs: Dict[Agent, int] = {key: next(self._epochs) for key in self}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.epochs[key] = next(self._epochs)
+
+
+class RemoteAgentProxy(ConversableAgent):
+    """Local stand-in for an agent hosted by transport under name (see the Design Notes)."""
+
+    def __init__(self, name: str, transport: "AgentTransport", description: Optional[str] = None):
+        self.transport = transport
+        self._synced: Dict[Agent, Tuple[int, int]] = {}  # sender -> (epoch of the history, messages the host has)
+        self._lock = threading.Lock()
+        super().__init__(
+            name, llm_config=False, code_execution_config=False, human_input_mode="NEVER", description=description
+        )
+        self._oai_messages = _Histories(self._oai_messages)
+
+    def generate_reply(self, messages: Optional[List[Dict]] = None, sender: Optional[Agent] = None, **kwargs) -> Any:
+        if sender is None:
+            raise ValueError("RemoteAgentProxy.generate_reply() needs a sender.")
+        with self._lock:
+            history = self._oai_messages[sender]
+            epoch = self._oai_messages.epochs[sender]
+            synced_epoch, synced = self._synced.get(sender, (None, 0))
+            start = synced if synced_epoch == epoch and synced <= len(history) else 0
+            if messages is None and any(self.hook_lists[m] for m in _MESSAGE_HOOKS):
+                messages = history
+            if messages is not None:
+                # As ConversableAgent.generate_reply() would, but here: the hooks needn't be importable. The last
+                # message is copied, since process_last_received_message() rewrites its content in place.
+                messages = [*messages[:-1], dict(messages[-1])] if messages else list(messages)
+                messages = self.process_last_received_message(messages)
+                messages = self.process_all_messages_before_reply(messages)
+            reply = self.transport.call(
+                self.name,
+                "generate_reply",
+                sender=sender.name,
+                history_start=start,
+                history=list(history[start:]),
+                messages=list(messages) if messages is not None else None,
+            )
+            self._synced[sender] = (epoch, len(history))
+            return reply
+
+    async def a_generate_reply(self, messages: Optional[List[Dict]] = None, sender: Optional[Agent] = None, **kwargs) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.generate_reply, messages=messages, sender=sender)
+        )
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self._synced.clear()
+            self.transport.call(self.name, "reset")
+
+    def clear_history(self, recipient: Optional[Agent] = None, nr_messages_to_preserve: Optional[int] = None):
+        super().clear_history(recipient, nr_messages_to_preserve)
+        with self._lock:
+            if recipient is None:
+                self._synced.clear()
+            else:
+                self._synced.pop(recipient, None)
+            # The next generate_reply() resends what is left of the history.
+            self.transport.call(self.name, "clear_history", recipient=recipient.name if recipient else None)
+
+    def register_hook(self, hookable_method: str, hook: Callable):
+        super().register_hook(hookable_method, hook)
+        if hookable_method in _LOCAL_HOOKS:
+            return
+        try:
+            self.transport.call(self.name, "register_hook", hookable_method=hookable_method, hook=hook)
+        except Exception as e:
+            log.warning(f"Hook {hook!r} not registered on the host of {self.name}: {e}")
+
+
+class AgentTransport:
+    """Carries calls to hosted agents."""
+
+    def call(self, agent_name: str, op: str, **args) -> Any:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class QueueTransport(AgentTransport):
+    """Hosts each agent in its own worker process, talking over multiprocessing queues. Args:
+    - start_method: multiprocessing start method for the workers
+    - timeout: seconds to wait for any one call (None = no limit)
+    """
+
+    def __init__(self, start_method: str = "spawn", timeout: Optional[float] = None):
+        self._context = multiprocessing.get_context(start_method)
+        self.timeout = timeout
+        self._workers: Dict[str, Tuple[Any, Any, Any, threading.Lock]] = {}  # name -> (process, requests, replies, lock)
+        self._call_ids = itertools.count(1)
+
+    def start_agent(self, factory: Callable[..., ConversableAgent], *factory_args) -> RemoteAgentProxy:
+        """Builds factory(*factory_args) in a new worker process. Returns its proxy."""
+        requests, replies = self._context.Queue(), self._context.Queue()
+        process = self._context.Process(
+            target=_queue_worker, args=(factory, factory_args, requests, replies), name="agent_worker", daemon=True
+        )
+        process.start()
+        _, ok, info = self._wait(process, replies, 0)
+        if not ok:
+            process.join(1)
+            raise RemoteAgentError(info)
+        if info["name"] in self._workers:
+            requests.put((0, "stop", {}))
+            raise ValueError(f"An agent named {info['name']} is already hosted.")
+        self._workers[info["name"]] = (process, requests, replies, threading.Lock())
+        return RemoteAgentProxy(info["name"], self, description=info["description"])
+
+    def _wait(self, process, replies, call_id: int):
+        remaining = self.timeout
+        while True:
+            try:
+                reply = replies.get(timeout=_LIVENESS_POLL if remaining is None else min(_LIVENESS_POLL, remaining))
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RemoteAgentError(f"Agent worker {process.pid} exited with code {process.exitcode}.")
+                if remaining is not None:
+                    remaining -= _LIVENESS_POLL
+                    if remaining <= 0:
+                        raise TimeoutError(f"No reply from agent worker {process.pid} within {self.timeout}s.")
+                continue
+            if reply[0] == call_id:
+                return reply
+
+    def call(self, agent_name: str, op: str, **args) -> Any:
+        worker = self._workers.get(agent_name)
+        if worker is None:
+            raise RemoteAgentError(f"No agent named {agent_name} is hosted.")
+        process, requests, replies, lock = worker
+        with lock:
+            call_id = next(self._call_ids)
+            requests.put((call_id, op, args))
+            _, ok, result = self._wait(process, replies, call_id)
+        if not ok:
+            raise RemoteAgentError(f"{agent_name}.{op} failed: {result}")
+        return result
+
+    def close(self):
+        for name, (process, requests, replies, lock) in list(self._workers.items()):
+            try:
+                requests.put((0, "stop", {}))
+                process.join(5)
+            finally:
+                if process.is_alive():
+                    process.terminate()
+        self._workers.clear()
+
+
+class AgentBroker:
+    """TCP message bus routing calls from BrokerTransports to agent hosts by agent name. Args:
+    - address: (host, port) to listen on; port 0 picks a free port (see .address)
+    - authkey: shared secret of the broker, its hosts and its clients
+    """
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), authkey: bytes = b"agent_transport"):
+        self._listener = Listener(address, authkey=authkey)
+        self.authkey = authkey
+        self._hosts: Dict[str, Tuple[Connection, str, threading.Lock]] = {}  # name -> (conn, description, send lock)
+        # (client id, call id) -> (client conn, client send lock, conn of the host the call was sent to)
+        self._pending: Dict[Tuple[int, int], Tuple[Connection, threading.Lock, Connection]] = {}
+        self._lock = threading.Lock()
+        self._client_ids = itertools.count(1)
+        self._closed = False
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._listener.address
+
+    def start(self) -> "AgentBroker":
+        threading.Thread(target=self._accept, name="agent_broker", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._accept()
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+
+    def agents(self) -> Dict[str, str]:
+        with self._lock:
+            return {name: description for name, (_, description, _) in self._hosts.items()}
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                if self._closed:
+                    return
+                log.exception("Agent broker: accepting a connection failed")  # eg. a wrong authkey
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name="agent_broker_conn", daemon=True).start()
+
+    def _serve_connection(self, conn: Connection):
+        try:
+            hello = conn.recv()
+        except (EOFError, OSError):
+            return
+        if hello[0] == "host":
+            self._serve_host(conn, hello[1], hello[2])
+        else:
+            self._serve_client(conn)
+
+    def _serve_host(self, conn: Connection, name: str, description: str):
+        send_lock = threading.Lock()
+        with self._lock:
+            self._hosts[name] = (conn, description, send_lock)
+        try:
+            while True:
+                (client_id, call_id), ok, result = conn.recv()
+                with self._lock:
+                    client = self._pending.pop((client_id, call_id), None)
+                if client is not None:
+                    self._reply(client, call_id, ok, result)
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                if self._hosts.get(name, (None,))[0] is conn:
+                    del self._hosts[name]
+                # Calls the host took but didn't answer would otherwise wait forever.
+                orphans = [(key, client) for key, client in self._pending.items() if client[2] is conn]
+                for key, _ in orphans:
+                    del self._pending[key]
+            for (_, call_id), client in orphans:
+                self._reply(client, call_id, False, f"The host of {name} disconnected.")
+
+    @staticmethod
+    def _reply(client: Tuple[Connection, threading.Lock, Connection], call_id: int, ok: bool, result: Any):
+        client_conn, client_lock, _ = client
+        try:
+            with client_lock:
+                client_conn.send((call_id, ok, result))
+        except (EOFError, OSError):
+            pass  # The client went away
+
+    def _serve_client(self, conn: Connection):
+        client_id = next(self._client_ids)
+        client_lock = threading.Lock()
+        try:
+            while True:
+                call_id, agent_name, op, args = conn.recv()
+                if op == "list_agents":
+                    with client_lock:
+                        conn.send((call_id, True, self.agents()))
+                    continue
+                with self._lock:
+                    host = self._hosts.get(agent_name)
+                    if host is not None:
+                        self._pending[(client_id, call_id)] = (conn, client_lock, host[0])
+                if host is None:
+                    with client_lock:
+                        conn.send((call_id, False, f"No agent named {agent_name} is connected to the broker."))
+                    continue
+                host_conn, _, host_lock = host
+                try:
+                    with host_lock:
+                        host_conn.send(((client_id, call_id), op, args))
+                except (EOFError, OSError):
+                    # The host is going away; unless its connection's cleanup answered the call already, do it here.
+                    with self._lock:
+                        client = self._pending.pop((client_id, call_id), None)
+                    if client is not None:
+                        self._reply(client, call_id, False, f"The host of {agent_name} disconnected.")
+        except (EOFError, OSError):
+            pass
+
+
+class BrokerTransport(AgentTransport):
+    """Calls agents through an AgentBroker. Calls to different agents run concurrently. Args:
+    - address: the broker's (host, port)
+    - authkey: the broker's shared secret
+    - timeout: seconds to wait for any one call (None = no limit)
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes = b"agent_transport", timeout: Optional[float] = None):
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._conn = Client(self.address, authkey=authkey)
+        self._conn.send(("client",))
+        self._send_lock = threading.Lock()
+        self._futures: Dict[int, Future] = {}
+        self._futures_lock = threading.Lock()
+        self._call_ids = itertools.count(1)
+        self._processes: List[Any] = []
+        threading.Thread(target=self._receive, name="broker_transport", daemon=True).start()
+
+    def _receive(self):
+        try:
+            while True:
+                call_id, ok, result = self._conn.recv()
+                with self._futures_lock:
+                    future = self._futures.pop(call_id, None)
+                if future is not None:
+                    future.set_result((ok, result))
+        except (EOFError, OSError):
+            with self._futures_lock:
+                futures, self._futures = list(self._futures.values()), {}
+            for future in futures:
+                future.set_result((False, "The connection to the broker was lost."))
+
+    def _request(self, agent_name: str, op: str, args: Dict[str, Any]) -> Any:
+        call_id = next(self._call_ids)
+        future = Future()
+        with self._futures_lock:
+            self._futures[call_id] = future
+        with self._send_lock:
+            self._conn.send((call_id, agent_name, op, args))
+        ok, result = future.result(self.timeout)
+        if not ok:
+            raise RemoteAgentError(f"{agent_name}.{op} failed: {result}")
+        return result
+
+    def call(self, agent_name: str, op: str, **args) -> Any:
+        return self._request(agent_name, op, args)
+
+    def agents(self) -> Dict[str, str]:
+        """The agents connected to the broker: name -> description."""
+        return self._request("", "list_agents", {})
+
+    def proxy(self, name: str) -> RemoteAgentProxy:
+        """A proxy for an agent already connected to the broker."""
+        description = self.agents().get(name)
+        if description is None:
+            raise RemoteAgentError(f"No agent named {name} is connected to the broker.")
+        return RemoteAgentProxy(name, self, description=description)
+
+    def start_agent(self, factory: Callable[..., ConversableAgent], *factory_args, start_method: str = "spawn") -> RemoteAgentProxy:
+        """Builds factory(*factory_args) in a new local host process connected to the broker. Returns its proxy."""
+        context = multiprocessing.get_context(start_method)
+        ready = context.Queue()
+        process = context.Process(
+            target=serve_agent_via_broker, args=(self.address, self.authkey, factory, factory_args, ready), daemon=True
+        )
+        process.start()
+        remaining = self.timeout
+        while True:
+            try:
+                ok, info = ready.get(timeout=_LIVENESS_POLL if remaining is None else min(_LIVENESS_POLL, remaining))
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RemoteAgentError(f"Agent host {process.pid} exited with code {process.exitcode}.")
+                if remaining is not None:
+                    remaining -= _LIVENESS_POLL
+                    if remaining <= 0:
+                        process.terminate()
+                        raise TimeoutError(f"Agent host {process.pid} not ready within {self.timeout}s.")
+        if not ok:
+            process.join(1)
+            raise RemoteAgentError(info)
+        # The host registers with the broker right after reporting ready: wait until it is routable.
+        for _ in range(100):
+            if info in self.agents():
+                break
+            threading.Event().wait(0.05)
+        self._processes.append(process)
+        return self.proxy(info)
+
+    def close(self):
+        self._conn.close()
+        for process in self._processes:
+            process.terminate()
+            process.join(5)
+        self._processes.clear()
+
+
+def _load_factory(spec: str) -> Callable[..., ConversableAgent]:
+    module_name, _, function_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent broker and agent hosts for agent_transport.BrokerTransport.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    broker = sub.add_parser("broker", help="Run a broker")
+    broker.add_argument("--host", default="127.0.0.1")
+    broker.add_argument("--port", type=int, default=7070)
+    host = sub.add_parser("host", help="Build an agent and serve it through a broker")
+    host.add_argument("--broker", required=True, help="host:port of the broker")
+    host.add_argument("--factory", required=True, help="module:function returning the agent")
+    for p in (broker, host):
+        p.add_argument("--authkey", default=os.environ.get("AGENT_BROKER_AUTHKEY", "agent_transport"))
+    args = parser.parse_args(argv)
+
+    authkey = args.authkey.encode("utf-8")
+    if args.command == "broker":
+        b = AgentBroker((args.host, args.port), authkey=authkey)
+        print(f"Agent broker listening on {b.address[0]}:{b.address[1]}")
+        try:
+            b.serve_forever()
+        except KeyboardInterrupt:
+            b.close()
+    else:
+        sys.path.insert(0, os.getcwd())
+        serve_agent_via_broker(_parse_address(args.broker), authkey, _load_factory(args.factory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# answer_cache.py -- Semantic cache of final answers, so near-duplicate tasks don't run a full orchestration.
+#
+# Design Notes:
+#   * Tasks are embedded locally (default: text_vectors.HashingVectorizer; any embedder(text) -> 1-D vector will do)
+#       into the rows of one NumPy matrix. A lookup is a single matrix-vector product (cosine similarity).
+#   * Two thresholds:
+#       - similarity >= threshold: the stored answer is reused as is (no LLM calls at all)
+#       - similarity >= seed_threshold (opt-in): the new session starts from the stored plan, skipping the planning
+#         LLM call (see DefaultOrchestratorStateFlow), and runs its own turns. Only the plan is reused: it is about
+#         how to go about the task, while the facts are specific to the task and are always analyzed afresh.
+#   * The default embedder is lexical (hashed words and bigrams, no stemming). It cannot tell different entities or
+#       numbers apart: "... albums between 2000 and 2009?" and "... albums between 1990 and 1999?" score about 0.79,
+#       more than some true paraphrases. Keep threshold high with it, or plug in a semantic embedder.
+#   * Entries expire ttl seconds after they were stored. When max_entries entries are stored, the least recently
+#       used one is evicted. Rows of expired or evicted entries are reused.
+#   * Storing a task that is already cached (same text) replaces its entry.
+#   * Thread-safe: one lock, not held while embedding.
+#
+# Usage:
+#   cache = AnswerCache(threshold=0.95, ttl=24 * 3600, max_entries=1000)
+#   runtime = OrchestratorRuntime(maestro, agent_factory=build_agents, answer_cache=cache)
+#   session = runtime.run(task)
+#   runtime.remember(session, prepare_answer(session))
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from text_vectors import HashingVectorizer, normalize
+
+
+@dataclass
+class CachedAnswer:
+    """A stored answer: the task it answered, the answer, and the plan the session ended with."""
+
+    task: str
+    answer: str
+    plan: str = ""
+    created: float = 0.0
+    hits: int = 0
+
+
+@dataclass
+class CacheMatch:
+    """The most similar stored task. If reuse_answer, entry.answer can be returned as is; otherwise seed the
+    session with entry.plan."""
+
+    entry: CachedAnswer
+    similarity: float
+    reuse_answer: bool
+
+
+class AnswerCache:
+    """Nearest-neighbour cache of answers by task similarity. Args:
+    - embedder: embedder(text) returns a 1-D vector (normalized here). Default: HashingVectorizer().embed
+    - threshold: similarity at or above which the stored answer is reused
+    - seed_threshold: similarity at or above which the stored plan is reused (None: never)
+    - ttl: seconds an entry lives (None: forever)
+    - max_entries: the most entries stored; the least recently used entry is evicted beyond it
+    - clock: returns the current time in seconds
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Callable[[str], np.ndarray]] = None,
+        threshold: float = 0.95,
+        seed_threshold: Optional[float] = None,
+        ttl: Optional[float] = 24 * 3600.0,
+        max_entries: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.embedder = embedder if embedder else HashingVectorizer().embed
+        self.threshold = threshold
+        self.seed_threshold = seed_threshold if seed_threshold is not None else threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._vectors: Optional[np.ndarray] = None   # One row per slot; allocated on the first put()
+        self._expires = np.empty(0)                  # Expiry time per slot; -inf for a free slot
+        self._entries: List[Optional[CachedAnswer]] = []
+        self._slots: Dict[str, int] = {}             # Task -> slot
+        self._lru: "OrderedDict[int, None]" = OrderedDict()   # Used slots, least recently used first
+        self._free: List[int] = []
+        self._stats = {"answers": 0, "seeds": 0, "misses": 0, "expired": 0, "evicted": 0}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._lru)
+
+    def _embed(self, text: str) -> np.ndarray:
+        return normalize(np.asarray(self.embedder(text), dtype=np.float32).reshape(1, -1))[0]
+
+    def lookup(self, task: str) -> Optional[CacheMatch]:
+        """The most similar live entry, if its similarity reaches seed_threshold (or threshold)."""
+        vector = self._embed(task)
+        with self._lock:
+            if not self._lru:
+                self._stats["misses"] += 1
+                return None
+            similarities = self._vectors @ vector
+            similarities[self._expires <= self.clock()] = -np.inf
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.seed_threshold:
+                self._stats["misses"] += 1
+                return None
+            entry = self._entries[slot]
+            entry.hits += 1
+            self._lru.move_to_end(slot)
+            reuse_answer = similarity >= self.threshold
+            self._stats["answers" if reuse_answer else "seeds"] += 1
+            return CacheMatch(entry, similarity, reuse_answer)
+
+    def put(self, task: str, answer: str, plan: str = "") -> CachedAnswer:
+        """Stores the answer of task (replacing the entry of the same task, if any)."""
+        vector = self._embed(task)
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            slot = self._slots.get(task)
+            if slot is None:
+                slot = self._allocate(vector.shape[0])
+            entry = CachedAnswer(task, answer, plan, created=now)
+            self._entries[slot] = entry
+            self._slots[task] = slot
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl if self.ttl is not None else np.inf
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._lru):
+                self._release(slot)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._lru))
+
+    def _allocate(self, dim: int) -> int:
+        if self._free:
+            return self._free.pop()
+        if len(self._lru) >= self.max_entries:
+            slot = next(iter(self._lru))
+            self._release(slot)
+            self._stats["evicted"] += 1
+            return self._free.pop()
+        if self._vectors is None:
+            self._vectors = np.zeros((min(16, self.max_entries), dim), dtype=np.float32)
+            self._expires = np.full(self._vectors.shape[0], -np.inf)
+            self._entries = [None] * self._vectors.shape[0]
+            self._free = list(range(self._vectors.shape[0] - 1, -1, -1))
+            return self._free.pop()
+        # Grow by doubling, up to max_entries rows
+        old = self._vectors.shape[0]
+        new = min(2 * old, self.max_entries)
+        self._vectors = np.concatenate([self._vectors, np.zeros((new - old, dim), dtype=np.float32)])
+        self._expires = np.concatenate([self._expires, np.full(new - old, -np.inf)])
+        self._entries.extend([None] * (new - old))
+        self._free = list(range(new - 1, old - 1, -1))
+        return self._free.pop()
+
+    def _expire(self, now: float):
+        for slot in np.flatnonzero((self._expires <= now) & (self._expires > -np.inf)).tolist():
+            self._release(slot)
+            self._stats["expired"] += 1
+
+    def _release(self, slot: int):
+        entry = self._entries[slot]
+        if entry is not None and self._slots.get(entry.task) == slot:
+            del self._slots[entry.task]
+        self._entries[slot] = None
+        self._vectors[slot] = 0.0
+        self._expires[slot] = -np.inf
+        self._lru.pop(slot, None)
+        self._free.append(slot)
@@ -0,0 +1,235 @@
+# batch_testbed.py -- Runs a suite of orchestrator_testbed tasks concurrently.
+#
+# Design Notes:
+#   * Tasks are read from a JSONL file, one task per line, eg. (GAIA-style keys are also accepted):
+#       {"task_id": "t1", "question": "How many ...?", "file_name": "data.xlsx", "final_answer": "42"}
+#     A task without a task_id is identified by its line number ("line-<n>").
+#   * Each task runs in its own worker process (a fresh process per task), with its own agent set and its own
+#       work dir: <runs_dir>/<task_id>/coding. An attachment (file_name) is copied there from --files-dir.
+#       Console output of a task goes to <runs_dir>/<task_id>/console.log.
+#   * File conversions (incl. paid image captions) are cached in --conversion-cache, shared by all workers.
+#   * web_surfer's fetches and searches are cached in --web-cache. With --offline they are served only from
+#       --web-fixtures (and --web-cache), for deterministic runs without network.
+#   * With --warm-kernel, each task's computer_terminal runs Python in a warm, stateful kernel (warm_kernel.py).
+#   * With --hosted-agents, each task's web_surfer and computer_terminal run in processes of their own
+#       (agent_transport.py), so they don't hold the GIL of the task's orchestrator.
+#   * With --exec-cache, results of re-run scripts are memoized per task (execution_cache.py), so they also
+#       survive a rerun of the suite. Not combinable with --warm-kernel.
+#   * With --trace, each task's spans (states, LLM calls, tokens) go to <runs_dir>/<task_id>/spans.jsonl.
+#   * With --profile, each task is profiled; flamegraph stacks and a memory report go to <runs_dir>/<task_id>/profile.
+#   * With --trace-store, all workers append transition/LLM call/session records to one columnar TraceStore,
+#       and the graded results go to its "tasks" table; see trace_analytics.py for the reports.
+#   * Results are appended to the results JSONL file as each task finishes. On restart, tasks that already
+#       have a result are skipped (use --retry-errors to re-run failed ones).
+#
+# Usage:
+#   python batch_testbed.py tasks.jsonl --results results.jsonl --workers 8
+#
+# STATUS: Working.
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Dict, List, Optional
+
+from trace_store import TraceStore
+
+
+def load_tasks(path: str) -> List[Dict]:
+    tasks = []
+    with open(path, "rt") as fh:
+        for line_number, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            d = json.loads(line)
+            task_id = d.get("task_id")
+            tasks.append(
+                {
+                    # Without an id, the line number keeps the task's run dir and result apart from the others'.
+                    "task_id": str(task_id) if task_id not in (None, "") else f"line-{line_number}",
+                    "question": d.get("question", d.get("Question", "")),
+                    "file_name": d.get("file_name", "") or "",
+                    "final_answer": d.get("final_answer", d.get("Final answer")),
+                    "task_type": str(d.get("task_type", d.get("Level", "")) or ""),
+                }
+            )
+    return tasks
+
+
+def load_results(path: str) -> Dict[str, Dict]:
+    """Returns the results recorded so far, by task_id. Tolerates a truncated last line."""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "rt") as fh:
+        for line in fh:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[r["task_id"]] = r
+    return results
+
+
+def normalize_answer(answer: Optional[str]) -> str:
+    if answer is None:
+        return ""
+    answer = answer.replace("FINAL ANSWER:", "")
+    return " ".join(answer.strip().lower().rstrip(".").split())
+
+
+def run_one(task: Dict, runs_dir: str, files_dir: Optional[str], config_file: str, conversion_cache_dir: Optional[str] = None,
+            team_options: Optional[Dict] = None) -> Dict:
+    """Worker process entry point: runs a single task in its own work dir."""
+    task_dir = os.path.abspath(os.path.join(runs_dir, task["task_id"]))
+    work_dir = os.path.join(task_dir, "coding")
+    os.makedirs(work_dir, exist_ok=True)
+    if task["file_name"] and files_dir:
+        shutil.copy(os.path.join(files_dir, task["file_name"]), os.path.join(work_dir, task["file_name"]))
+
+    result = {"task_id": task["task_id"], "pid": os.getpid(), "started_at": time.time()}
+    start = time.perf_counter()
+    with open(os.path.join(task_dir, "console.log"), "wt") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            # Imported here, so only worker processes load autogen and the agents.
+            import orchestrator_testbed
+
+            configs = orchestrator_testbed.load_llm_configs(config_file)
+            team_options = dict(team_options or {})
+            if team_options.pop("exec_cache", False):
+                team_options["exec_cache_dir"] = os.path.join(task_dir, "exec_cache")
+            if team_options.pop("trace", False):
+                team_options["trace_file"] = os.path.join(task_dir, "spans.jsonl")
+            if team_options.pop("profile", False):
+                team_options["profile_dir"] = os.path.join(task_dir, "profile")
+            if team_options.get("trace_store_dir"):
+                team_options.update(task_id=task["task_id"], task_type=task["task_type"])
+            answer = orchestrator_testbed.run_task(
+                task["question"], task["file_name"], configs=configs, work_dir=work_dir, downloads_folder=task_dir,
+                conversion_cache_dir=conversion_cache_dir, **team_options,
+            )
+            result.update({"status": "ok", "answer": answer})
+        except Exception as e:
+            traceback.print_exc()
+            result.update({"status": "error", "answer": None, "error": f"{type(e).__name__}: {e}"})
+    result["duration_s"] = time.perf_counter() - start
+
+    if task["final_answer"] is not None:
+        result["expected"] = task["final_answer"]
+        result["correct"] = normalize_answer(result["answer"]) == normalize_answer(str(task["final_answer"]))
+    return result
+
+
+def summarize(results: List[Dict], wall_clock_s: float) -> Dict:
+    """Aggregate throughput and latency stats for the results of this run."""
+    durations = sorted(r["duration_s"] for r in results)
+    stats = {
+        "tasks": len(results),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "wall_clock_s": wall_clock_s,
+        "throughput_tasks_per_hour": 3600 * len(results) / wall_clock_s if wall_clock_s > 0 else 0.0,
+    }
+    graded = [r for r in results if "correct" in r]
+    if graded:
+        stats["accuracy"] = sum(1 for r in graded if r["correct"]) / len(graded)
+    if durations:
+        stats["latency_mean_s"] = statistics.fmean(durations)
+        stats["latency_p50_s"] = statistics.median(durations)
+        stats["latency_max_s"] = durations[-1]
+        if len(durations) > 1:
+            stats["latency_p95_s"] = statistics.quantiles(durations, n=20, method="inclusive")[18]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run orchestrator_testbed over a JSONL task suite.")
+    parser.add_argument("tasks", help="JSONL file of tasks")
+    parser.add_argument("--results", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--runs-dir", default="runs", help="Per-task work dirs and logs are created here")
+    parser.add_argument("--files-dir", default=None, help="Directory holding the tasks' attachments (file_name)")
+    parser.add_argument("--config-file", default="OAI_CONFIG_LIST", help="OAI config list")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--conversion-cache", default="conversion_cache", help="Shared cache dir for file conversions ('' to disable)")
+    parser.add_argument("--web-cache", default="web_cache", help="Shared cache dir for web_surfer fetches and searches ('' to disable)")
+    parser.add_argument("--web-fixtures", default=None, help="Recorded web cache dir to serve from, eg. with --offline")
+    parser.add_argument("--offline", action="store_true", help="Serve web_surfer only from --web-fixtures/--web-cache, never the network")
+    parser.add_argument("--warm-kernel", action="store_true", help="Run Python blocks in a warm, stateful kernel per task")
+    parser.add_argument("--hosted-agents", action="store_true", help="Host web_surfer and computer_terminal in processes of their own")
+    parser.add_argument("--exec-cache", action="store_true", help="Memoize script results in <runs_dir>/<task_id>/exec_cache")
+    parser.add_argument("--trace", action="store_true", help="Write per-task spans to <runs_dir>/<task_id>/spans.jsonl")
+    parser.add_argument("--profile", action="store_true", help="Profile each task into <runs_dir>/<task_id>/profile")
+    parser.add_argument("--trace-store", default=None, help="Columnar TraceStore dir shared by all workers")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-run tasks whose recorded result is an error")
+    args = parser.parse_args(argv)
+
+    tasks = load_tasks(args.tasks)
+    done = load_results(args.results)
+    pending = [
+        t for t in tasks
+        if t["task_id"] not in done or (args.retry_errors and done[t["task_id"]]["status"] == "error")
+    ]
+    print(f"{len(tasks)} tasks, {len(tasks) - len(pending)} already done, running {len(pending)} on {args.workers} workers")
+
+    config_file = os.path.abspath(args.config_file) if os.path.exists(args.config_file) else args.config_file
+    conversion_cache_dir = os.path.abspath(args.conversion_cache) if args.conversion_cache else None
+    team_options = {
+        "web_cache_dir": os.path.abspath(args.web_cache) if args.web_cache else None,
+        "web_fixture_dir": os.path.abspath(args.web_fixtures) if args.web_fixtures else None,
+        "web_offline": args.offline,
+        "warm_kernel": args.warm_kernel,
+        "hosted_agents": args.hosted_agents,
+        "exec_cache": args.exec_cache,
+        "trace": args.trace,
+        "profile": args.profile,
+        "trace_store_dir": os.path.abspath(args.trace_store) if args.trace_store else None,
+    }
+    trace_store = TraceStore(args.trace_store) if args.trace_store else None
+    if args.offline and not team_options["web_cache_dir"]:
+        parser.error("--offline needs a --web-cache dir")
+    if args.exec_cache and args.warm_kernel:
+        parser.error("--exec-cache cannot be combined with --warm-kernel")
+    results = []
+    start = time.perf_counter()
+    # spawn + max_tasks_per_child=1: every task gets a fresh interpreter, so no agent or module state leaks.
+    with ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1
+    ) as executor, open(args.results, "at") as out:
+        futures = {
+            executor.submit(run_one, t, args.runs_dir, args.files_dir, config_file, conversion_cache_dir, team_options): t
+            for t in pending
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # The worker process itself died.
+                result = {"task_id": task["task_id"], "status": "error", "answer": None,
+                          "error": f"{type(e).__name__}: {e}", "duration_s": 0.0}
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if trace_store:
+                trace_store.append("tasks", {
+                    "task_id": task["task_id"], "task_type": task["task_type"], "status": result["status"],
+                    "solved": -1 if "correct" not in result else int(result["correct"]),
+                    "duration_s": result["duration_s"], "finished_s": time.time(),
+                })
+            print(f"[{len(results)}/{len(pending)}] {result['task_id']}: {result['status']} in {result['duration_s']:.1f}s -> {result.get('answer')}")
+
+    if trace_store:
+        trace_store.close()
+    print(json.dumps(summarize(results, time.perf_counter() - start), indent=4))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
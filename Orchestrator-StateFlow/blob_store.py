@@ -0,0 +1,119 @@
+# blob_store.py -- Out-of-line storage for large message contents (web pages, converted files, stdout).
+#
+# Design Notes:
+#   * A message whose content is larger than threshold_chars is "spilled": its content is appended to the
+#       session's blob file and replaced by a handle plus a short preview, eg.
+#           [[blob:<store_id>:<offset>:<length>]]
+#           <first preview_chars of the content> ...
+#     The small handle is what gets copied into every agent's history by _broadcast().
+#   * Handles are materialized only when messages are serialized into an LLM request (see materialize()),
+#       truncated to the store's max_tokens budget (head and tail are kept).
+#   * Reads go through a read-only mmap of the blob file, so resident memory stays bounded by the OS page cache.
+#   * Stores are registered by store_id (the session id), so any agent can materialize any handle, and a
+#       resumed session (see checkpoint.py) re-opens the same blob file.
+
+import mmap
+import os
+import re
+import threading
+import weakref
+from typing import Dict, List, Optional
+
+BLOB_PREFIX = "[[blob:"
+_HANDLE_RE = re.compile(r"^\[\[blob:([^:\]]+):(\d+):(\d+)\]\]")
+CHARS_PER_TOKEN = 4  # Rough estimate; avoids running a tokenizer over large payloads.
+
+_stores: "weakref.WeakValueDictionary[str, BlobStore]" = weakref.WeakValueDictionary()
+
+
+class BlobStore:
+    """Append-only, memory-mapped blob file for one run (session). Args:
+    - directory: where the blob file is kept
+    - store_id: unique id, eg. the session id. Also names the file.
+    - threshold_chars: contents larger than this are spilled
+    - max_tokens: token budget of a materialized blob
+    - preview_chars: size of the inline preview that stays in the message
+    """
+
+    def __init__(self, directory: str, store_id: str, threshold_chars: int = 20000, max_tokens: int = 4000, preview_chars: int = 500):
+        os.makedirs(directory, exist_ok=True)
+        self.store_id = store_id
+        self.path = os.path.join(directory, store_id + ".blobs")
+        self.threshold_chars = threshold_chars
+        self.max_tokens = max_tokens
+        self.preview_chars = preview_chars
+        self._file = open(self.path, "ab")
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        _stores[store_id] = self
+
+    def put(self, content: str) -> str:
+        """Stores content. Returns the handle."""
+        data = content.encode("utf-8")
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+        return f"{BLOB_PREFIX}{self.store_id}:{offset}:{len(data)}]]"
+
+    def get(self, offset: int, length: int) -> str:
+        with self._lock:
+            if self._mmap is None or len(self._mmap) < offset + length:
+                # The file grew since it was mapped (or was never mapped): re-map it.
+                if self._mmap is not None:
+                    self._mmap.close()
+                with open(self.path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap[offset:offset + length].decode("utf-8", errors="replace")
+
+    def spill(self, message: Dict) -> Dict:
+        """Returns message, or a copy of it with its content spilled to the store if it is too large."""
+        content = message.get("content")
+        if not isinstance(content, str) or len(content) <= self.threshold_chars:
+            return message
+        spilled = dict(message)
+        spilled["content"] = f"{self.put(content)}\n{content[:self.preview_chars]} ..."
+        return spilled
+
+    def truncate(self, content: str) -> str:
+        budget = self.max_tokens * CHARS_PER_TOKEN
+        if len(content) <= budget:
+            return content
+        half = budget // 2
+        return f"{content[:half]}\n... [{len(content) - 2 * half} characters truncated] ...\n{content[-half:]}"
+
+    def close(self, delete: bool = True):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+        _stores.pop(self.store_id, None)
+        if delete:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def materialize_content(content):
+        """Returns content with a blob handle replaced by the (truncated) blob. Other content is returned as-is."""
+        if not isinstance(content, str) or not content.startswith(BLOB_PREFIX):
+            return content
+        match = _HANDLE_RE.match(content)
+        store = _stores.get(match.group(1)) if match else None
+        if store is None:
+            return content  # Unknown or closed store: leave the handle and preview.
+        return store.truncate(store.get(int(match.group(2)), int(match.group(3))))
+
+    @staticmethod
+    def materialize(messages: List[Dict]) -> List[Dict]:
+        """Returns messages with all blob handles materialized. Messages without handles are not copied."""
+        result = None
+        for i, message in enumerate(messages):
+            content = message.get("content") if isinstance(message, dict) else None
+            if isinstance(content, str) and content.startswith(BLOB_PREFIX):
+                if result is None:
+                    result = list(messages)
+                result[i] = dict(message, content=BlobStore.materialize_content(content))
+        return messages if result is None else result
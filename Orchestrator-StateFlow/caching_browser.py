@@ -0,0 +1,232 @@
+# caching_browser.py -- Disk-backed HTTP and search caching for the RequestsMarkdownBrowser used by web_surfer.
+#
+# Design Notes:
+#   * CachingRequestsSession is a requests.Session whose GETs are served from a ResponseCache. A fresh entry
+#       (younger than ttl_seconds) is returned without touching the network. A stale entry with an ETag or
+#       Last-Modified is revalidated with If-None-Match / If-Modified-Since; a 304 refreshes it.
+#       Responses with "Cache-Control: no-store" and non-200 responses are not cached.
+#   * CachingMarkdownSearch wraps a search engine (eg. BingMarkdownSearch); search(query) results are cached.
+#   * Page conversions are cached by CachedMarkdownConverter.convert_response() (see conversion_cache.py).
+#   * Offline mode never touches the network: requests are served from fixture_dir (and the cache), ignoring
+#       TTLs. A miss raises requests.ConnectionError. A fixture dir is simply a cache dir recorded by an online
+#       run, eg. with ttl_seconds=None.
+#   * Entries are single files written atomically, so several batch worker processes can share a cache dir.
+#
+# Usage:
+#   browser = make_caching_browser("web_cache", downloads_folder="coding", search_engine=BingMarkdownSearch())
+#   browser = make_caching_browser("web_cache", fixture_dir="fixtures/web", offline=True, ...)
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from conversion_cache import CachedMarkdownConverter, ConversionCache
+
+WEB_CACHE_FORMAT_VERSION = 1
+
+
+class ResponseCache(ConversionCache):
+    """Directory of cached HTTP responses, bounded by max_bytes. An entry is a JSON metadata line followed by
+    the raw body."""
+
+    SUFFIX = ".http"
+
+    def get_response(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline().decode("utf-8"))
+                meta["body"] = f.read()
+            os.utime(path)  # LRU: a hit makes the entry recent
+            return meta
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put_response(self, key: str, meta: Dict[str, Any], body: bytes):
+        self._write(key, json.dumps(meta).encode("utf-8") + b"\n" + body)
+
+
+def response_key(method: str, url: str) -> str:
+    return hashlib.sha256(json.dumps([WEB_CACHE_FORMAT_VERSION, method.upper(), url]).encode("utf-8")).hexdigest()
+
+
+def _build_response(entry: Dict[str, Any], request: requests.PreparedRequest) -> requests.Response:
+    """Rebuilds a requests.Response from a cache entry. The body is already consumed, so .content,
+    .text and .iter_content() (used for downloads) all work."""
+    response = requests.Response()
+    response.status_code = entry["status_code"]
+    response.reason = entry.get("reason", "OK")
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = entry["url"]
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.request = request
+    response._content = entry["body"]
+    response._content_consumed = True
+    return response
+
+
+class CachingRequestsSession(requests.Session):
+    """requests.Session with a disk-backed GET cache. Args:
+    - cache: the ResponseCache to read and write
+    - ttl_seconds: how long an entry is served without revalidation (None = forever)
+    - fixture_dir: read-only cache dir that is consulted before cache
+    - offline: never touch the network; serve from fixture_dir and cache only
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        fixture_dir: Optional[str] = None,
+        offline: bool = False,
+    ):
+        super().__init__()
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.fixtures = ResponseCache(fixture_dir) if fixture_dir else None
+        self.offline = offline
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.fixtures.get_response(key) if self.fixtures else None
+        return entry if entry is not None else self.cache.get_response(key)
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds is None or time.time() - entry["fetched_at"] < self.ttl_seconds
+
+    def request(self, method, url, *args, **kwargs):
+        if method.upper() != "GET":
+            if self.offline:
+                raise requests.ConnectionError(f"Offline: {method} {url} is not served from the cache.")
+            return super().request(method, url, *args, **kwargs)
+
+        request = self.prepare_request(requests.Request(method, url, params=kwargs.get("params")))
+        key = response_key(method, request.url)
+        entry = self._lookup(key)
+
+        if self.offline:
+            if entry is None:
+                raise requests.ConnectionError(f"Offline: {request.url} is not in the cache or fixture dir.")
+            return _build_response(entry, request)
+        if entry is not None and self._is_fresh(entry):
+            return _build_response(entry, request)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry is not None:
+            cached_headers = CaseInsensitiveDict(entry["headers"])
+            if cached_headers.get("ETag"):
+                headers["If-None-Match"] = cached_headers["ETag"]
+            if cached_headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+        response = super().request(method, url, *args, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            entry["fetched_at"] = time.time()
+            self._store(key, entry, entry["body"])
+            return _build_response(entry, request)
+        if response.status_code == 200 and "no-store" not in response.headers.get("Cache-Control", ""):
+            body = response.content  # Reads a streamed body; callers can still iter_content() it.
+            meta = {
+                "url": response.url,
+                "status_code": response.status_code,
+                "reason": response.reason,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")},
+                "fetched_at": time.time(),
+            }
+            self._store(key, meta, body)
+        return response
+
+    def _store(self, key: str, meta: Dict[str, Any], body: bytes):
+        meta = {k: v for k, v in meta.items() if k != "body"}
+        self.cache.put_response(key, meta, body)
+
+
+class CachingMarkdownSearch:
+    """Wraps a markdown search engine (eg. BingMarkdownSearch); search(query) results are cached. Args:
+    - search_engine: the wrapped engine; may be None in offline mode
+    - cache: a ConversionCache to keep the results in
+    - ttl_seconds: how long a result is served (None = forever)
+    - fixture_dir: read-only cache dir that is consulted before cache
+    - offline: never call the wrapped engine
+    """
+
+    def __init__(
+        self,
+        search_engine,
+        cache: ConversionCache,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        fixture_dir: Optional[str] = None,
+        offline: bool = False,
+    ):
+        self.search_engine = search_engine
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.fixtures = ConversionCache(fixture_dir) if fixture_dir else None
+        self.offline = offline
+
+    def __getattr__(self, name):
+        return getattr(self.search_engine, name)
+
+    @staticmethod
+    def _key(query: str) -> str:
+        # The engine is not part of the key, so offline runs (without an engine) hit what online runs recorded.
+        return hashlib.sha256(json.dumps([WEB_CACHE_FORMAT_VERSION, "search", query]).encode("utf-8")).hexdigest()
+
+    def search(self, query: str) -> str:
+        key = self._key(query)
+        entry = self.fixtures.get(key) if self.fixtures else None
+        entry = entry if entry is not None else self.cache.get(key)
+        if entry is not None and (self.offline or self.ttl_seconds is None or time.time() - entry["fetched_at"] < self.ttl_seconds):
+            return entry["results"]
+        if self.offline:
+            raise requests.ConnectionError(f"Offline: search '{query}' is not in the cache or fixture dir.")
+        results = self.search_engine.search(query)
+        self.cache.put(key, {"query": query, "results": results, "fetched_at": time.time()})
+        return results
+
+
+def make_caching_browser(
+    cache_dir: str,
+    downloads_folder: str,
+    search_engine=None,
+    markdown_converter=None,
+    ttl_seconds: Optional[float] = 24 * 3600,
+    fixture_dir: Optional[str] = None,
+    offline: bool = False,
+    **browser_kwargs,
+):
+    """Returns a RequestsMarkdownBrowser whose fetches, searches and page conversions are cached in cache_dir
+    (in the subdirs http, search and conversions; fixture_dir uses the same layout)."""
+    from autogen.browser_utils import MarkdownConverter, RequestsMarkdownBrowser
+
+    session = CachingRequestsSession(
+        ResponseCache(os.path.join(cache_dir, "http")),
+        ttl_seconds=ttl_seconds,
+        fixture_dir=os.path.join(fixture_dir, "http") if fixture_dir else None,
+        offline=offline,
+    )
+    if search_engine is not None or offline:
+        search_engine = CachingMarkdownSearch(
+            search_engine,
+            ConversionCache(os.path.join(cache_dir, "search")),
+            ttl_seconds=ttl_seconds,
+            fixture_dir=os.path.join(fixture_dir, "search") if fixture_dir else None,
+            offline=offline,
+        )
+    converter = CachedMarkdownConverter(
+        markdown_converter if markdown_converter is not None else MarkdownConverter(requests_session=session),
+        ConversionCache(os.path.join(cache_dir, "conversions")),
+    )
+    return RequestsMarkdownBrowser(
+        downloads_folder=downloads_folder,
+        search_engine=search_engine,
+        markdown_converter=converter,
+        requests_session=session,
+        **browser_kwargs,
+    )
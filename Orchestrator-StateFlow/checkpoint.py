@@ -0,0 +1,122 @@
+# checkpoint.py -- Checkpoint and resume for long Orchestrator runs.
+#   A checkpoint is written at StateFlow state boundaries (see StateFlow.state_hooks) and holds everything
+#   needed to continue a session without repeating LLM calls: METADATA (task/facts/plan), the JSON-able
+#   parts of the function context (total_turns, stalled_count, next_step, ...), the next state, the
+#   orchestrator's transcript and every agent's chat history with the orchestrator.
+#
+# Design Notes:
+#   * Checkpoints are compact JSON, zlib-compressed at a fast level, written atomically (tmp file + rename).
+#       Only the latest checkpoint per session is kept.
+#   * Agent state other than chat history (eg. web_surfer's current page) is not captured.
+#   * A crash inside a state repeats that state on resume; everything before it is reused.
+#
+# Usage:
+#   maestro = Orchestrator(..., checkpointer=Checkpointer("checkpoints"))
+#   ... crash ...
+#   maestro.resume(Checkpointer("checkpoints").latest())
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = ".ckpt"
+
+# Context keys that are rebuilt on resume rather than saved.
+_TRANSIENT_CONTEXT_KEYS = ("criteria_list", "sender", "running_summary_future")
+
+
+class Checkpointer:
+    """Writes and reads Orchestrator session checkpoints. Args:
+    - directory: where checkpoints are written, one file per session
+    - every_n_states: write a checkpoint every n state boundaries (1 = every boundary)
+    - compress_level: zlib level; low levels are fastest
+    """
+
+    def __init__(self, directory: str, every_n_states: int = 1, compress_level: int = 1):
+        self.directory = directory
+        self.every_n_states = max(1, every_n_states)
+        self.compress_level = compress_level
+        self._boundaries: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def on_state_boundary(self, orchestrator, session, next_state: str):
+        """Called by the Orchestrator after each state. Writes a checkpoint every every_n_states boundaries."""
+        with self._lock:
+            count = self._boundaries.get(session.session_id, 0) + 1
+            self._boundaries[session.session_id] = count
+        if count % self.every_n_states == 0:
+            self.save(self.snapshot(orchestrator, session, next_state))
+
+    @staticmethod
+    def snapshot(orchestrator, session, next_state: str) -> Dict[str, Any]:
+        """Returns a JSON-able checkpoint of the session, to continue at next_state."""
+        context = {}
+        for key, value in session.context.items():
+            if key in _TRANSIENT_CONTEXT_KEYS:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                logging.info(f"Checkpoint: skipping non-serializable context key {key}")
+                continue
+            context[key] = value
+
+        return {
+            "version": CHECKPOINT_VERSION,
+            "session_id": session.session_id,
+            "saved_at": time.time(),
+            "current_state": next_state,
+            "total_turns": session.context.get("total_turns", session.total_turns),
+            "sender": session.sender.name if session.sender else None,
+            "context": context,
+            "messages": session.messages,
+            "orchestrated_messages": session.orchestrated_messages,
+            "agent_histories": {a.name: a._oai_messages.get(orchestrator, []) for a in session.agents},
+            "orchestrator_histories": {a.name: orchestrator._oai_messages.get(a, []) for a in session.agents},
+        }
+
+    def path_for(self, session_id: str) -> str:
+        return os.path.join(self.directory, session_id + CHECKPOINT_SUFFIX)
+
+    def save(self, checkpoint: Dict[str, Any]) -> str:
+        data = json.dumps(checkpoint, separators=(",", ":"), default=str).encode("utf-8")
+        path = self.path_for(checkpoint["session_id"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(data, self.compress_level))
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def load(path: str) -> Dict[str, Any]:
+        with open(path, "rb") as f:
+            checkpoint = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')} in {path}")
+        return checkpoint
+
+    def latest(self, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Loads the given session's checkpoint, or the most recently written one."""
+        if session_id is not None:
+            path = self.path_for(session_id)
+            return self.load(path) if os.path.exists(path) else None
+        paths = glob.glob(os.path.join(self.directory, "*" + CHECKPOINT_SUFFIX))
+        if not paths:
+            return None
+        return self.load(max(paths, key=os.path.getmtime))
+
+    def discard(self, session_id: str):
+        """Removes a finished session's checkpoint."""
+        with self._lock:
+            self._boundaries.pop(session_id, None)
+        try:
+            os.remove(self.path_for(session_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,184 @@
+# composite_orchestrator.py -- Orchestrator that splits a task into sub-tasks, runs them concurrently and merges the findings.
+#
+# Design Notes:
+#   - Implements the "composite" alternative of orchestrator.py's design notes: a CompositeOrchestrator runs a
+#     sub-orchestrator session per sub-task. Each sub-task session has its own StateFlow (eg. WebResearcherStateFlow),
+#     its own transcript and its own team, so the sub-tasks run concurrently and cannot see each other's messages.
+#   - CompositeOrchestratorStateFlow adds a DELEGATE_SUBTASKS state between analyzing the facts and planning:
+#       INIT -> DELEGATE_SUBTASKS -> PLAN -> OBTAIN_NEXTSTEP -> ... (as DefaultOrchestratorStateFlow)
+#     DELEGATE_SUBTASKS asks the LLM to split the task (see the "decompose_task" prompt). If there are at least two
+#     sub-tasks, their findings are appended to METADATA["facts"], so the plan and every next step build on them.
+#     Otherwise the task is orchestrated as usual, at the cost of the one decomposition call.
+#   - Sub-task teams come from subtask_agents_factory, called by the sub-task's worker: agents keep per-sender chat
+#     histories and are reset by every session, so concurrent sessions must not share agents. A team is torn down when its sub-task ends
+#     (subtask_team_teardown; by default its code executors are stopped, eg. warm kernels).
+#   - A sub-task's findings are its session's running summary (extraction_method "running_summary"), not whatever
+#     message happened to come last. A sub-task that fails reports its error as its findings, rather than failing
+#     the task.
+#   - Sub-tasks run once per session: after a RESET, INIT re-analyzes the facts and DELEGATE_SUBTASKS re-merges the
+#     findings kept in context["subtask_findings"] (which checkpoints save, like the rest of the context) into
+#     them. The findings message is added to the conversation only once.
+#
+# Usage:
+#   orchestrator = CompositeOrchestrator(
+#       "orchestrator", agents=team, llm_config=llm_config,
+#       subtask_agents_factory=lambda: make_team(llm_config), subtask_state_flow_cls=WebResearcherStateFlow,
+#   )
+#   user_proxy.initiate_chat(orchestrator, message=task)
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Dict, List, Optional
+from autogen import Agent, ConversableAgent
+from abstract_orchestrator import AbstractOrchestrator
+from default_orchestrator_stateflow import DefaultOrchestratorStateFlow
+from orchestrator import Orchestrator
+from web_researcher_stateflow import WebResearcherStateFlow
+
+
+def stop_code_executors(agents: List[ConversableAgent]):
+    """Default teardown of a sub-task team: stops the agents' code executors that can be stopped (eg.
+    WarmPythonExecutor, also when wrapped by a CachingCodeExecutor)."""
+    for a in agents:
+        executor = getattr(a, "_code_executor", None)
+        while executor is not None:
+            if callable(getattr(executor, "stop", None)):
+                executor.stop()
+                break
+            executor = getattr(executor, "executor", None)
+
+
+class CompositeOrchestratorStateFlow(DefaultOrchestratorStateFlow):
+    """DefaultOrchestratorStateFlow that delegates sub-tasks before planning. INIT only analyzes the facts;
+    DELEGATE_SUBTASKS runs the sub-tasks and merges their findings; PLAN makes the initial plan."""
+
+    def __init__(self, orchestrator: AbstractOrchestrator, extraction_method: str = None):
+        super().__init__(orchestrator, extraction_method=extraction_method)
+        _analyze_facts, _make_initial_plan = self.states["INIT"]
+
+        def _delegate_subtasks(messages, context):
+            self.orchestrator._delegate_subtasks(messages, context)
+
+        self.states["INIT"] = [_analyze_facts]
+        self.transitions["INIT"] = "DELEGATE_SUBTASKS"
+        self.states["DELEGATE_SUBTASKS"] = [_delegate_subtasks]
+        self.transitions["DELEGATE_SUBTASKS"] = "PLAN"
+        self.states["PLAN"] = [_make_initial_plan]
+        self.transitions["PLAN"] = "OBTAIN_NEXTSTEP"
+
+
+class CompositeOrchestrator(Orchestrator):
+    """Orchestrator that first splits the task into independent sub-tasks and runs each as a session of
+    sub_orchestrator, concurrently. Args, in addition to Orchestrator's:
+    - subtask_agents_factory: returns a new team (List[ConversableAgent]) for one sub-task
+    - subtask_state_flow_cls: the sub-tasks' StateFlow class (default: WebResearcherStateFlow)
+    - max_subtasks: the most sub-tasks a task is split into
+    - max_concurrent_subtasks: the most sub-tasks running at a time (default: all of them)
+    - subtask_max_turns: max_turns of each sub-task session
+    - subtask_team_teardown: called with a sub-task's team when the sub-task ends (default: stop_code_executors)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        subtask_agents_factory: Callable[[], List[ConversableAgent]],
+        subtask_state_flow_cls=WebResearcherStateFlow,
+        max_subtasks: int = 4,
+        max_concurrent_subtasks: Optional[int] = None,
+        subtask_max_turns: int = 10,
+        subtask_team_teardown: Optional[Callable[[List[ConversableAgent]], None]] = stop_code_executors,
+        state_flow_cls=None,
+        **kwargs,
+    ):
+        super().__init__(name, state_flow_cls=state_flow_cls if state_flow_cls else CompositeOrchestratorStateFlow, **kwargs)
+        self.subtask_agents_factory = subtask_agents_factory
+        self.max_subtasks = max_subtasks
+        self.max_concurrent_subtasks = max_concurrent_subtasks
+        self.subtask_team_teardown = subtask_team_teardown
+        self.sub_orchestrator = Orchestrator(
+            f"{name}_subtask",
+            llm_config=kwargs.get("llm_config", False),
+            prompt_templates=self._prompt_templates,
+            max_turns=subtask_max_turns,
+            state_flow_cls=subtask_state_flow_cls,
+            extraction_method="running_summary",
+            blob_dir=self.blob_dir,
+            spill_threshold_chars=self.spill_threshold_chars,
+            spill_max_tokens=self.spill_max_tokens,
+            tracer=self.tracer,
+            team_top_k=self.team_top_k,
+        )
+
+    def _decompose_task(self, task: str, sender: Optional[Agent]) -> List[str]:
+        """Returns the task's sub-tasks, or [] if the task should not be split."""
+        prompt = self._prompt_templates["decompose_task"].substitute(task=task, max_subtasks=self.max_subtasks).strip()
+        messages = [{"role": "user", "content": prompt, "name": sender.name}]
+        try:
+            response = json.loads(self._create_completion(messages, "decompose_task", response_format={"type": "json_object"}))
+        except json.decoder.JSONDecodeError as e:
+            self._print_thought(str(e))
+            return []
+        subtasks = response.get("subtasks") if isinstance(response, dict) else None
+        if not isinstance(subtasks, list):
+            return []
+        return [s.strip() for s in subtasks if isinstance(s, str) and s.strip()][: self.max_subtasks]
+
+    def _run_subtask(self, subtask: str) -> str:
+        """Runs subtask as a session of sub_orchestrator with a new team. Returns the session's final output."""
+        sub = self.sub_orchestrator
+        agents = self.subtask_agents_factory()
+        session = sub.new_session([{"role": "user", "content": subtask, "name": self.name}], sender=self, agents=agents)
+        try:
+            sub.run_session(session)
+            return session.final_output or ""
+        finally:
+            sub.release_session(session)
+            for a in agents:
+                # The team is not reused; don't keep its chat histories around.
+                sub._oai_messages.pop(a, None)
+            if self.subtask_team_teardown:
+                self.subtask_team_teardown(agents)
+
+    def _run_subtasks(self, subtasks: List[str]) -> List[Dict[str, str]]:
+        """Runs the sub-tasks concurrently. Returns their findings in sub-task order. A sub-task that failed has
+        its error as findings, so the task can still be planned."""
+        max_workers = min(len(subtasks), self.max_concurrent_subtasks or len(subtasks))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="subtask") as executor:
+            futures = [executor.submit(copy_context().run, self._run_subtask, s) for s in subtasks]
+            outputs = []
+            for s, f in zip(subtasks, futures):
+                try:
+                    outputs.append(f.result())
+                except Exception as e:
+                    logging.exception(f"Sub-task {s!r} failed")
+                    outputs.append(f"The sub-task could not be completed: {type(e).__name__}: {e}")
+        return [{"task": s, "findings": output} for s, output in zip(subtasks, outputs)]
+
+    def _delegate_subtasks(self, messages: List[Dict], context: Dict):
+        METADATA = context["METADATA"]
+        if "subtask_findings" not in context:
+            subtasks = self._decompose_task(METADATA["task"], context["sender"])
+            if len(subtasks) > 1:
+                self._print_thought("Splitting the request into sub-tasks:\n" + "\n".join(f"- {s}" for s in subtasks))
+                context["subtask_findings"] = self._run_subtasks(subtasks)
+            else:
+                context["subtask_findings"] = []
+        if not context["subtask_findings"]:
+            return
+
+        findings = "\n\n".join(
+            f"Sub-task {i}: {f['task']}\nFindings: {f['findings']}" for i, f in enumerate(context["subtask_findings"], 1)
+        )
+        METADATA["facts"] = f"{METADATA['facts']}\n\n5. SUB-TASK FINDINGS\n\n{findings}".strip()
+        if context.get("subtask_findings_shared"):
+            return
+        message = f"Separate teams have worked on sub-tasks of the request. Here are their findings:\n\n{findings}"
+        messages.append({"role": "assistant", "content": message, "name": self.name})
+        context["subtask_findings_shared"] = True
+        self._print_thought(message)
+
+    def close(self, wait: bool = True):
+        super().close(wait=wait)
+        self.sub_orchestrator.close(wait=wait)
@@ -0,0 +1,188 @@
+# conversion_cache.py -- Persistent on-disk cache for MarkdownConverter conversions (incl. image captions).
+#
+# Design Notes:
+#   * Entries are keyed by a hash of the file's content, the converter version and the conversion kwargs
+#       (eg. mlm_prompt), so a renamed file still hits, and a changed prompt or converter misses.
+#   * One small JSON file per entry, written atomically (tmp file + rename), so several batch worker
+#       processes can share one cache directory without locking.
+#   * Size-bounded, approximately: the cache's size is measured once, then tracked by adding the size of each
+#       write. Only when that estimate exceeds max_bytes is the directory rescanned and least recently used
+#       entries (by mtime; hits touch the entry) evicted, down to 90% of max_bytes. Writes of other processes
+#       are only seen by a rescan, so a shared cache can overshoot max_bytes by what they wrote in between.
+#
+# Usage:
+#   converter = CachedMarkdownConverter(MarkdownConverter(mlm_client=mlm_client), ConversionCache("conversion_cache"))
+#   res = converter.convert(path, mlm_prompt=mlm_prompt)   # res.title, res.text_content
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+CACHE_FORMAT_VERSION = 1
+
+
+class CachedConversionResult:
+    """Same fields as the converter's DocumentConverterResult."""
+
+    def __init__(self, title: Optional[str], text_content: str):
+        self.title = title
+        self.text_content = text_content
+
+
+class ConversionCache:
+    """Directory of cached conversions, bounded by max_bytes."""
+
+    SUFFIX = ".json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # Estimated bytes in the cache; None until measured
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # LRU: a hit makes the entry recent
+            return entry
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        self._write(key, json.dumps(entry).encode("utf-8"))
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+                if self._size <= self.max_bytes:
+                    return
+        self.evict()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for _, _, path in self._scan():
+            self.delete(os.path.basename(path)[: -len(self.SUFFIX)])
+        with self._lock:
+            self._size = 0
+
+    def _scan(self):
+        """Yields (mtime, size, path) of the entries. Entries (or shards) removed meanwhile, eg. by another
+        process, are skipped."""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            try:
+                shard_entries = list(os.scandir(shard.path))
+            except FileNotFoundError:
+                continue
+            for e in shard_entries:
+                if e.name.endswith(self.SUFFIX):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield st.st_mtime, st.st_size, e.path
+
+    def evict(self):
+        """Measures the cache and, if it is over max_bytes, evicts least recently used entries."""
+        with self._lock:
+            entries = list(self._scan())
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                entries.sort()
+                for _, size, path in entries:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    if total <= self.max_bytes * 0.9:
+                        break
+            self._size = total
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CachedMarkdownConverter:
+    """Wraps a MarkdownConverter; convert() of local files is served from a ConversionCache. Everything else
+    is delegated to the wrapped converter. Args:
+    - converter: the MarkdownConverter
+    - cache: the ConversionCache
+    - converter_version: part of the key; change it to invalidate entries of an older converter
+    """
+
+    def __init__(self, converter, cache: ConversionCache, converter_version: Optional[str] = None):
+        self.converter = converter
+        self.cache = cache
+        self.converter_version = converter_version or f"{type(converter).__module__}.{type(converter).__qualname__}"
+
+    def __getattr__(self, name):
+        return getattr(self.converter, name)
+
+    def cache_key(self, source_hash: str, kwargs: Dict[str, Any]) -> str:
+        # Clients (eg. mlm_client) are not part of the key; prompts and options are.
+        options = {k: v for k, v in kwargs.items() if isinstance(v, (str, int, float, bool, type(None)))}
+        key = json.dumps([CACHE_FORMAT_VERSION, self.converter_version, source_hash, options], sort_keys=True)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str, convert):
+        entry = self.cache.get(key)
+        if entry is not None:
+            return CachedConversionResult(entry["title"], entry["text_content"])
+        res = convert()
+        self.cache.put(key, {"title": res.title, "text_content": res.text_content})
+        return res
+
+    def convert(self, source, **kwargs):
+        if not isinstance(source, str) or not os.path.isfile(source):
+            return self.converter.convert(source, **kwargs)
+        # The extension selects the converter, so it is part of the key.
+        key = self.cache_key(file_hash(source), dict(kwargs, _source_extension=os.path.splitext(source)[1]))
+        return self._cached(key, lambda: self.converter.convert(source, **kwargs))
+
+    def convert_local(self, path: str, **kwargs):
+        key = self.cache_key(file_hash(path), dict(kwargs, _source_extension=os.path.splitext(path)[1]))
+        return self._cached(key, lambda: self.converter.convert_local(path, **kwargs))
+
+    def convert_response(self, response, **kwargs):
+        """Converts a fetched web page (as used by RequestsMarkdownBrowser). Keyed by the body's content hash
+        and content type, so the same page at a different URL still hits."""
+        if not response.ok:
+            return self.converter.convert_response(response, **kwargs)
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        key = self.cache_key(content_hash(response.content), dict(kwargs, _content_type=content_type))
+        return self._cached(key, lambda: self.converter.convert_response(response, **kwargs))
@@ -13,16 +13,18 @@ class DefaultOrchestratorStateFlow(StateFlow):
         orchestration flow, eg. "facts", "plan-and-solve", etc.
     """
     states: Dict[str, List]
-    transitions: Dict[str, Union[str, callable]] = {}
+    transitions: Dict[str, Union[str, callable]]
     initial_state: str = None
-    final_states: List[str] = []
+    final_states: List[str]
     max_transitions: int = 10
 
     orchestrator:AbstractOrchestrator= None
     _prompt_templates: OrchestratorPromptTemplates
 
-    def __init__(self, orchestrator:AbstractOrchestrator):
+    def __init__(self, orchestrator:AbstractOrchestrator, extraction_method: str = None):
         self.orchestrator = orchestrator
+        if extraction_method is None:
+            extraction_method = getattr(orchestrator, "extraction_method", "last_message")
         self._prompt_templates = defaultPromptTemplates
 
         # Define states and transitions:
@@ -31,6 +33,14 @@ class DefaultOrchestratorStateFlow(StateFlow):
 
         #######################
         ####  State: INIT  ####
+        def _recall_or_think(messages, prompt, sender, seed):
+            # A seed (eg. the plan of a similar earlier task, see answer_cache.py) stands in for the LLM's response.
+            if not seed:
+                return self.orchestrator._think_and_respond(messages, prompt, sender)
+            messages.append({"role": "user", "content": prompt, "name": sender.name})
+            messages.append({"role": "assistant", "content": seed, "name": self.orchestrator.name})
+            return seed
+
         def _analyze_facts(messages, context):
             # Start by writing what we know
             METADATA= context["METADATA"]
@@ -43,7 +53,7 @@ class DefaultOrchestratorStateFlow(StateFlow):
             METADATA = context["METADATA"]
             sender = context["sender"]
             plan_prompt = self._prompt_templates["plan_prompt"].substitute(team=METADATA["plan"]).strip()
-            METADATA["plan"] = self.orchestrator._think_and_respond(messages, plan_prompt, sender)
+            METADATA["plan"] = _recall_or_think(messages, plan_prompt, sender, context.pop("seed_plan", None))
 
         states.update({"INIT": [_analyze_facts, _make_initial_plan]})
         transitions.update({"INIT": "OBTAIN_NEXTSTEP"})
@@ -60,6 +70,7 @@ class DefaultOrchestratorStateFlow(StateFlow):
             METADATA = context["METADATA"]
             sender = context["sender"]
             CURRENT_STATE = ""
+            self.orchestrator._select_team(context)
             try:
                 step_prompt = TemplateUtils.generate_next_step_prompt(
                     prompt_template=self._prompt_templates["step_prompt"],
@@ -100,8 +111,8 @@ class DefaultOrchestratorStateFlow(StateFlow):
                 )
                 CURRENT_STATE = func(CURRENT_STATE, context)
 
-                # hooks are able to early exit, or 'fail' and ask for a reset
-                if CURRENT_STATE in ("TERMINATE_TRUE", "RESET", "INTROSPECT_AND_RESET"):
+                # hooks are able to early exit, 'fail' and ask for a reset, or ask for the next step again
+                if CURRENT_STATE in ("TERMINATE_TRUE", "RESET", "INTROSPECT_AND_RESET", "OBTAIN_NEXTSTEP"):
                     logging.info(
                         f"{CURRENT_STATE}: Breaking out of loop; hook caused early exit."
                     )
@@ -126,9 +137,31 @@ class DefaultOrchestratorStateFlow(StateFlow):
         states.update({"EXECUTE_NEXTSTEP": [_execute_step]})
         transitions.update({"EXECUTE_NEXTSTEP": "POST_EXECUTION_NEXTSTEP"})
 
+        ############################################
+        ####  State: EXECUTE_PARALLEL_NEXTSTEP  ####
+
+        def _execute_parallel_step(messages, context):
+            # Fan-out: several team members work on independent instructions in the same turn.
+            self.orchestrator._broadcast_next_steps_and_request_replies(
+                assignments=context["next_step"]["parallel_assignments"]["answer"],
+                next_prompt=context["next_step"]["instruction_or_question"]["answer"],
+                next_speaker=context["next_step"]["next_speaker"]["answer"],
+            )
+
+        states.update({"EXECUTE_PARALLEL_NEXTSTEP": [_execute_parallel_step]})
+        transitions.update({"EXECUTE_PARALLEL_NEXTSTEP": "POST_EXECUTION_NEXTSTEP"})
+
         ##########################################
         ####  State: POST_EXECUTION_NEXTSTEP  ####
-        states.update({"POST_EXECUTION_NEXTSTEP": []})
+
+        def _update_running_summary(messages, context):
+            # Fold this turn's messages into the rolling "answer so far" (runs in the background).
+            self.orchestrator._update_running_summary(context)
+
+        if extraction_method == "running_summary":
+            states.update({"POST_EXECUTION_NEXTSTEP": [_update_running_summary]})
+        else:
+            states.update({"POST_EXECUTION_NEXTSTEP": []})
         transitions.update({"POST_EXECUTION_NEXTSTEP": "OBTAIN_NEXTSTEP"})
 
         #######################################
@@ -170,4 +203,4 @@ class DefaultOrchestratorStateFlow(StateFlow):
         transitions.update({"end": ""})
 
         super().__init__(states, transitions, initial_state="INIT", final_states=["end"], 
-                         max_transitions= self.max_transitions)
+                         max_transitions= self.max_transitions, extraction_method=extraction_method)
@@ -0,0 +1,160 @@
+# execution_cache.py -- Opt-in memoization of code execution results for computer_terminal.
+#   After a RESET the team often re-runs the very scripts it already ran; CachingCodeExecutor returns the
+#   recorded output and exit code of such a re-run instantly.
+#
+# Design Notes:
+#   * CachingCodeExecutor wraps a (stateless) autogen CodeExecutor, eg. LocalCommandLineCodeExecutor, and
+#       implements the same protocol.
+#   * Key: hash of the blocks' languages and code, plus a fingerprint of the work-dir inputs: every file in
+#       the work dir whose name appears in the code, by content hash (large files by size and mtime).
+#       Changing such an input file is an automatic invalidation.
+#   * Only successful runs of Python blocks are recorded. Shell blocks (pip install, downloads, ...) change the
+#       environment and always run. A block containing "# no-cache" always runs.
+#   * Code that uses the network, time or randomness cannot be detected reliably; skip_pattern is a
+#       conservative filter for the common cases. Use invalidate()/clear() for explicit invalidation.
+#   * Stateful executors (eg. WarmPythonExecutor, whose blocks may depend on variables of earlier blocks)
+#       are refused.
+#   * Entries live in memory, or in cache_dir (a ConversionCache) to survive reruns of the testbed.
+#
+# Usage:
+#   executor = CachingCodeExecutor(LocalCommandLineCodeExecutor(work_dir="coding"), cache_dir="exec_cache")
+#   user_proxy = UserProxyAgent(..., code_execution_config={"executor": executor})
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from autogen.coding import CodeBlock, CodeResult
+
+from conversion_cache import ConversionCache, file_hash
+
+EXECUTION_CACHE_FORMAT_VERSION = 1
+NO_CACHE_MARKER = "# no-cache"
+DEFAULT_SKIP_PATTERN = (
+    r"\b(requests|urllib|http\.client|socket|aiohttp|httpx|selenium|random|uuid|secrets|datetime|"
+    r"time\.time|time\.perf_counter|input)\b"
+)
+CACHEABLE_LANGUAGES = ("python", "py", "python3")
+_MAX_HASHED_FILE_BYTES = 64 * 1024 * 1024
+_MAX_SCANNED_FILES = 10000
+
+
+class CachingCodeExecutor:
+    """Memoizes the results of an executor. Args:
+    - executor: the wrapped, stateless CodeExecutor
+    - work_dir: where input files are fingerprinted; defaults to executor.work_dir
+    - cache_dir: keep entries on disk here; None keeps them in memory
+    - skip_pattern: regex; blocks matching it are never cached (None = cache every block)
+    """
+
+    def __init__(
+        self,
+        executor,
+        work_dir: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        skip_pattern: Optional[str] = DEFAULT_SKIP_PATTERN,
+    ):
+        if getattr(executor, "stateful", False):
+            raise ValueError(f"{type(executor).__name__} is stateful; its results cannot be memoized.")
+        self.executor = executor
+        self.work_dir = os.path.abspath(work_dir if work_dir is not None else str(executor.work_dir))
+        self._disk = ConversionCache(cache_dir) if cache_dir else None
+        self._memory: Dict[str, Dict] = {}
+        self._skip_re = re.compile(skip_pattern) if skip_pattern else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def code_extractor(self):
+        return self.executor.code_extractor
+
+    def restart(self):
+        self.executor.restart()
+
+    def is_cacheable(self, code_blocks: List[CodeBlock]) -> bool:
+        for block in code_blocks:
+            if block.language.lower() not in CACHEABLE_LANGUAGES or NO_CACHE_MARKER in block.code:
+                return False
+            if self._skip_re is not None and self._skip_re.search(block.code):
+                return False
+        return True
+
+    def input_fingerprint(self, code: str) -> List:
+        """Returns [relpath, digest] of every work-dir file whose name appears in code."""
+        fingerprint = []
+        scanned = 0
+        for root, dirs, files in os.walk(self.work_dir):
+            dirs.sort()
+            for name in sorted(files):
+                scanned += 1
+                if scanned > _MAX_SCANNED_FILES:
+                    return fingerprint
+                if name not in code:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                    digest = file_hash(path) if st.st_size <= _MAX_HASHED_FILE_BYTES else f"{st.st_size}:{st.st_mtime_ns}"
+                except OSError:
+                    continue
+                fingerprint.append([os.path.relpath(path, self.work_dir), digest])
+        return fingerprint
+
+    def cache_key(self, code_blocks: List[CodeBlock]) -> str:
+        code = "\n".join(block.code for block in code_blocks)
+        key = json.dumps(
+            [
+                EXECUTION_CACHE_FORMAT_VERSION,
+                self.work_dir,
+                [[block.language.lower(), block.code] for block in code_blocks],
+                self.input_fingerprint(code),
+            ]
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        if self._disk is not None:
+            return self._disk.get(key)
+        with self._lock:
+            return self._memory.get(key)
+
+    def _put(self, key: str, entry: Dict):
+        if self._disk is not None:
+            self._disk.put(key, entry)
+        else:
+            with self._lock:
+                self._memory[key] = entry
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CodeResult:
+        if not self.is_cacheable(code_blocks):
+            return self.executor.execute_code_blocks(code_blocks)
+        key = self.cache_key(code_blocks)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            return CodeResult(exit_code=entry["exit_code"], output=entry["output"])
+        self.misses += 1
+        result = self.executor.execute_code_blocks(code_blocks)
+        if result.exit_code == 0:
+            self._put(key, {"exit_code": result.exit_code, "output": result.output})
+        return result
+
+    def invalidate(self, code_blocks: List[CodeBlock]):
+        """Drops the entry these blocks would hit with the current work-dir inputs."""
+        key = self.cache_key(code_blocks)
+        if self._disk is not None:
+            self._disk.delete(key)
+        else:
+            with self._lock:
+                self._memory.pop(key, None)
+
+    def clear(self):
+        """Drops all entries."""
+        if self._disk is not None:
+            self._disk.clear()
+        with self._lock:
+            self._memory.clear()
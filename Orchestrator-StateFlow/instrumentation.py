@@ -0,0 +1,337 @@
+# instrumentation.py -- Structured spans for StateFlow runs: per-state timings and per-call token accounting.
+#
+# Design Notes:
+#   * A Tracer hands out Spans (context managers). The current span is kept in a ContextVar, so spans started
+#       in ParallelActions and fan-out worker threads (which run in a copy of the caller's context) get the
+#       right parent. A span ends with its duration, attributes (state, agent, call_site, prompt_tokens,
+#       completion_tokens, cost, cache_hit, ...) and status, and is passed to every sink's export().
+#   * Sinks: InMemorySpanSink (tests, notebooks), JsonlSpanSink (one JSON object per line) and OtlpHttpSpanSink
+#       (OTLP/HTTP JSON, eg. to a local OpenTelemetry collector at http://localhost:4318/v1/traces).
+#       A sink may also implement on_start(span), eg. to follow the running state (see profiling.py).
+#   * A Tracer without sinks hands out a shared no-op span, so uninstrumented runs pay ~nothing.
+#   * Span names used by the Orchestrator: "orchestrator.session", "stateflow.state", "stateflow.action",
+#       "orchestrator.llm" (one per LLM call site) and "agent.reply".
+#
+# Usage:
+#   sink = InMemorySpanSink()
+#   maestro = Orchestrator(..., tracer=Tracer([sink, JsonlSpanSink("spans.jsonl")]))
+#   ...
+#   sink.summary("stateflow.state", "state")   # {state: {"count", "total_s", "prompt_tokens", ...}}
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("instrumentation_current_span", default=None)
+
+
+@dataclass
+class Span:
+    """A timed operation. start_ns/end_ns are wall clock (time.time_ns()); duration_s is measured with
+    perf_counter."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = 0
+    end_ns: int = 0
+    duration_s: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_s": self.duration_s,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a Span when nothing is listening."""
+
+    attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "name", "attributes", "span", "token", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span = Span(
+            name=self.name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=self.attributes,
+        )
+        self.token = _current_span.set(self.span)
+        for sink in self.tracer.sinks:
+            on_start = getattr(sink, "on_start", None)
+            if on_start:
+                on_start(self.span)
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.duration_s = time.perf_counter() - self.start
+        span.end_ns = time.time_ns()
+        if exc_type is not None:
+            span.status = "error"
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        for sink in self.tracer.sinks:
+            try:
+                sink.export(span)
+            except Exception:
+                logging.exception(f"Span sink {type(sink).__name__} failed")
+        return False
+
+
+class _NoopSpanContext:
+    def __enter__(self):
+        return _NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN_CONTEXT = _NoopSpanContext()
+
+
+class Tracer:
+    """Creates spans and passes finished ones to its sinks. Args:
+    - sinks: objects with export(span) and optionally on_start(span) and close()
+    """
+
+    def __init__(self, sinks: Optional[List] = None):
+        self.sinks: List = list(sinks) if sinks else []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def span(self, name: str, **attributes):
+        """Returns a context manager yielding the new Span (a no-op span if there are no sinks)."""
+        if not self.sinks:
+            return _NOOP_SPAN_CONTEXT
+        return _SpanContext(self, name, attributes)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close:
+                close()
+
+
+NOOP_TRACER = Tracer()
+
+
+def usage_tokens(usage_summary: Optional[Dict]) -> Dict[str, float]:
+    """Sums prompt and completion tokens over the models of an OpenAIWrapper usage summary, plus its cost."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "cost": (usage_summary or {}).get("total_cost", 0.0)}
+    for model, usage in (usage_summary or {}).items():
+        if isinstance(usage, dict):
+            totals["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            totals["completion_tokens"] += usage.get("completion_tokens", 0)
+    return totals
+
+
+class InMemorySpanSink:
+    """Keeps finished spans in a list."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self, name: str, key: str) -> Dict[Any, Dict[str, float]]:
+        """Aggregates the spans called name by attribute key: count, total/max duration and token totals."""
+        result: Dict[Any, Dict[str, float]] = {}
+        with self._lock:
+            spans = [s for s in self.spans if s.name == name]
+        for s in spans:
+            r = result.setdefault(
+                s.attributes.get(key), {"count": 0, "total_s": 0.0, "max_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            r["count"] += 1
+            r["total_s"] += s.duration_s
+            r["max_s"] = max(r["max_s"], s.duration_s)
+            r["prompt_tokens"] += s.attributes.get("prompt_tokens", 0)
+            r["completion_tokens"] += s.attributes.get("completion_tokens", 0)
+        return result
+
+
+class JsonlSpanSink:
+    """Appends finished spans to a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpSpanSink:
+    """Exports spans as OTLP/HTTP JSON, batched on a background thread. Args:
+    - endpoint: the collector's traces endpoint
+    - service_name: the service.name resource attribute
+    - batch_size: spans per request
+    - flush_interval: seconds after which a partial batch is sent
+    - max_queue: spans beyond this are dropped (and counted in dropped) rather than blocking the run
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318/v1/traces",
+        service_name: str = "orchestrator-stateflow",
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+        timeout: float = 5.0,
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="otlp_exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                continue
+            if span is None:
+                self._send(batch)
+                return
+            batch.append(span)
+            if len(batch) >= self.batch_size:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def to_otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "orchestrator-stateflow"},
+                            "spans": [
+                                {
+                                    "traceId": s.trace_id,
+                                    "spanId": s.span_id,
+                                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                                    "name": s.name,
+                                    "kind": 1,  # SPAN_KIND_INTERNAL
+                                    "startTimeUnixNano": str(s.start_ns),
+                                    "endTimeUnixNano": str(s.end_ns),
+                                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                                    "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1},
+                                }
+                                for s in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _send(self, spans: List[Span]):
+        if not spans:
+            return
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.to_otlp(spans)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except Exception as e:
+            self.dropped += len(spans)
+            logging.warning(f"OTLP export to {self.endpoint} failed: {e}")
+
+    def close(self):
+        """Flushes the queued spans and stops the exporter thread."""
+        self._queue.put(None)
+        self._thread.join(self.timeout + self.flush_interval)
@@ -29,9 +29,9 @@
 #       - Create AbstractOrchestrator to eliminate circ. depend.
 #       - Create separate StateFlow class/file
 #       - Create DefaultOrchestratorStateFlow
-#   o Create WebResearcherStateFlow:
+#   o [DONE] Create WebResearcherStateFlow (web_researcher_stateflow.py):
 #       - Core work
-#       - Integrate into Orchestrator
+#       - Integrate into Orchestrator: CompositeOrchestrator runs it for sub-tasks (composite_orchestrator.py)
 #   o Phases:
 #       1. Just re-used much of the "large" functions
 #       2. Reduce size of functions, try as "semi-declarative" as possible
@@ -45,6 +45,11 @@
 from datetime import datetime
 import json
 import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
 from string import Template
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Type, TypeVar, Union, Callable, Literal, Tuple, TypedDict
@@ -53,6 +58,11 @@ from prompt_templates import OrchestratorPromptTemplates, defaultPromptTemplates
 from stateflow import StateFlow
 from default_orchestrator_stateflow import DefaultOrchestratorStateFlow
 from abstract_orchestrator import AbstractOrchestrator, NextStepCriteria, TemplateUtils
+from orchestrator_session import OrchestratorSession, StateFlowPool
+from checkpoint import Checkpointer
+from blob_store import BlobStore
+from instrumentation import NOOP_TRACER, Tracer, usage_tokens
+from agent_index import AgentIndex
 import logging
 try:
     from termcolor import colored
@@ -60,6 +70,16 @@ except ImportError:
     def colored(x, *args, **kwargs):
         return x
 
+# A response created more than this many seconds before it was requested came from a cache (allows for clock skew).
+CACHE_HIT_MIN_AGE = 2.0
+
+
+def _served_from_cache(response, requested: float) -> bool:
+    """Whether response was served from a cache (client_cache, or OpenAIWrapper's cache_seed disk cache): a
+    completion's "created" time is set when the model generates it, so a cached one predates its request."""
+    created = getattr(response, "created", None)
+    return isinstance(created, (int, float)) and created < requested - CACHE_HIT_MIN_AGE
+
 
 class Quantifier(AssistantAgent):
     def __init__(
@@ -68,17 +88,21 @@ class Quantifier(AssistantAgent):
         llm_config = copy.deepcopy(llm_config)
         llm_config["max_retries"] = 10
         if system_message is None:
-            system_message = defaultPromptTemplates["quantifier_sys_message"]
+            system_message = defaultPromptTemplates["quantifier_sys_message"].substitute().strip()
         super().__init__(name=name, llm_config=llm_config, system_message=system_message, **kwargs)
 
-    def quantify(self) -> str:
-        criterion = {
-            "TERMINATE": {
-                "description": "If we have a correct answer - is it ok to terminate?",
-                "accepted_values": ["Appropriate", "Inappropriate"],
+    def quantify(self, task: Optional[Dict] = None, criterion: Optional[Dict] = None) -> str:
+        """Quantifies a single task against the criterion. For scoring many tasks, see
+        quantifier_eval.QuantifierEvaluator."""
+        if criterion is None:
+            criterion = {
+                "TERMINATE": {
+                    "description": "If we have a correct answer - is it ok to terminate?",
+                    "accepted_values": ["Appropriate", "Inappropriate"],
+                }
             }
-        }
-        task = {"question:": "2+2", "answer": "4"}
+        if task is None:
+            task = {"question:": "2+2", "answer": "4"}
 
         quantifyTemplate = Template(
             f"""criterion = $criterion_json
@@ -123,9 +147,32 @@ class DefaultStateMachineTransitions:
             CURRENT_STATE = "INTROSPECT_AND_RESET"
         return CURRENT_STATE
 
+    # proc_next_step -> expand_team_if_asked -> list more team members and obtain the next step again
+    @staticmethod
+    def expand_team_if_asked(CURRENT_STATE: str, context: Dict):
+        if context["next_step"].get("need_other_team_members", {}).get("answer"):
+            context["team_k"] *= 2
+            CURRENT_STATE = "OBTAIN_NEXTSTEP"
+        return CURRENT_STATE
+
+    # proc_next_step -> fan_out_if_parallel -> execute several independent instructions at once
+    @staticmethod
+    def fan_out_if_parallel(CURRENT_STATE: str, context: Dict):
+        # The LLM's JSON may have any shape: anything but a list of at least two assignments means no fan-out.
+        parallel = context["next_step"].get("parallel_assignments")
+        assignments = parallel.get("answer") if isinstance(parallel, dict) else None
+        if isinstance(assignments, list) and sum(isinstance(a, dict) for a in assignments) > 1:
+            CURRENT_STATE = "EXECUTE_PARALLEL_NEXTSTEP"
+        return CURRENT_STATE
+
+
+# Active session per Orchestrator (keyed by id()), for the current thread/task. A ContextVar, rather than
+#   a thread local, so it is carried over into ParallelActions worker threads.
+_active_sessions: ContextVar[Dict[int, OrchestratorSession]] = ContextVar("orchestrator_active_sessions", default={})
+
 
 class Orchestrator(ConversableAgent, AbstractOrchestrator):
-    active_fsms: List[StateFlow] = []   # TODO: make active_orchestrators?!?
+    active_fsms: List[StateFlow]   # StateFlows of the sessions currently running. TODO: make active_orchestrators?!?
     # state_history: List[str] = []
 
     def __init__(
@@ -142,7 +189,15 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         prompt_templates: OrchestratorPromptTemplates = defaultPromptTemplates,
         quantifier: Quantifier = None,
         max_turns: int = 10,   # 30?,
-        state_flow_cls = None
+        state_flow_cls = None,
+        allow_parallel_steps: bool = False,
+        checkpointer: Optional[Checkpointer] = None,
+        extraction_method: str = "last_message",
+        blob_dir: Optional[str] = None,
+        spill_threshold_chars: int = 20000,
+        spill_max_tokens: int = 4000,
+        tracer: Optional[Tracer] = None,
+        team_top_k: Optional[int] = None,
     ):
         super().__init__(
             name=name,
@@ -157,7 +212,8 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         )
 
         self._agents = agents
-        self.orchestrated_messages = []
+        self._orchestrated_messages = []  # Used outside of a session; holds the last finished session's transcript.
+        self.active_fsms = []
 
         # NOTE: Async reply functions are not yet supported with this contrib agent
         self._reply_func_list = []
@@ -170,21 +226,84 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
 
         self._quantifier: Quantifier = quantifier
         self.max_turns= max_turns
-        
-        if state_flow_cls:
-            self.active_fsms.append(state_flow_cls(self))
+        self.allow_parallel_steps= allow_parallel_steps
+        self.checkpointer= checkpointer
+        self.extraction_method= extraction_method
+        # Large agent replies are spilled to a per-session BlobStore in blob_dir (disabled if None)
+        self.blob_dir= blob_dir
+        self.spill_threshold_chars= spill_threshold_chars
+        self.spill_max_tokens= spill_max_tokens
+        self.last_session: Optional[OrchestratorSession] = None
+        self._background: Optional[ThreadPoolExecutor] = None   # Created on first use; shut down by close().
+        self._background_lock = threading.Lock()
+        # Spans of sessions, states, actions, LLM calls and agent replies go to tracer's sinks (see instrumentation.py)
+        self.tracer= tracer if tracer else NOOP_TRACER
+        # Prompts list only the team_top_k team members most relevant to each step (all of them if None)
+        self.team_top_k= team_top_k
+
+        self._state_flow_cls = state_flow_cls if state_flow_cls else DefaultOrchestratorStateFlow
+        self._state_flow_pool = StateFlowPool(self._new_state_flow)
+
+    def _new_state_flow(self) -> StateFlow:
+        state_flow = self._state_flow_cls(self)
+        state_flow.state_hooks.append(self._on_state_boundary)
+        state_flow.tracer = self.tracer
+        return state_flow
+
+    def _on_state_boundary(self, state: str, next_state: str, context: Dict):
+        session = self.current_session
+        if self.checkpointer and session:
+            self.checkpointer.on_state_boundary(self, session, next_state)
+
+    @property
+    def current_session(self) -> Optional[OrchestratorSession]:
+        """The session running in the current thread (or ParallelActions worker), if any."""
+        return _active_sessions.get().get(id(self))
+
+    @property
+    def orchestrated_messages(self) -> List[Dict]:
+        """The current session's transcript. Outside of a session, the last finished session's transcript."""
+        session = self.current_session
+        return session.orchestrated_messages if session else self._orchestrated_messages
+
+    @orchestrated_messages.setter
+    def orchestrated_messages(self, value: List[Dict]):
+        session = self.current_session
+        if session:
+            session.orchestrated_messages = value
         else:
-            self.active_fsms.append(DefaultOrchestratorStateFlow(self))
+            self._orchestrated_messages = value
+
+    @property
+    def _team(self) -> List[ConversableAgent]:
+        """The current session's agents. Outside of a session, the configured agents."""
+        session = self.current_session
+        return session.agents if session else self._agents
+
+    @contextmanager
+    def _activate(self, session: OrchestratorSession):
+        sessions = dict(_active_sessions.get())
+        sessions[id(self)] = session
+        token = _active_sessions.set(sessions)
+        try:
+            yield session
+        finally:
+            _active_sessions.reset(token)
 
     def _print_thought(self, message):
         print(self.name + " (thought)\n")
         print(message.strip() + "\n")
         print("\n", "-" * 80, flush=True, sep="")
 
+    def _spill(self, message: Dict) -> Dict:
+        """Returns message, with a large content spilled to the session's BlobStore (if enabled)."""
+        session = self.current_session
+        if session and session.blob_store:
+            return session.blob_store.spill(message)
+        return message
+
     def _broadcast(self, message, out_loud=[], exclude=[]):
-        m = copy.deepcopy(message)
-        m["role"] = "user"
-        for a in self._agents:
+        for a in self._team:
             if a in exclude or a.name in exclude:
                 continue
             if a in out_loud or a.name in out_loud:
@@ -192,29 +311,55 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
             else:
                 self.send(message, a, request_reply=False, silent=True)
 
+    def _create_completion(self, messages: List[Dict], call_site: str, **kwargs) -> str:
+        """The orchestrator's single LLM call site. Materializes spilled contents, calls the client and returns
+        the extracted text. Emits an "orchestrator.llm" span with the response's token counts and whether it came
+        from a cache. Both are read from the response, since the client's usage summaries are shared by concurrent
+        sessions."""
+        with self.tracer.span("orchestrator.llm", call_site=call_site, agent=self.name) as span:
+            requested = time.time()
+            response = self.client.create(messages=BlobStore.materialize(messages), cache=self.client_cache, **kwargs)
+            if self.tracer.enabled:
+                usage = getattr(response, "usage", None)
+                span.set(
+                    model=getattr(response, "model", None) or "",
+                    prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                    completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+                    cost=getattr(response, "cost", 0.0) or 0.0,
+                    cache_hit=_served_from_cache(response, requested),
+                )
+            return self.client.extract_text_or_completion_object(response)[0]
+
+    def _request_reply(self, agent: ConversableAgent):
+        """Returns agent's reply to the orchestrator. Emits an "agent.reply" span with the agent's token usage and cost."""
+        with self.tracer.span("agent.reply", agent=agent.name) as span:
+            client = getattr(agent, "client", None)
+            if not self.tracer.enabled or client is None:
+                return agent.generate_reply(sender=self)
+            before = usage_tokens(getattr(client, "total_usage_summary", None))
+            content = agent.generate_reply(sender=self)
+            after = usage_tokens(getattr(client, "total_usage_summary", None))
+            span.set(**{k: after[k] - before[k] for k in after})
+            return content
+
     def _think_and_respond(self, messages: List[dict], message: str, sender: Optional[Agent]):
         # TODO: Can't we just use ConversableAgent's generate_reply() like _enter_state() does here?
         messages.append({"role": "user", "content": message, "name": sender.name})
 
-        response = self.client.create(
-            messages=messages,
-            cache=self.client_cache,
-        )
-        extracted_response = self.client.extract_text_or_completion_object(response)[0]
+        extracted_response = self._create_completion(messages, "think_and_respond")
         messages.append({"role": "assistant", "content": extracted_response, "name": self.name})
         return extracted_response
 
     def _think_next_step(self, step_prompt: str, sender: Optional[Agent]):
         # This is a temporary message we will immediately pop
         self.orchestrated_messages.append({"role": "user", "content": step_prompt, "name": sender.name})
-        response = self.client.create(
-            messages=self.orchestrated_messages,
-            cache=self.client_cache,
-            response_format={"type": "json_object"},
-        )
-        self.orchestrated_messages.pop()
+        try:
+            extracted_response = self._create_completion(
+                self.orchestrated_messages, "next_step", response_format={"type": "json_object"}
+            )
+        finally:
+            self.orchestrated_messages.pop()
 
-        extracted_response = self.client.extract_text_or_completion_object(response)[0]
         next_step = json.loads(extracted_response)
         self._print_thought(json.dumps(next_step, indent=4))
         return next_step
@@ -226,13 +371,9 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
 
         new_plan_prompt = self._prompt_templates["new_plan"].substitute(team=team).strip()
         self.orchestrated_messages.append({"role": "user", "content": new_plan_prompt, "name": sender.name})
-        response = self.client.create(
-            messages=self.orchestrated_messages,
-            cache=self.client_cache,
-        )
 
         # plan is an exception - we dont log it as a message
-        plan = self.client.extract_text_or_completion_object(response)[0]
+        plan = self._create_completion(self.orchestrated_messages, "new_plan")
 
         return facts, plan
 
@@ -248,14 +389,121 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         self.orchestrated_messages.append(m)
 
         # Request a reply
-        for a in self._agents:
+        for a in self._team:
             if a.name == next_speaker:
-                reply = {"role": "user", "name": a.name, "content": a.generate_reply(sender=self)}
+                reply = self._spill({"role": "user", "name": a.name, "content": self._request_reply(a)})
                 self.orchestrated_messages.append(reply)
                 a.send(reply, self, request_reply=False)
                 self._broadcast(reply, exclude=[a])
                 break
 
+    def _broadcast_next_steps_and_request_replies(self, assignments: List[Dict], next_prompt=None, next_speaker=None):
+        # Resolve assignments to agents. Malformed assignments, and unknown or repeated speakers, are dropped.
+        # If none is left, the turn falls back to the single next step (next_prompt for next_speaker).
+        agents_by_name = {a.name: a for a in self._team}
+        targets = []
+        for assignment in assignments:
+            speaker = assignment.get("speaker") if isinstance(assignment, dict) else None
+            a = agents_by_name.get(speaker) if isinstance(speaker, str) else None
+            if a is None or a in [t for t, _ in targets]:
+                continue
+            m = {"role": "user", "content": str(assignment.get("instruction") or ""), "name": self.name}
+            targets.append((a, m))
+        if not targets:
+            self._broadcast_next_step_and_request_reply(next_prompt, next_speaker)
+            return
+
+        # Bystanders see every instruction. Each target sees its peers' instructions first and its own last,
+        # so that it replies to its own instruction.
+        target_names = [a.name for a, _ in targets]
+        for _, m in targets:
+            self._broadcast(m, exclude=target_names)
+        for a, m in targets:
+            for _, other in targets:
+                if other is not m:
+                    self.send(other, a, request_reply=False, silent=True)
+            self.send(m, a, request_reply=False, silent=False)
+
+        # Keep a copy
+        for _, m in targets:
+            m = copy.copy(m)
+            m["role"] = "assistant"
+            self.orchestrated_messages.append(m)
+
+        # Request the replies concurrently, then join them back in assignment order
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="fan_out") as executor:
+            futures = [executor.submit(copy_context().run, self._request_reply, a) for a, _ in targets]
+            contents = [f.result() for f in futures]
+
+        for (a, _), content in zip(targets, contents):
+            reply = self._spill({"role": "user", "name": a.name, "content": content})
+            self.orchestrated_messages.append(reply)
+            a.send(reply, self, request_reply=False)
+            self._broadcast(reply, exclude=[a])
+
+    def _select_team(self, context: Dict):
+        session = self.current_session
+        if session is None or session.agent_index is None:
+            return
+        METADATA = context["METADATA"]
+        recent = "\n".join(str(m.get("content") or "")[:2000] for m in self.orchestrated_messages[-2:])
+        last_speaker = context.get("next_step", {}).get("next_speaker", {}).get("answer")
+        agents = session.agent_index.top_k(
+            f"{METADATA['task']}\n{METADATA['plan']}\n{recent}", context["team_k"], include=[last_speaker]
+        )
+        self._describe_team(METADATA, agents)
+        context["criteria_list"] = self._build_criteria_list(METADATA, can_expand_team=len(agents) < len(session.agent_index))
+
+    @staticmethod
+    def _describe_team(METADATA: Dict, agents: List[ConversableAgent]):
+        # A reusable description of the team
+        METADATA["team"] = "\n".join([a.name + ": " + a.description for a in agents])
+        METADATA["names"] = ", ".join([a.name for a in agents])
+
+    def _update_running_summary(self, context: Dict):
+        # Runs in the background, chained per session, so the next step isn't kept waiting.
+        messages = self.orchestrated_messages
+        start = context.get("summarized_upto", 0)
+        if context.get("summarized_reset") != context.get("transcript_resets", 0):
+            start = 0   # The transcript was reset.
+        new_messages = BlobStore.materialize([copy.copy(m) for m in messages[start:]])
+        context["summarized_upto"] = len(messages)
+        context["summarized_reset"] = context.get("transcript_resets", 0)
+        if not new_messages:
+            return
+
+        previous = context.get("running_summary_future")
+        task = context["METADATA"]["task"]
+
+        def update():
+            # Never raises: a failed update keeps the previous summary, so later updates and the session go on.
+            summary = previous.result() if previous else context.get("running_summary", "")
+            prompt = self._prompt_templates["running_summary"].substitute(
+                task=task,
+                summary=summary or "",
+                new_messages="\n\n".join(f"{m.get('name', m.get('role'))}: {m.get('content') or ''}" for m in new_messages),
+            ).strip()
+            try:
+                context["running_summary"] = self._create_completion(
+                    [{"role": "user", "content": prompt, "name": self.name}], "running_summary"
+                )
+            except Exception as e:
+                logging.warning(f"Running summary update failed; keeping the previous summary. {type(e).__name__}: {e}")
+                context["running_summary"] = summary
+            return context["running_summary"]
+
+        with self._background_lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=4, thread_name_prefix="orchestrator_bg")
+            context["running_summary_future"] = self._background.submit(copy_context().run, update)
+
+    def close(self, wait: bool = True):
+        """Shuts down the background worker threads (running summaries). It is recreated if needed again."""
+        with self._background_lock:
+            background, self._background = self._background, None
+        if background is not None:
+            background.shutdown(wait=wait)
+
     def _update_team_with_facts_and_plan(self, team_update_prompt: str):
         self.orchestrated_messages.append({"role": "assistant", "content": team_update_prompt, "name": self.name})
         self._broadcast(self.orchestrated_messages[-1])
@@ -274,6 +522,23 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         if messages is None:
             messages = self._oai_messages[sender]
 
+        session = self.new_session(messages, sender=sender)
+        try:
+            return self.run_session(session)
+        finally:
+            self.release_session(session)
+
+    def new_session(
+        self,
+        messages: List[Dict],
+        sender: Optional[Agent] = None,
+        agents: Optional[List[ConversableAgent]] = None,
+        session_id: Optional[str] = None,
+    ) -> OrchestratorSession:
+        """Creates a session for the task in the last message. Takes a StateFlow from the pool; call
+        release_session() when done with the session."""
+        agents = agents if agents is not None else self._agents
+
         # Work with a copy of the messages
         _messages = copy.deepcopy(messages)
 
@@ -284,9 +549,13 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         # Pop the last message, which is the task
         METADATA["task"] = _messages.pop()["content"]
 
-        # A reusable description of the team
-        METADATA["team"] = "\n".join([a.name + ": " + a.description for a in self._agents])
-        METADATA["names"] = ", ".join([a.name for a in self._agents])
+        # A reusable description of the team; for a large team, of its members most relevant to the task
+        agent_index = None
+        if self.team_top_k and len(agents) > self.team_top_k:
+            agent_index = AgentIndex(agents)
+            self._describe_team(METADATA, agent_index.top_k(METADATA["task"], self.team_top_k))
+        else:
+            self._describe_team(METADATA, agents)
 
         # TODO: These next two should be moved into DefaultOrchestratorStateFlow.
         # A place to store relevant facts
@@ -295,13 +564,52 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
         # A place to store the plan
         METADATA["plan"] = ""
 
-        # Main loop
-        state_flow= self.active_fsms.pop()
-        state_flow.check_states()
-        verbose= True   # @@ TODO: Make class mem?
-
         # Setup function context
         context = {}
+        context["criteria_list"] = self._build_criteria_list(METADATA, can_expand_team=agent_index is not None)
+        context["sender"] = sender
+        if agent_index is not None:
+            context["team_k"] = self.team_top_k
+        context["METADATA"] = METADATA
+
+        session_id = session_id if session_id else OrchestratorSession.new_id()
+        blob_store = None
+        if self.blob_dir:
+            blob_store = BlobStore(
+                self.blob_dir, session_id, threshold_chars=self.spill_threshold_chars, max_tokens=self.spill_max_tokens
+            )
+            for a in agents:
+                # Agents materialize spilled contents when they build their own LLM requests.
+                hooks = getattr(a, "hook_lists", {}).get("process_all_messages_before_reply")
+                if hooks is not None and BlobStore.materialize not in hooks:
+                    a.register_hook("process_all_messages_before_reply", BlobStore.materialize)
+
+        state_flow = self._state_flow_pool.acquire()
+        self.active_fsms.append(state_flow)
+        return OrchestratorSession(
+            session_id=session_id,
+            state_flow=state_flow,
+            agents=agents,
+            sender=sender,
+            messages=_messages,
+            context=context,
+            blob_store=blob_store,
+            agent_index=agent_index,
+        )
+
+    def release_session(self, session: OrchestratorSession):
+        """Returns the session's StateFlow to the pool."""
+        self.active_fsms.remove(session.state_flow)
+        self._state_flow_pool.release(session.state_flow)
+        if session.blob_store:
+            # The blobs are about to go away, so materialize the transcript (within the token budget).
+            # Keep the blobs of an unfinished session if it may be resumed from a checkpoint.
+            session.orchestrated_messages = BlobStore.materialize(session.orchestrated_messages)
+            session.blob_store.close(delete=self.checkpointer is None or session.final_output is not None)
+        self._orchestrated_messages = session.orchestrated_messages
+        self.last_session = session
+
+    def _build_criteria_list(self, METADATA: Dict, can_expand_team: bool = False) -> List[NextStepCriteria]:
         # Future TODO: move these prompts to prompt_templates?
         criteria_list = [
             NextStepCriteria(
@@ -327,45 +635,133 @@ class Orchestrator(ConversableAgent, AbstractOrchestrator):
                 answer_spec="string",
             ),
         ]
-        context["criteria_list"] = criteria_list
-        context["sender"] = sender
-        context["METADATA"] = METADATA
+        if can_expand_team:
+            criteria_list.append(
+                NextStepCriteria(
+                    name="need_other_team_members",
+                    prompt_msg="Is a team member with other expertise than the team members listed above needed for the next step? (True only if none of the listed team members can do it; more team members will then be listed)",
+                    answer_spec="boolean",
+                    pre_execute_hook=DefaultStateMachineTransitions.expand_team_if_asked,
+                )
+            )
+        if self.allow_parallel_steps:
+            # Must stay last: its hook only routes to the fan-out state if no earlier hook changed the state.
+            criteria_list.append(
+                NextStepCriteria(
+                    name="parallel_assignments",
+                    prompt_msg=f"Can the next step be split into independent sub-tasks that DIFFERENT team members can work on at the same time? (If so, list one instruction per team member, selecting from: {METADATA['names']}. Otherwise, output an empty list and use next_speaker instead)",
+                    answer_spec=f'array of {{"speaker": string (select from: {METADATA["names"]}), "instruction": string}}',
+                    pre_execute_hook=DefaultStateMachineTransitions.fan_out_if_parallel,
+                )
+            )
+        return criteria_list
+
+    def run_session(self, session: OrchestratorSession, resuming: bool = False) -> Tuple[bool, Union[str, Dict, None]]:
+        """Runs the session's main loop until it terminates or runs out of turns. If resuming, continues
+        from session.current_state with the session's restored histories."""
+        with self._activate(session), self.tracer.span(
+            "orchestrator.session", session_id=session.session_id, agent=self.name, resuming=resuming
+        ) as span:
+            result = self._run_session_loop(session, resuming)
+            span.set(total_turns=session.total_turns)
+            # Wait for the last background summary update, if any
+            future = session.context.pop("running_summary_future", None)
+            if future:
+                future.result()
+            session.final_output = session.state_flow.output_extraction(session.orchestrated_messages, session.context)
+        if self.checkpointer:
+            self.checkpointer.discard(session.session_id)
+        return result
+
+    def resume(
+        self,
+        checkpoint: Union[str, Dict],
+        sender: Optional[Agent] = None,
+        agents: Optional[List[ConversableAgent]] = None,
+    ) -> Tuple[bool, Union[str, Dict, None]]:
+        """Continues a session from a checkpoint (a Checkpointer checkpoint or its path). Rebuilds the
+        agents' chat histories and continues at the saved state, without repeating any LLM calls."""
+        if isinstance(checkpoint, str):
+            checkpoint = Checkpointer.load(checkpoint)
+        agents = agents if agents is not None else self._agents
+        if sender is None:
+            sender = next((a for a in agents if a.name == checkpoint["sender"]), None)
+        if sender is None:
+            sender = ConversableAgent(checkpoint["sender"] or "user", llm_config=False, code_execution_config=False, human_input_mode="NEVER")
+
+        METADATA = checkpoint["context"]["METADATA"]
+        session = self.new_session(
+            [{"role": "user", "content": METADATA["task"]}], sender=sender, agents=agents, session_id=checkpoint["session_id"]
+        )
+        try:
+            session.context.update(copy.deepcopy(checkpoint["context"]))
+            session.context["criteria_list"] = self._build_criteria_list(
+                session.METADATA, can_expand_team=session.agent_index is not None
+            )
+            session.messages = checkpoint["messages"]
+            session.orchestrated_messages = checkpoint["orchestrated_messages"]
+            session.current_state = checkpoint["current_state"]
+            session.total_turns = checkpoint["total_turns"]
+            for a in agents:
+                a.reset()
+                a._oai_messages[self] = checkpoint["agent_histories"].get(a.name, [])
+                self._oai_messages[a] = checkpoint["orchestrator_histories"].get(a.name, [])
+            print(
+                f"%%% {datetime.now()} Orchestrator resuming session {session.session_id} at {session.current_state}. Current turn: {session.total_turns}"
+            )
+            return self.run_session(session, resuming=True)
+        finally:
+            self.release_session(session)
 
-        total_turns = 0
-        while total_turns < self.max_turns:  # ?!? TODO: Should this be moved into DefaultOrchestratorStateFlow? Probably...
+    def _run_session_loop(self, session: OrchestratorSession, resuming: bool = False) -> Tuple[bool, Union[str, Dict, None]]:
+        # Main loop
+        state_flow= session.state_flow
+        context= session.context
+        verbose= True   # @@ TODO: Make class mem?
 
-            # Populate the message histories
-            self.orchestrated_messages = []
-            for a in self._agents:
-                a.reset()
+        if resuming and session.current_state == "TERMINATE_TRUE":
+            return True, "TERMINATE"
+        # Resuming mid-loop keeps the restored histories; resuming at a final state starts a fresh loop.
+        resuming = resuming and session.current_state not in state_flow.final_states
 
-            # Equivalent of team "intro" (but need to break out "facts" and "plan"?!?):
-            team_update_prompt = TemplateUtils.generate_team_update_prompt(
-                prompt_template=self._prompt_templates["team_update"], **METADATA
-            )
-            # @@ self.send_intro(team_update_prompt)
-            self._update_team_with_facts_and_plan(team_update_prompt=team_update_prompt)    # @@
+        while session.total_turns < self.max_turns:  # ?!? TODO: Should this be moved into DefaultOrchestratorStateFlow? Probably...
+
+            if not resuming:
+                # Populate the message histories
+                session.orchestrated_messages = []
+                context["transcript_resets"] = context.get("transcript_resets", 0) + 1
+                for a in session.agents:
+                    a.reset()
+
+                # Equivalent of team "intro" (but need to break out "facts" and "plan"?!?):
+                team_update_prompt = TemplateUtils.generate_team_update_prompt(
+                    prompt_template=self._prompt_templates["team_update"], **session.METADATA
+                )
+                # @@ self.send_intro(team_update_prompt)
+                self._update_team_with_facts_and_plan(team_update_prompt=team_update_prompt)    # @@
+
+                session.current_state= state_flow.initial_state
+            resuming = False
 
-            current_state= state_flow.initial_state
-            while current_state not in state_flow.final_states:
+            while session.current_state not in state_flow.final_states:
                 if verbose:
-                    print(colored(f"********* Running state \"{current_state}\" (turn={total_turns}) *********", "blue"), flush=True)
+                    print(colored(f"********* Running state \"{session.current_state}\" (turn={session.total_turns}) *********", "blue"), flush=True)
 
-                context["total_turns"]= total_turns
+                context["total_turns"]= session.total_turns
 
-                previous_state= current_state
-                current_state= state_flow.run_state(current_state, _messages, context, total_turns, self.orchestrated_messages)
+                previous_state= session.current_state
+                session.current_state= state_flow.run_state(session.current_state, session.messages, context, session.total_turns, session.orchestrated_messages)
 
-                logging.info(f"Moved from {previous_state} to {current_state}")
+                logging.info(f"Moved from {previous_state} to {session.current_state}")
                 print(
-                    f"%%% {datetime.now()} Orchestrator [state flow] from {previous_state} to {current_state}. Current turn: {total_turns}"
+                    f"%%% {datetime.now()} Orchestrator [state flow] from {previous_state} to {session.current_state}. Current turn: {session.total_turns}"
                 )
 
-                if current_state == "TERMINATE_TRUE":
+                if session.current_state == "TERMINATE_TRUE":
                     return True, "TERMINATE"
 
-                total_turns= context["total_turns"]
-                if total_turns >= self.max_turns:
+                session.total_turns= context["total_turns"]
+                if session.total_turns >= self.max_turns:
                     break
 
             # TODO: What to do with this?
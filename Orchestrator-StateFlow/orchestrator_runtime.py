@@ -0,0 +1,127 @@
+# orchestrator_runtime.py -- Runs many Orchestrator chat sessions against one configured team.
+#
+# Design Notes:
+#   * Each session gets its own OrchestratorSession (context/METADATA/orchestrated_messages) and a StateFlow
+#       from the Orchestrator's StateFlowPool, so a single service can process a stream of tasks without
+#       rebuilding the Orchestrator per task.
+#   * Agents keep chat history, so two sessions must never share an agent at the same time:
+#       - With an agent_factory, each concurrent session gets its own agent set. Agent sets are pooled and
+#         reused (they are reset() at the start of every session).
+#       - Without one, sessions share the Orchestrator's configured agents and run one at a time.
+#   * With an answer_cache (see answer_cache.py), a task similar enough to a cached one is answered from the cache
+#       without running a session, and a less similar one (opt-in) starts from the cached plan. The returned
+#       session's context["answer_cache"] tells which. The runtime doesn't cache answers itself: the owner of the
+#       final answer (eg. OrchestratorService, after its answer_fn) calls remember(), so the cache never holds a
+#       raw transcript message in place of a prepared answer.
+#
+# Usage:
+#   runtime = OrchestratorRuntime(maestro, agent_factory=build_agents, max_concurrent_sessions=4)
+#   sessions = runtime.map([PROMPT, PROMPT_2])
+#   runtime.shutdown()
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+from autogen import Agent, ConversableAgent
+from orchestrator import Orchestrator
+from orchestrator_session import OrchestratorSession
+from answer_cache import AnswerCache
+
+
+class OrchestratorRuntime:
+    """Runs Orchestrator.run_chat()-equivalent sessions concurrently on a bounded thread pool. Args:
+    - orchestrator: the configured Orchestrator (llm_config, prompts, state flow class, etc.)
+    - agent_factory: returns a fresh agent set for a session. If None, the orchestrator's agents are
+        shared and sessions are serialized.
+    - sender: the agent the tasks come from. Defaults to a plain "user" agent.
+    - max_concurrent_sessions: size of the worker pool
+    - answer_cache: answers (or seeds) tasks similar to earlier ones, if given
+    """
+
+    def __init__(
+        self,
+        orchestrator: Orchestrator,
+        agent_factory: Optional[Callable[[], List[ConversableAgent]]] = None,
+        sender: Optional[Agent] = None,
+        max_concurrent_sessions: int = 4,
+        answer_cache: Optional[AnswerCache] = None,
+    ):
+        self.orchestrator = orchestrator
+        self.max_concurrent_sessions = max_concurrent_sessions
+        self.answer_cache = answer_cache
+        self._agent_factory = agent_factory
+        self.sender = sender if sender else ConversableAgent(
+            "user", llm_config=False, code_execution_config=False, human_input_mode="NEVER"
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_sessions, thread_name_prefix="orchestrator")
+        self._idle_agent_sets: List[List[ConversableAgent]] = []
+        self._agents_lock = threading.Lock()
+        self._shared_team_lock = threading.Lock()
+
+    def run(self, task: str, session_id: Optional[str] = None) -> OrchestratorSession:
+        """Runs a task to completion in the calling thread. Returns the finished session."""
+        message = {"role": "user", "content": task, "name": self.sender.name}
+        match = self.answer_cache.lookup(task) if self.answer_cache is not None else None
+        if match and match.reuse_answer:
+            # No agents needed: the session only carries the cached answer.
+            session = self.orchestrator.new_session([message], sender=self.sender, agents=[], session_id=session_id)
+            session.final_output = match.entry.answer
+            session.context["answer_cache"] = {"task": match.entry.task, "similarity": match.similarity, "reused": "answer"}
+            self.orchestrator.release_session(session)
+            return session
+
+        agents = self._acquire_agents()
+        try:
+            session = self.orchestrator.new_session([message], sender=self.sender, agents=agents, session_id=session_id)
+            if match:
+                session.context["seed_plan"] = match.entry.plan
+                session.context["answer_cache"] = {"task": match.entry.task, "similarity": match.similarity, "reused": "plan"}
+            try:
+                self.orchestrator.run_session(session)
+            finally:
+                self.orchestrator.release_session(session)
+            return session
+        finally:
+            self._release_agents(agents)
+
+    def remember(self, session: OrchestratorSession, answer: str):
+        """Caches answer as the answer to the session's task (replacing a cached answer to the same task), with
+        the session's plan. Only sessions that terminated (rather than ran out of turns) are cached;
+        answers that came from the cache are not stored again."""
+        if self.answer_cache is None or not answer or session.context.get("answer_cache", {}).get("reused") == "answer":
+            return
+        if session.current_state != "TERMINATE_TRUE":
+            return
+        METADATA = session.METADATA
+        self.answer_cache.put(METADATA["task"], answer, plan=METADATA["plan"])
+
+    def submit(self, task: str, session_id: Optional[str] = None) -> Future:
+        """Queues a task. The Future's result is the finished OrchestratorSession."""
+        return self._executor.submit(self.run, task, session_id)
+
+    def map(self, tasks: List[str]) -> List[OrchestratorSession]:
+        """Runs tasks concurrently. Returns the finished sessions in task order."""
+        return [f.result() for f in [self.submit(task) for task in tasks]]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        self.orchestrator.close(wait=wait)
+
+    def _acquire_agents(self) -> List[ConversableAgent]:
+        if self._agent_factory is None:
+            self._shared_team_lock.acquire()
+            return self.orchestrator._agents
+        with self._agents_lock:
+            if self._idle_agent_sets:
+                return self._idle_agent_sets.pop()
+        return self._agent_factory()
+
+    def _release_agents(self, agents: List[ConversableAgent]):
+        # Drop the orchestrator's side of the conversations, so reused agent sets don't grow its history.
+        for a in agents:
+            self.orchestrator._oai_messages.pop(a, None)
+        if self._agent_factory is None:
+            self._shared_team_lock.release()
+            return
+        with self._agents_lock:
+            self._idle_agent_sets.append(agents)
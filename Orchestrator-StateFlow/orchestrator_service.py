@@ -0,0 +1,477 @@
+# orchestrator_service.py -- Headless HTTP job API for the Orchestrator: a throughput-oriented backend without Panel.
+#
+# Design Notes:
+#   * Jobs run on an OrchestratorRuntime (bounded worker pool, pooled agent sets). In front of it is a bounded
+#       queue: a job beyond max_queued waiting jobs is rejected with 429 (and Retry-After), and while the service
+#       shuts down with 503, instead of growing an unbounded backlog.
+#   * Progress comes from the orchestrator's spans (see instrumentation.py): JobEventSink maps spans to jobs by
+#       their session (the job id is the session id) and appends "started", "state" (one per state transition),
+#       "agent_reply" and "llm" events, then "answer" or "error".
+#   * With the runtime's answer_cache, a job similar enough to an earlier one is answered from the cache (no session
+#       and no answer_fn call), with an "answer_cache" event; answer_fn answers are cached for later jobs.
+#   * The final answer is made by answer_fn(session, task), eg. orchestrator_testbed.response_preparer; it runs on
+#       the job's worker, so it counts against the pool like the session itself.
+#   * Finished jobs are kept (for GET) up to max_finished_jobs, oldest dropped first.
+#   * No side effects on import; main() builds the team with orchestrator_testbed.build_team().
+#
+# HTTP API (JSON):
+#   POST /jobs                 {"task": "...", "id": optional}  -> 202 {"id", "status", ...} | 429 | 503
+#   GET  /jobs                 all known jobs (without events)
+#   GET  /jobs/<id>            status, answer, error, timings
+#   GET  /jobs/<id>/events     server-sent events, from ?after=<seq> (or Last-Event-ID) until the job has finished
+#   DELETE /jobs/<id>          cancels a job that has not started yet
+#   GET  /health               queue and pool occupancy
+#
+# Usage:
+#   python orchestrator_service.py --port 8020 --workers 4 --max-queued 32 [--cache-threshold 0.95]
+#   curl -XPOST localhost:8020/jobs -d '{"task": "How many ...?"}'
+#   curl -N localhost:8020/jobs/<id>/events
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from answer_cache import AnswerCache
+from instrumentation import NOOP_TRACER, Span, Tracer
+from orchestrator_runtime import OrchestratorRuntime
+from orchestrator_session import OrchestratorSession
+
+log = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15.0
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+
+class QueueFullError(RuntimeError):
+    """The service has max_queued jobs waiting."""
+
+
+class ServiceClosedError(RuntimeError):
+    """The service is shutting down."""
+
+
+@dataclass
+class Job:
+    """A task submitted to the service, with its progress events."""
+
+    job_id: str
+    task: str
+    status: str = "queued"  # queued, running, done, failed or cancelled
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    events: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+    condition: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def add_event(self, event_type: str, **data):
+        with self.condition:
+            self.events.append({"seq": len(self.events), "type": event_type, "time": time.time(), **data})
+            self.condition.notify_all()
+
+    def finish(self, status: str, answer: Optional[str] = None, error: Optional[str] = None):
+        """Sets the final status and adds the final event ("answer" or "error") at once, so a reader that sees the
+        job done also sees that event."""
+        with self.condition:
+            self.status, self.answer, self.error, self.finished = status, answer, error, time.time()
+            if status == "done":
+                self.add_event("answer", answer=answer)
+            else:
+                self.add_event("error", status=status, error=error)
+
+    def wait_events(self, after: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Returns the events with seq >= after (waiting up to timeout for one), and whether the job is done."""
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events) > after or self.done, timeout)
+            return self.events[after:], self.done
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.job_id,
+            "status": self.status,
+            "task": self.task,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "answer": self.answer,
+            "error": self.error,
+            "events": len(self.events),
+        }
+
+
+class JobEventSink:
+    """Span sink turning a job's session spans into job events."""
+
+    def __init__(self, service: "OrchestratorService"):
+        self.service = service
+        self._sessions: Dict[str, str] = {}  # open span id -> session id
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span):
+        with self._lock:
+            session_id = self._sessions.get(span.parent_id, "")
+            if span.name == "orchestrator.session":
+                session_id = span.attributes.get("session_id", "")
+            self._sessions[span.span_id] = session_id
+        if span.name == "orchestrator.session":
+            self.service._job_started(session_id)
+
+    def export(self, span: Span):
+        with self._lock:
+            session_id = self._sessions.pop(span.span_id, "")
+        job = self.service.get(session_id)
+        if job is None:
+            return
+        a = span.attributes
+        if span.name == "stateflow.state":
+            job.add_event(
+                "state", state=a.get("state"), next_state=a.get("next_state"), turn=a.get("turn"), duration_s=span.duration_s
+            )
+        elif span.name == "agent.reply":
+            job.add_event("agent_reply", agent=a.get("agent"), duration_s=span.duration_s)
+        elif span.name == "orchestrator.llm":
+            job.add_event(
+                "llm",
+                call_site=a.get("call_site"),
+                prompt_tokens=a.get("prompt_tokens", 0),
+                completion_tokens=a.get("completion_tokens", 0),
+                duration_s=span.duration_s,
+            )
+
+
+def default_answer(session: OrchestratorSession, task: str) -> str:
+    """The state flow's extracted output, else the last orchestrated message."""
+    if isinstance(session.final_output, str) and session.final_output:
+        return session.final_output
+    messages = session.orchestrated_messages
+    return str(messages[-1].get("content", "")) if messages else ""
+
+
+class OrchestratorService:
+    """Queues tasks with backpressure and runs them on an OrchestratorRuntime. Args:
+    - runtime: the runtime (its max_concurrent_sessions is the worker pool size)
+    - answer_fn: answer_fn(session, task) returns the final answer of a finished session
+    - max_queued: jobs waiting for a worker beyond this are rejected with QueueFullError
+    - max_finished_jobs: finished jobs kept for GET /jobs/<id>
+    Create the service before the runtime runs any session: it adds a span sink to the orchestrator's tracer.
+    """
+
+    def __init__(
+        self,
+        runtime: OrchestratorRuntime,
+        answer_fn: Callable[[OrchestratorSession, str], str] = default_answer,
+        max_queued: int = 32,
+        max_finished_jobs: int = 1000,
+    ):
+        self.runtime = runtime
+        self.answer_fn = answer_fn
+        self.max_queued = max_queued
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+        orchestrator = runtime.orchestrator
+        if orchestrator.tracer is NOOP_TRACER:
+            orchestrator.tracer = Tracer()
+        orchestrator.tracer.add_sink(JobEventSink(self))
+
+    def submit(self, task: str, job_id: Optional[str] = None) -> Job:
+        """Queues task. Raises QueueFullError or ServiceClosedError instead of queueing without bound."""
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            if self._closed:
+                raise ServiceClosedError("The service is shutting down.")
+            if self._queued >= self.max_queued:
+                raise QueueFullError(f"{self._queued} jobs are already waiting.")
+            if job_id in self._jobs:
+                raise ValueError(f"Job {job_id} already exists.")
+            job = self._jobs[job_id] = Job(job_id, task)
+            self._queued += 1
+        job.add_event("queued")
+        try:
+            job.future = self.runtime.submit(task, session_id=job_id)
+        except Exception as e:
+            # Not queued after all: don't leave it counted, or listed as queued forever.
+            with self._lock:
+                self._queued -= 1
+                self._jobs.pop(job_id, None)
+            if isinstance(e, RuntimeError):  # The runtime's executor has been shut down
+                raise ServiceClosedError(f"The runtime takes no more tasks: {e}") from e
+            raise
+        job.future.add_done_callback(lambda future: self._job_finished(job, future))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that has not started yet."""
+        job = self.get(job_id)
+        return bool(job and job.future and job.future.cancel())
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "max_queued": self.max_queued,
+                "workers": self.runtime.max_concurrent_sessions,
+                "closed": self._closed,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Rejects new jobs; lets queued and running ones finish (if wait)."""
+        with self._lock:
+            self._closed = True
+        self.runtime.shutdown(wait=wait)
+
+    def _job_started(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job.status != "queued":
+            return
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        with job.condition:
+            job.status, job.started = "running", time.time()
+            job.add_event("started")
+
+    def _job_finished(self, job: Job, future: Future):
+        started = job.status != "queued"
+        if not started:
+            with self._lock:
+                self._queued -= 1
+        if future.cancelled():
+            job.finish("cancelled", error="Cancelled before it started.")
+        elif future.exception() is not None:
+            e = future.exception()
+            job.finish("failed", error=f"{type(e).__name__}: {e}")
+        else:
+            try:
+                session = future.result()
+                cached = session.context.get("answer_cache")
+                if cached:
+                    job.add_event("answer_cache", **cached)
+                if cached and cached["reused"] == "answer":
+                    answer = session.final_output
+                else:
+                    answer = self.answer_fn(session, job.task)
+                    self.runtime.remember(session, answer)
+            except Exception as e:
+                log.exception(f"Preparing the answer of job {job.job_id} failed")
+                job.finish("failed", error=f"{type(e).__name__}: {e}")
+            else:
+                job.finish("done", answer=answer)
+        if started:
+            # The worker is busy until the answer is ready.
+            with self._lock:
+                self._running -= 1
+        self._forget_finished_jobs()
+
+    def _forget_finished_jobs(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.done]
+            for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+                del self._jobs[job_id]
+
+
+class OrchestratorHTTPServer(ThreadingHTTPServer):
+    """Serves an OrchestratorService's HTTP API (see the header)."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: OrchestratorService, retry_after: float = 5.0):
+        self.service = service
+        self.retry_after = retry_after
+        super().__init__(address, _JobsHandler)
+
+
+class _JobsHandler(BaseHTTPRequestHandler):
+    server: OrchestratorHTTPServer
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        url = urlparse(self.path)
+        return [p for p in url.path.split("/") if p], parse_qs(url.query)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            task = body["task"]
+            if not isinstance(task, str) or not task.strip():
+                raise ValueError("task must be a non-empty string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Expected a JSON body with a task: {e}"})
+            return
+        service, retry_after = self.server.service, {"Retry-After": f"{self.server.retry_after:g}"}
+        try:
+            job = service.submit(task, job_id=body.get("id"))
+        except QueueFullError as e:
+            self._send_json(429, {"error": str(e)}, retry_after)
+            return
+        except ServiceClosedError as e:
+            self._send_json(503, {"error": str(e)}, retry_after)
+            return
+        except ValueError as e:
+            self._send_json(409, {"error": str(e)})
+            return
+        self._send_json(202, job.to_dict(), {"Location": f"/jobs/{job.job_id}"})
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs" or self.server.service.get(parts[1]) is None:
+            self._send_json(404, {"error": "Not found"})
+        elif self.server.service.cancel(parts[1]):
+            self._send_json(200, self.server.service.get(parts[1]).to_dict())
+        else:
+            self._send_json(409, {"error": "The job has already started."})
+
+    def do_GET(self):
+        parts, query = self._route()
+        service = self.server.service
+        if parts == ["health"]:
+            self._send_json(200, service.health())
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in service.jobs()])
+        elif len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["events"]):
+            job = service.get(parts[1])
+            if job is None:
+                self._send_json(404, {"error": f"No job {parts[1]}"})
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            else:
+                after = query.get("after", [self.headers.get("Last-Event-ID")])[0]
+                self._stream_events(job, int(after) + 1 if after not in (None, "") else 0)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _stream_events(self, job: Job, after: int):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                events, done = job.wait_events(after, HEARTBEAT_SECONDS)
+                for event in events:
+                    self.wfile.write(f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n".encode("utf-8"))
+                after += len(events)
+                if done and not events:
+                    return
+                if not events:
+                    self.wfile.write(b": heartbeat\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away
+
+
+def build_service(
+    config_file: str = "OAI_CONFIG_LIST",
+    work_dir: str = "coding",
+    workers: int = 4,
+    max_queued: int = 32,
+    extraction_method: str = "running_summary",
+    answer_cache: Optional[AnswerCache] = None,
+) -> OrchestratorService:
+    """Builds the orchestrator_testbed team, one agent set (and work dir) per concurrent job, and a service that
+    answers with response_preparer() (or from answer_cache)."""
+    import autogen
+    from orchestrator_testbed import build_team, load_llm_configs, response_preparer
+
+    configs = load_llm_configs(config_file)
+    team = build_team(configs, work_dir=os.path.join(work_dir, "0"), extraction_method=extraction_method)
+    agent_sets = [0]
+
+    def agent_factory():
+        agent_sets[0] += 1
+        t = build_team(configs, work_dir=os.path.join(work_dir, str(agent_sets[0])), extraction_method=extraction_method)
+        return [t["assistant"], t["user_proxy"], t["web_surfer"]]
+
+    final_client = autogen.OpenAIWrapper(**configs["final_llm_config"])
+
+    def answer(session: OrchestratorSession, task: str) -> str:
+        running_summary = session.final_output if extraction_method == "running_summary" else None
+        return response_preparer(session.orchestrated_messages, final_client, prompt=task, running_summary=running_summary)
+
+    runtime = OrchestratorRuntime(
+        team["maestro"], agent_factory=agent_factory, max_concurrent_sessions=workers, answer_cache=answer_cache
+    )
+    return OrchestratorService(runtime, answer_fn=answer, max_queued=max_queued)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless HTTP job API for the Orchestrator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument("--max-queued", type=int, default=32, help="Waiting jobs before 429")
+    parser.add_argument("--config", default="OAI_CONFIG_LIST")
+    parser.add_argument("--work-dir", default="coding")
+    parser.add_argument("--extraction-method", default="running_summary", choices=["last_message", "running_summary"])
+    parser.add_argument("--cache-threshold", type=float, default=None, help="Reuse the answer of a task this similar (0-1)")
+    parser.add_argument("--cache-seed-threshold", type=float, default=None, help="Reuse the plan of a task this similar")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600.0, help="Seconds a cached answer lives")
+    parser.add_argument("--cache-size", type=int, default=1000, help="Cached answers kept")
+    args = parser.parse_args(argv)
+
+    answer_cache = None
+    if args.cache_threshold is not None:
+        answer_cache = AnswerCache(
+            threshold=args.cache_threshold, seed_threshold=args.cache_seed_threshold, ttl=args.cache_ttl, max_entries=args.cache_size
+        )
+    service = build_service(args.config, args.work_dir, args.workers, args.max_queued, args.extraction_method, answer_cache)
+    server = OrchestratorHTTPServer((args.host, args.port), service)
+    print(f"Orchestrator service at http://{args.host}:{args.port} ({args.workers} workers, {args.max_queued} queued)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# orchestrator_session.py -- Per-chat run state for Orchestrator, plus a pool of reusable StateFlows.
+#   Everything that used to live in run_chat() local variables (context, METADATA, turns, current state) or
+#   on the Orchestrator instance (orchestrated_messages) lives in an OrchestratorSession, so one Orchestrator
+#   can run many chats, one after another or concurrently.
+
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from autogen import Agent, ConversableAgent
+from stateflow import StateFlow
+from blob_store import BlobStore
+from agent_index import AgentIndex
+
+
+@dataclass
+class OrchestratorSession:
+    """The run state of a single Orchestrator chat. Contains following data fields:
+    - session_id: unique id of the session
+    - state_flow: the StateFlow driving this session (taken from a StateFlowPool)
+    - agents: the team members for this session
+    - sender: the agent that sent the task
+    - messages: working copy of the incoming messages (the task has been popped into METADATA)
+    - context: the state flow function context, incl. "METADATA", "criteria_list", "next_step", etc.
+    - orchestrated_messages: the orchestrator's transcript for this session
+    - current_state: the state that will run next, or the final state once the session has finished
+    - total_turns: turns taken so far
+    - final_output: the state flow's output_extraction() result, once the session has finished
+    - blob_store: where large message contents of this session are spilled, if enabled
+    - agent_index: index of the agents, if prompts list only the most relevant ones (Orchestrator's team_top_k)
+    """
+
+    session_id: str
+    state_flow: StateFlow
+    agents: List[ConversableAgent]
+    sender: Optional[Agent]
+    messages: List[Dict]
+    context: Dict[str, Any] = field(default_factory=dict)
+    orchestrated_messages: List[Dict] = field(default_factory=list)
+    current_state: Optional[str] = None
+    total_turns: int = 0
+    final_output: Optional[str] = None
+    blob_store: Optional[BlobStore] = None
+    agent_index: Optional[AgentIndex] = None
+
+    @property
+    def METADATA(self) -> Dict[str, str]:
+        return self.context["METADATA"]
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+
+class StateFlowPool:
+    """Thread-safe pool of reusable StateFlow instances. StateFlows are created on demand by factory and
+    compiled (check_states()) once. Released StateFlows keep their compiled dispatch table; only their
+    history is cleared.
+    """
+
+    def __init__(self, factory: Callable[[], StateFlow], max_idle: int = 8):
+        self._factory = factory
+        self._max_idle = max_idle
+        self._idle: List[StateFlow] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> StateFlow:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        state_flow = self._factory()
+        state_flow.check_states()
+        return state_flow
+
+    def release(self, state_flow: StateFlow):
+        state_flow.state_history.clear()
+        with self._lock:
+            if len(self._idle) < self._max_idle:
+                self._idle.append(state_flow)
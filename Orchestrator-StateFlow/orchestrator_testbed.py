@@ -3,6 +3,7 @@
 #
 # Design Notes:
 #   * This requires PR #1929 if you want to run web_surfer without a Bing key.
+#   * Importing this module has no side effects; build_team()/run_task() are also used by batch_testbed.py.
 #
 # STATUS: Working.
 #
@@ -14,10 +15,13 @@ sys.path.append(path.dirname(path.dirname(path.dirname(__file__)))) # Allows imp
 
 import autogen
 import copy
+import functools
 import traceback
 import re
+from concurrent.futures import ThreadPoolExecutor
 # import testbed_utils
 from autogen.agentchat.contrib.web_surfer_PR1929 import WebSurferAgent
+from autogen.coding import LocalCommandLineCodeExecutor
 # from autogen.agentchat.contrib.web_surfer import WebSurferAgent
 from autogen.token_count_utils import count_token, get_max_token_limit
 from autogen.browser_utils import (
@@ -29,14 +33,23 @@ from autogen.browser_utils import (
 )  # noqa: E402
 # from autogen.mdconvert import MarkdownConverter, UnsupportedFormatException
 from orchestrator import Orchestrator, Quantifier
+from conversion_cache import CachedMarkdownConverter, ConversionCache
+from caching_browser import make_caching_browser
+from warm_kernel import WarmPythonExecutor
+from execution_cache import CachingCodeExecutor
+from instrumentation import JsonlSpanSink, Tracer
+from profiling import StateProfiler
+from trace_store import TraceStore, TraceStoreSink
 from reflection_util import ReflectionUtil
-
-print("Running AutoGen version= " + autogen.__version__)
+from agent_transport import AgentTransport, QueueTransport
 
 # GAIA level 1 prompts:
 PROMPT = "If I combine a Beatle's first name and a type of beer, in what category and year of Nobel Prize do I have a winner? Answer using the format NAME, CATEGORY, YEAR."
 PROMPT_2 = "How many descendants of Keturah are named in 1 Chronicles 1:32? If there is a discrepancy between different translations, use the New International Version."
 
+# How many of the last messages response_preparer() sends along with a running summary.
+RUNNING_SUMMARY_TAIL = 3
+
 # testbed_utils.init()
 ##############################
 
@@ -51,56 +64,81 @@ PROMPT_2 = "How many descendants of Keturah are named in 1 Chronicles 1:32? If t
 # with open("prompt.txt", "rt") as fh:
 #     PROMPT = fh.read().strip()
 
-config_list = autogen.config_list_from_json("OAI_CONFIG_LIST")
-config_list2 = autogen.config_list_from_json(
-    "OAI_CONFIG_LIST",
-    filter_dict={"model": ["gpt-4-turbo-preview"]},
-)
-
-llm_config = {
-    "timeout": 300,
-    "cache_seed": None,
-    "config_list": config_list2,
-    "temperature": 0.1,
-}
-# llm_config = testbed_utils.default_llm_config(config_list, timeout=300)
-# llm_config["temperature"] = 0.1
-
-gpt4v = autogen.filter_config(config_list, {"model": ["gpt-4-vision-preview"]})[0]  # !!rm
-# gpt4v_azure = {
-#     "model": "gpt-4-turbo-v",
-#     "base_url": config_list[0]["base_url"],
-#     "api_key": config_list[0]["api_key"],
-#     "max_retries": 65535,
-#     "api_version": "2023-12-01-preview",
-#     "max_tokens": 1000,
-#     "api_type": "azure",
-# }
-
-summarizer_llm_config = llm_config
-final_llm_config = llm_config
-
-client = autogen.OpenAIWrapper(**final_llm_config)
-mlm_client = autogen.OpenAIWrapper(**gpt4v)
-# mlm_client = autogen.OpenAIWrapper(**gpt4v_azure)
-
-
-def response_preparer(inner_messages):
+def load_llm_configs(config_file: str = "OAI_CONFIG_LIST") -> dict:
+    """Returns the llm configs used by the testbed, keyed as llm_config, summarizer_llm_config,
+    final_llm_config and gpt4v."""
+    config_list = autogen.config_list_from_json(config_file)
+    config_list2 = autogen.config_list_from_json(
+        config_file,
+        filter_dict={"model": ["gpt-4-turbo-preview"]},
+    )
+
+    llm_config = {
+        "timeout": 300,
+        "cache_seed": None,
+        "config_list": config_list2,
+        "temperature": 0.1,
+    }
+    # llm_config = testbed_utils.default_llm_config(config_list, timeout=300)
+    # llm_config["temperature"] = 0.1
+
+    gpt4v = autogen.filter_config(config_list, {"model": ["gpt-4-vision-preview"]})[0]  # !!rm
+    # gpt4v_azure = {
+    #     "model": "gpt-4-turbo-v",
+    #     "base_url": config_list[0]["base_url"],
+    #     "api_key": config_list[0]["api_key"],
+    #     "max_retries": 65535,
+    #     "api_version": "2023-12-01-preview",
+    #     "max_tokens": 1000,
+    #     "api_type": "azure",
+    # }
+
+    return {
+        "config_list": config_list,
+        "llm_config": llm_config,
+        "summarizer_llm_config": llm_config,
+        "final_llm_config": llm_config,
+        "gpt4v": gpt4v,
+    }
+
+
+def response_preparer(
+    inner_messages,
+    client: autogen.OpenAIWrapper,
+    prompt: str = PROMPT,
+    running_summary: str = None,
+    speculative_guess: bool = True,
+):
+    """Returns the FINAL ANSWER for prompt. If running_summary (the orchestrator's rolling "answer so far")
+    is given, only it and the last few messages are sent instead of the whole transcript. If
+    speculative_guess, the EDUCATED GUESS request runs in parallel with the FINAL ANSWER request, rather
+    than after it fails."""
 
     messages = [
         {
             "role": "user",
             "content": f"""Earlier you were asked the following:
 
-{PROMPT}
+{prompt}
 
 Your team then worked diligently to address that request. Here is a transcript of that conversation:""",
         }
     ]
 
     # The first message just repeats the question, so remove it
-    if len(inner_messages) > 1:
-        del inner_messages[0]
+    inner_messages = inner_messages[1:] if len(inner_messages) > 1 else inner_messages
+
+    if running_summary:
+        messages[0]["content"] = f"""Earlier you were asked the following:
+
+{prompt}
+
+Your team then worked diligently to address that request. Here is a summary of what they found:
+
+{running_summary}
+
+Here are the last messages of their conversation:"""
+        inner_messages = inner_messages[-RUNNING_SUMMARY_TAIL:]
 
     # copy them to this context
     for message in inner_messages:
@@ -109,13 +147,13 @@ Your team then worked diligently to address that request. Here is a transcript o
         messages.append(message)
 
     # ask for the final answer
-    messages.append(
+    final_messages = messages + [
         {
             "role": "user",
             "content": f"""
 Read the above conversation and output a FINAL ANSWER to the question. The question is repeated here for convenience:
 
-{PROMPT}
+{prompt}
 
 To output the final answer, use the following template: FINAL ANSWER: [YOUR FINAL ANSWER]
 Your FINAL ANSWER should be a number OR as few words as possible OR a comma separated list of numbers and/or strings.
@@ -126,20 +164,10 @@ If you are asked for a comma separated list, apply the above rules depending on
 If you are unable to determine the final answer, output 'FINAL ANSWER: Unable to determine'
 """,
         }
-    )
-
-    response = client.create(context=None, messages=messages)
-    extracted_response = client.extract_text_or_completion_object(response)[0]
+    ]
 
-    # No answer
-    if "unable to determine" in extracted_response.lower():
-        print("\n>>>Making an educated guess.\n")
-        messages.append({"role": "assistant", "content": extracted_response})
-        messages.append(
-            {
-                "role": "user",
-                "content": """
-I understand that a definitive answer could not be determined. Please make a well-informed EDUCATED GUESS based on the conversation.
+    educated_guess_prompt = """
+Please make a well-informed EDUCATED GUESS based on the conversation.
 
 To output the educated guess, use the following template: EDUCATED GUESS: [YOUR EDUCATED GUESS]
 Your EDUCATED GUESS should be a number OR as few words as possible OR a comma separated list of numbers and/or strings. DO NOT OUTPUT 'I don't know', 'Unable to determine', etc.
@@ -147,136 +175,341 @@ ADDITIONALLY, your EDUCATED GUESS MUST adhere to any formatting instructions spe
 If you are asked for a number, express it numerically (i.e., with digits rather than words), don't use commas, and don't include units such as $ or percent signs unless specified otherwise.
 If you are asked for a string, don't use articles or abbreviations (e.g. for cities), unless specified otherwise. Don't output any final sentence punctuation such as '.', '!', or '?'.
 If you are asked for a comma separated list, apply the above rules depending on whether the elements are numbers or strings.
-""".strip(),
-            }
-        )
+""".strip()
+
+    def ask(request_messages):
+        response = client.create(context=None, messages=request_messages)
+        return client.extract_text_or_completion_object(response)[0]
+
+    if speculative_guess:
+        # The question is repeated in the guess request, since it can't see the FINAL ANSWER exchange.
+        guess_messages = messages + [
+            {"role": "user", "content": f"The question is repeated here for convenience:\n\n{prompt}\n\n{educated_guess_prompt}"}
+        ]
+        # Not a with-block: its exit would wait for the guess even when the final answer doesn't need it.
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            final_future = executor.submit(ask, final_messages)
+            guess_future = executor.submit(ask, guess_messages)
+            extracted_response = final_future.result()
+            if "unable to determine" not in extracted_response.lower():
+                return extracted_response
+            print("\n>>>Making an educated guess.\n")
+            return re.sub(r"EDUCATED GUESS:", "FINAL ANSWER:", guess_future.result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    extracted_response = ask(final_messages)
 
-        response = client.create(context=None, messages=messages)
-        extracted_response = client.extract_text_or_completion_object(response)[0]
-        return re.sub(r"EDUCATED GUESS:", "FINAL ANSWER:", extracted_response)
+    # No answer
+    if "unable to determine" in extracted_response.lower():
+        print("\n>>>Making an educated guess.\n")
+        guess_messages = final_messages + [
+            {"role": "assistant", "content": extracted_response},
+            {
+                "role": "user",
+                "content": "I understand that a definitive answer could not be determined. " + educated_guess_prompt,
+            },
+        ]
+        return re.sub(r"EDUCATED GUESS:", "FINAL ANSWER:", ask(guess_messages))
     else:
         return extracted_response
 
 
-TracedAssistantAgent = ReflectionUtil.add_tracing_to_class(autogen.AssistantAgent)
-assistant = TracedAssistantAgent(
-    "assistant",
-    is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
-    code_execution_config=False,
-    llm_config=llm_config,
-)
-ReflectionUtil.wrap_reply_funcs(assistant)
-ReflectionUtil.replace_conversable_agent_properties(assistant)
-
-TracedUserProxyAgent = ReflectionUtil.add_tracing_to_class(autogen.UserProxyAgent)
-user_proxy = TracedUserProxyAgent(
-    "computer_terminal",
-    human_input_mode="NEVER",
-    description="A computer terminal that performs no other action than running Python scripts (provided to it quoted in ```python code blocks), or sh shell scripts (provided to it quoted in ```sh code blocks)",
-    is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
-    code_execution_config={
-        "work_dir": "coding",
-        "use_docker": False,
-    },
-    default_auto_reply="",
-    max_consecutive_auto_reply=15,
-)
-ReflectionUtil.wrap_reply_funcs(user_proxy)
-ReflectionUtil.replace_conversable_agent_properties(user_proxy)
-
-# user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
-TracedWebSurferAgent = ReflectionUtil.add_tracing_to_class(WebSurferAgent)  
-
-browser = RequestsMarkdownBrowser(
-    downloads_folder=os.getcwd(),  # !!rm - TODO: provide dedicated "downloads" directory.
-    # search_engine=GoogleMarkdownSearch(),
-    search_engine=BingMarkdownSearch(),
-    # search_engine=BingMarkdownSearch(bing_api_key=bing_api_key),
-)
-
-web_surfer = WebSurferAgent(
-    "web_surfer",
-    llm_config=llm_config,
-    summarizer_llm_config=summarizer_llm_config,
-    is_termination_msg=lambda x: x.get("content", "").find("TERMINATE") >= 0,
-    browser=browser,
-)
-
-# web_surfer = TracedWebSurferAgent(
-#     "web_surfer",
-#     llm_config=llm_config,
-#     summarizer_llm_config=summarizer_llm_config,
-#     is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
-#     code_execution_config=False,
-#     browser_config={
-#         "bing_api_key": os.environ["BING_API_KEY"],
-#         "viewport_size": 1024 * 5,
-#         "downloads_folder": "coding",
-#         "request_kwargs": {
-#             "headers": {"User-Agent": user_agent},
-#         },
-#     },
-# )
-
-ReflectionUtil.wrap_reply_funcs(web_surfer)
-ReflectionUtil.replace_conversable_agent_properties(web_surfer)
-
-quantifier = Quantifier(
-    "quantifier",
-    llm_config={"config_list": config_list},
-)
-ReflectionUtil.wrap_reply_funcs(quantifier)
-ReflectionUtil.replace_conversable_agent_properties(quantifier)
-
-TracedOrchestrator = ReflectionUtil.add_tracing_to_class(
-    Orchestrator, detailed={"_broadcast_next_step_and_request_reply": ["next_speaker"]}
-)
-maestro = TracedOrchestrator(
-    "orchestrator",
-    agents=[assistant, user_proxy, web_surfer],
-    llm_config=llm_config,
-    quantifier=quantifier,
-)
-
-filename = "".strip()  # !!rm -- insert a filename here, if that is needed to solve the PROMPT.
-# filename = "__FILE_NAME__".strip()
-
-filename_prompt = ""
-if len(filename) > 0:
-    relpath = os.path.join("coding", filename)
-    filename_prompt = f"The question is about a file, document or image, which can be read from the file '{filename}' in current working directory."
-
-    mdconverter = MarkdownConverter(mlm_client=mlm_client)
-    mlm_prompt = """Write a detailed caption for this image. Pay special attention to any details that might be useful for someone answering the following:
-
-{PROMPT}
-""".strip()
+@functools.lru_cache(maxsize=None)
+def traced_classes():
+    """Adds tracing to the agent classes. Done once per process, since it patches the classes in place."""
+    return {
+        "AssistantAgent": ReflectionUtil.add_tracing_to_class(autogen.AssistantAgent),
+        "UserProxyAgent": ReflectionUtil.add_tracing_to_class(autogen.UserProxyAgent),
+        "WebSurferAgent": ReflectionUtil.add_tracing_to_class(WebSurferAgent),
+        "Orchestrator": ReflectionUtil.add_tracing_to_class(
+            Orchestrator, detailed={"_broadcast_next_step_and_request_reply": ["next_speaker"]}
+        ),
+    }
+
+
+def _build_computer_terminal(work_dir: str = "coding", warm_kernel: bool = False, exec_cache_dir: str = None):
+    """Returns computer_terminal and its code executor (None for autogen's default one)."""
+    code_executor = WarmPythonExecutor(work_dir=work_dir) if warm_kernel else None
+    if exec_cache_dir:
+        code_executor = CachingCodeExecutor(
+            code_executor if code_executor else LocalCommandLineCodeExecutor(work_dir=work_dir), cache_dir=exec_cache_dir
+        )
+    TracedUserProxyAgent = traced_classes()["UserProxyAgent"]
+    user_proxy = TracedUserProxyAgent(
+        "computer_terminal",
+        human_input_mode="NEVER",
+        description="A computer terminal that performs no other action than running Python scripts (provided to it quoted in ```python code blocks), or sh shell scripts (provided to it quoted in ```sh code blocks)",
+        is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
+        code_execution_config={"executor": code_executor} if code_executor else {
+            "work_dir": work_dir,
+            "use_docker": False,
+        },
+        default_auto_reply="",
+        max_consecutive_auto_reply=15,
+    )
+    ReflectionUtil.wrap_reply_funcs(user_proxy)
+    ReflectionUtil.replace_conversable_agent_properties(user_proxy)
+    return user_proxy, code_executor
+
+
+def make_computer_terminal(work_dir: str = "coding", warm_kernel: bool = False, exec_cache_dir: str = None):
+    """Agent factory for agent_transport: computer_terminal, as build_team() makes it. A warm kernel is
+    stopped when the hosting process exits."""
+    return _build_computer_terminal(work_dir, warm_kernel, exec_cache_dir)[0]
+
+
+def make_web_surfer(
+    configs: dict,
+    downloads_folder: str = None,
+    web_cache_dir: str = None,
+    web_fixture_dir: str = None,
+    web_offline: bool = False,
+):
+    """Agent factory for agent_transport (and build_team()): web_surfer, with its fetches, searches and page
+    conversions cached in web_cache_dir, if set (see build_team())."""
+    # user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
+    TracedWebSurferAgent = traced_classes()["WebSurferAgent"]  
+
+    if web_cache_dir:
+        browser = make_caching_browser(
+            web_cache_dir,
+            downloads_folder=downloads_folder if downloads_folder else os.getcwd(),
+            search_engine=None if web_offline else BingMarkdownSearch(),
+            fixture_dir=web_fixture_dir,
+            offline=web_offline,
+        )
+    else:
+        browser = RequestsMarkdownBrowser(
+            downloads_folder=downloads_folder if downloads_folder else os.getcwd(),  # !!rm - TODO: provide dedicated "downloads" directory.
+            # search_engine=GoogleMarkdownSearch(),
+            search_engine=BingMarkdownSearch(),
+            # search_engine=BingMarkdownSearch(bing_api_key=bing_api_key),
+        )
 
-    try:
-        res = mdconverter.convert(relpath, mlm_prompt=mlm_prompt)
-        filename_prompt += " Here are the file's contents:\n\n" + res.text_content
-    except UnsupportedFormatException:
-        pass
+    web_surfer = WebSurferAgent(
+        "web_surfer",
+        llm_config=configs["llm_config"],
+        summarizer_llm_config=configs["summarizer_llm_config"],
+        is_termination_msg=lambda x: x.get("content", "").find("TERMINATE") >= 0,
+        browser=browser,
+    )
 
+    # web_surfer = TracedWebSurferAgent(
+    #     "web_surfer",
+    #     llm_config=llm_config,
+    #     summarizer_llm_config=summarizer_llm_config,
+    #     is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
+    #     code_execution_config=False,
+    #     browser_config={
+    #         "bing_api_key": os.environ["BING_API_KEY"],
+    #         "viewport_size": 1024 * 5,
+    #         "downloads_folder": "coding",
+    #         "request_kwargs": {
+    #             "headers": {"User-Agent": user_agent},
+    #         },
+    #     },
+    # )
+
+    ReflectionUtil.wrap_reply_funcs(web_surfer)
+    ReflectionUtil.replace_conversable_agent_properties(web_surfer)
+    return web_surfer
+
+
+def build_team(
+    configs: dict,
+    work_dir: str = "coding",
+    downloads_folder: str = None,
+    extraction_method: str = "last_message",
+    web_cache_dir: str = None,
+    web_fixture_dir: str = None,
+    web_offline: bool = False,
+    warm_kernel: bool = False,
+    exec_cache_dir: str = None,
+    tracer: Tracer = None,
+    transport: AgentTransport = None,
+) -> dict:
+    """Builds the agents and the orchestrator. Returns them keyed as assistant, user_proxy, web_surfer,
+    quantifier and maestro, plus code_executor. If web_cache_dir is set, web_surfer's fetches, searches and
+    page conversions are cached there (see caching_browser.py); web_offline serves them from
+    web_fixture_dir/web_cache_dir only. If warm_kernel is set, computer_terminal runs Python blocks in a
+    stateful WarmPythonExecutor (see warm_kernel.py); stop it with code_executor.stop(). If exec_cache_dir is
+    set, results of re-run scripts are served from there (see execution_cache.py; not with warm_kernel).
+    The orchestrator emits spans to tracer (see instrumentation.py), if given. If transport is given (see
+    agent_transport.py), web_surfer and computer_terminal are hosted by it, and code_executor is None: the
+    hosting process owns it."""
+    llm_config = configs["llm_config"]
+    traced = traced_classes()
+
+    TracedAssistantAgent = traced["AssistantAgent"]
+    assistant = TracedAssistantAgent(
+        "assistant",
+        is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0,
+        code_execution_config=False,
+        llm_config=llm_config,
+    )
+    ReflectionUtil.wrap_reply_funcs(assistant)
+    ReflectionUtil.replace_conversable_agent_properties(assistant)
+
+    if transport:
+        code_executor = None
+        user_proxy = transport.start_agent(make_computer_terminal, work_dir, warm_kernel, exec_cache_dir)
+        web_surfer = transport.start_agent(
+            make_web_surfer, configs, downloads_folder, web_cache_dir, web_fixture_dir, web_offline
+        )
+    else:
+        user_proxy, code_executor = _build_computer_terminal(work_dir, warm_kernel, exec_cache_dir)
+        web_surfer = make_web_surfer(configs, downloads_folder, web_cache_dir, web_fixture_dir, web_offline)
 
-question = f"""{PROMPT}
+    quantifier = Quantifier(
+        "quantifier",
+        llm_config={"config_list": configs["config_list"]},
+    )
+    ReflectionUtil.wrap_reply_funcs(quantifier)
+    ReflectionUtil.replace_conversable_agent_properties(quantifier)
+
+    TracedOrchestrator = traced["Orchestrator"]
+    maestro = TracedOrchestrator(
+        "orchestrator",
+        agents=[assistant, user_proxy, web_surfer],
+        llm_config=llm_config,
+        quantifier=quantifier,
+        extraction_method=extraction_method,
+        tracer=tracer,
+    )
+    return {
+        "assistant": assistant,
+        "user_proxy": user_proxy,
+        "web_surfer": web_surfer,
+        "quantifier": quantifier,
+        "maestro": maestro,
+        "code_executor": code_executor,
+    }
+
+
+def prepare_question(prompt: str, filename: str, configs: dict, work_dir: str = "coding", conversion_cache_dir: str = None) -> str:
+    """Returns the question for prompt. If filename is set, the file (in work_dir) is converted to markdown
+    and included. Conversions are cached in conversion_cache_dir, if given."""
+    filename_prompt = ""
+    if len(filename) > 0:
+        relpath = os.path.join(work_dir, filename)
+        filename_prompt = f"The question is about a file, document or image, which can be read from the file '{filename}' in current working directory."
+
+        mlm_client = autogen.OpenAIWrapper(**configs["gpt4v"])
+        # mlm_client = autogen.OpenAIWrapper(**gpt4v_azure)
+        mdconverter = MarkdownConverter(mlm_client=mlm_client)
+        if conversion_cache_dir:
+            mdconverter = CachedMarkdownConverter(
+                mdconverter, ConversionCache(conversion_cache_dir), converter_version=f"autogen-{autogen.__version__}"
+            )
+        mlm_prompt = f"""Write a detailed caption for this image. Pay special attention to any details that might be useful for someone answering the following:
+
+{prompt}
+""".strip()
+
+        try:
+            res = mdconverter.convert(relpath, mlm_prompt=mlm_prompt)
+            filename_prompt += " Here are the file's contents:\n\n" + res.text_content
+        except UnsupportedFormatException:
+            pass
+
+    return f"""{prompt}
 
 {filename_prompt}
 """.strip()
 
-try:
-    # Initiate one turn of the conversation
-    user_proxy.send(
-        question,
-        maestro,
-        request_reply=True,
-        silent=False,
+
+def run_task(
+    prompt: str,
+    filename: str = "",
+    configs: dict = None,
+    work_dir: str = "coding",
+    downloads_folder: str = None,
+    extraction_method: str = "last_message",
+    conversion_cache_dir: str = None,
+    web_cache_dir: str = None,
+    web_fixture_dir: str = None,
+    web_offline: bool = False,
+    warm_kernel: bool = False,
+    exec_cache_dir: str = None,
+    trace_file: str = None,
+    profile_dir: str = None,
+    trace_store_dir: str = None,
+    task_id: str = "",
+    task_type: str = "",
+    hosted_agents: bool = False,
+) -> str:
+    """Runs one task with a freshly built team. Returns the prepared final answer. With extraction_method
+    "running_summary" the orchestrator keeps a rolling answer so far, and the final answer is a short call.
+    If trace_file is set, the run's spans are appended to it as JSONL. If profile_dir is set, the run is
+    profiled (see profiling.py) and flamegraph stacks and a memory report are written there. If
+    trace_store_dir is set, transition, LLM call and session records (labeled task_id/task_type) are appended
+    to the TraceStore there (see trace_store.py). If hosted_agents is set, web_surfer and computer_terminal run
+    in worker processes of their own (see agent_transport.py), so they don't hold the orchestrator's GIL."""
+    configs = configs if configs else load_llm_configs()
+    profiler = StateProfiler() if profile_dir else None
+    sinks = ([JsonlSpanSink(trace_file)] if trace_file else []) + ([profiler] if profiler else [])
+    if trace_store_dir:
+        model = configs["llm_config"]["config_list"][0].get("model", "") if configs["llm_config"].get("config_list") else ""
+        sinks.append(TraceStoreSink(TraceStore(trace_store_dir), task_id=task_id, task_type=task_type, model=model))
+    tracer = Tracer(sinks) if sinks else None
+    transport = QueueTransport() if hosted_agents else None
+    team = build_team(
+        configs,
+        work_dir=work_dir,
+        downloads_folder=downloads_folder,
+        extraction_method=extraction_method,
+        web_cache_dir=web_cache_dir,
+        web_fixture_dir=web_fixture_dir,
+        web_offline=web_offline,
+        warm_kernel=warm_kernel,
+        exec_cache_dir=exec_cache_dir,
+        tracer=tracer,
+        transport=transport,
     )
-except:
-    traceback.print_exc()
+    maestro = team["maestro"]
+    question = prepare_question(prompt, filename, configs, work_dir=work_dir, conversion_cache_dir=conversion_cache_dir)
 
-print()
-print(response_preparer(maestro.orchestrated_messages))
+    try:
+        if profiler:
+            profiler.start()
+        # Initiate one turn of the conversation
+        team["user_proxy"].send(
+            question,
+            maestro,
+            request_reply=True,
+            silent=False,
+        )
+    except:
+        traceback.print_exc()
+        ReflectionUtil.dump(last=200)
+    finally:
+        maestro.close()
+        if isinstance(team["code_executor"], WarmPythonExecutor):
+            team["code_executor"].stop()
+        if transport:
+            transport.close()
+        if profiler:
+            profiler.stop()
+            profiler.write(profile_dir)
+        if tracer:
+            tracer.close()
+
+    client = autogen.OpenAIWrapper(**configs["final_llm_config"])
+    session = maestro.last_session
+    running_summary = session.final_output if session and extraction_method == "running_summary" else None
+    return response_preparer(maestro.orchestrated_messages, client, prompt=prompt, running_summary=running_summary)
+
+
+if __name__ == "__main__":
+    print("Running AutoGen version= " + autogen.__version__)
+
+    filename = "".strip()  # !!rm -- insert a filename here, if that is needed to solve the PROMPT.
+    # filename = "__FILE_NAME__".strip()
+
+    print()
+    print(run_task(PROMPT, filename))
 
 ##############################
 # testbed_utils.finalize(agents=[assistant, user_proxy, web_surfer, maestro])
@@ -0,0 +1,205 @@
+# profiling.py -- Profiling mode for Orchestrator/StateFlow runs: sampled CPU and wall time, and memory growth,
+#   attributed to the current state, action, agent and LLM call site.
+#
+# Design Notes:
+#   * StateProfiler is a span sink (see instrumentation.py): on_start()/export() keep a stack of the open
+#       spans per thread, so a sample is attributed to eg. state:OBTAIN_NEXTSTEP;llm:next_step.
+#   * A daemon thread samples sys._current_frames() every interval seconds. Each sample adds 1 to the
+#       thread's folded stack (wall time: includes waiting for the LLM) and the thread's CPU time since its
+#       previous sample (CPU time: our own Python overhead only; Linux/Unix via pthread_getcpuclockid).
+#       Both are written in the folded format of flamegraph.pl / speedscope / inferno:
+#           state:EXECUTE_NEXTSTEP;agent:assistant;orchestrator.py:_request_reply;... 42
+#   * Memory: with tracemalloc, every span records the traced-memory delta between its start and end;
+#       they are aggregated per state/action/agent. tracemalloc is process wide, so the deltas of concurrent
+#       spans overlap. A snapshot diff between start() and stop() lists the top growing allocation sites,
+#       eg. an ever-growing history.
+#   * Overhead: sampling is cheap; tracemalloc slows allocation-heavy code noticeably (trace_memory=False
+#       disables it).
+#
+# Usage:
+#   profiler = StateProfiler()
+#   maestro = Orchestrator(..., tracer=Tracer([profiler]))
+#   with profiler:
+#       user_proxy.send(task, maestro, request_reply=True)
+#   profiler.write("profile")   # wall.folded, cpu.folded, memory.json, memory.txt
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import Span
+
+# The attribute that labels a span in the folded stacks and the memory report, by span name.
+_LABEL_KEYS = (("state", "state"), ("action", "action"), ("call_site", "llm"), ("agent", "agent"))
+
+
+def span_label(span: Span) -> str:
+    if span.name == "orchestrator.session":
+        return "session"
+    for key, prefix in _LABEL_KEYS:
+        if key in span.attributes:
+            return f"{prefix}:{span.attributes[key]}"
+    return span.name
+
+
+class StateProfiler:
+    """Samples the threads running spans. Args:
+    - interval: seconds between samples
+    - trace_memory: attribute tracemalloc deltas to spans
+    - max_stack_depth: innermost frames kept per sample
+    - top_allocations: number of growing allocation sites reported
+    """
+
+    def __init__(self, interval: float = 0.01, trace_memory: bool = True, max_stack_depth: int = 64, top_allocations: int = 25):
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.max_stack_depth = max_stack_depth
+        self.top_allocations = top_allocations
+        self.wall_stacks: Dict[str, int] = defaultdict(int)
+        self.cpu_stacks: Dict[str, float] = defaultdict(float)  # seconds
+        self.memory: Dict[str, Dict[str, float]] = {}
+        self.top_growth: List[str] = []
+        self._open: Dict[int, List[Tuple[Span, int]]] = {}  # thread id -> [(span, traced memory at start)]
+        self._cpu_seen: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot = None
+        self._started_tracemalloc = False
+
+    # --- span sink ---
+
+    def on_start(self, span: Span):
+        memory = tracemalloc.get_traced_memory()[0] if self.trace_memory and tracemalloc.is_tracing() else 0
+        with self._lock:
+            self._open.setdefault(threading.get_ident(), []).append((span, memory))
+
+    def export(self, span: Span):
+        ident = threading.get_ident()
+        with self._lock:
+            stack = self._open.get(ident, [])
+            index = next((i for i in range(len(stack) - 1, -1, -1) if stack[i][0] is span), None)
+            if index is None:
+                return  # Started before the profiler was attached
+            memory_at_start = stack[index][1]
+            del stack[index:]  # Also drops anything left open above it
+            if not stack:
+                del self._open[ident]
+        if self.trace_memory and tracemalloc.is_tracing():
+            delta = tracemalloc.get_traced_memory()[0] - memory_at_start
+            with self._lock:
+                m = self.memory.setdefault(span_label(span), {"count": 0, "growth_bytes": 0, "max_growth_bytes": 0})
+                m["count"] += 1
+                m["growth_bytes"] += delta
+                m["max_growth_bytes"] = max(m["max_growth_bytes"], delta)
+
+    # --- sampling ---
+
+    def start(self):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="state_profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.trace_memory and self._snapshot is not None:
+            stats = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            self.top_growth = [str(stat) for stat in stats[: self.top_allocations] if stat.size_diff > 0]
+            self._snapshot = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    @staticmethod
+    def _thread_cpu_time(ident: int) -> Optional[float]:
+        try:
+            return time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (AttributeError, OSError, OverflowError):
+            return None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                open_spans = {ident: [span for span, _ in stack] for ident, stack in self._open.items() if ident != own}
+            for ident, spans in open_spans.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = self._folded(spans, frame)
+                cpu = self._thread_cpu_time(ident)
+                with self._lock:
+                    self.wall_stacks[stack] += 1
+                    if cpu is not None:
+                        previous = self._cpu_seen.get(ident)
+                        if previous is not None and cpu > previous:
+                            self.cpu_stacks[stack] += cpu - previous
+                        self._cpu_seen[ident] = cpu
+
+    def _folded(self, spans: List[Span], frame) -> str:
+        code_frames = []
+        while frame is not None and len(code_frames) < self.max_stack_depth:
+            code = frame.f_code
+            code_frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join([span_label(s) for s in spans] + code_frames[::-1])
+
+    # --- reports ---
+
+    def state_times(self) -> Dict[str, Dict[str, float]]:
+        """Returns sampled wall and CPU seconds per state (or per outermost span, outside of states)."""
+        result: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            wall, cpu = dict(self.wall_stacks), dict(self.cpu_stacks)
+        for stack, samples in wall.items():
+            labels = [part for part in stack.split(";") if part.startswith("state:")]
+            key = labels[-1] if labels else stack.split(";", 1)[0]
+            r = result.setdefault(key, {"wall_s": 0.0, "cpu_s": 0.0})
+            r["wall_s"] += samples * self.interval
+            r["cpu_s"] += cpu.get(stack, 0.0)
+        return result
+
+    def write(self, directory: str):
+        """Writes wall.folded and cpu.folded (CPU in microseconds), memory.json and a readable memory.txt."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            wall, cpu, memory = dict(self.wall_stacks), dict(self.cpu_stacks), json.loads(json.dumps(self.memory))
+        with open(os.path.join(directory, "wall.folded"), "wt") as f:
+            for stack, samples in sorted(wall.items()):
+                f.write(f"{stack} {samples}\n")
+        with open(os.path.join(directory, "cpu.folded"), "wt") as f:
+            for stack, seconds in sorted(cpu.items()):
+                if int(seconds * 1e6) > 0:
+                    f.write(f"{stack} {int(seconds * 1e6)}\n")
+        report = {"by_span": memory, "state_times": self.state_times(), "top_growth": self.top_growth}
+        with open(os.path.join(directory, "memory.json"), "wt") as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.join(directory, "memory.txt"), "wt") as f:
+            f.write(f"{'span':<50} {'count':>7} {'growth KiB':>12} {'max KiB':>10}\n")
+            for label, m in sorted(memory.items(), key=lambda item: -item[1]["growth_bytes"]):
+                f.write(f"{label:<50} {m['count']:>7} {m['growth_bytes'] / 1024:>12.1f} {m['max_growth_bytes'] / 1024:>10.1f}\n")
+            f.write("\nTop growing allocation sites:\n")
+            for line in self.top_growth:
+                f.write(f"  {line}\n")
@@ -13,6 +13,10 @@ class OrchestratorPromptTemplates(TypedDict):
     rethink_facts: Template
     new_plan: Template
     quantifier_sys_message: Template
+    quantifier_batch: Template
+    running_summary: Template
+    decompose_task: Template
+    research_plan: Template
 
 
 defaultPromptTemplates: OrchestratorPromptTemplates = {
@@ -99,6 +103,47 @@ $prev_facts
 Team membership:
 $team
 """
+    ),
+    "running_summary": Template(
+        """We are working on the following request:
+
+$task
+
+Here is the answer so far, as summarized from the conversation up to now (it may be empty):
+
+$summary
+
+Here are the newest messages of the conversation:
+
+$new_messages
+
+Please rewrite the answer so far to include anything new learned from the newest messages. Keep it short: the best current answer to the request, plus the key facts, figures and sources that support it (or what is still unknown). Output only the updated answer so far.
+"""
+    ),
+    "decompose_task": Template(
+        """Below I will present you a request. Before we begin addressing the request, please consider whether it can be split into independent sub-tasks that separate teams could work on at the same time, without needing each other's results.
+
+Here is the request:
+
+$task
+
+If it can, list at most $max_subtasks sub-tasks. Phrase each sub-task as a complete, self-contained request, including any information from the original request that it needs. If the request cannot be split, or if it is simple enough to address directly, output an empty list.
+
+Please output an answer in pure JSON format according to the following schema. The JSON object must be parsable as-is. DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
+
+    {"subtasks": [string, ...]}
+"""
+    ),
+    "research_plan": Template(
+        """To address this request we have assembled the following team:
+
+$team
+
+Plan:
+- Search the web for each of the FACTS TO LOOK UP
+- Open and read the most relevant and authoritative sources, rather than relying on search result snippets
+- Derive any remaining facts from what was found
+- Report the answer, with the facts, figures and sources that support it, or state what could not be found"""
     ),
     "quantifier_sys_message": Template(
         """You are a helpful assistant. You quantify the output of different tasks based on the given criteria. 
@@ -107,6 +152,13 @@ $team
         You are going to quantify each of the criteria for a given task based on the task description. 
         Return a dictionary where the keys are the criteria and the values are the assessed performance based on accepted values for each criteria. 
         Return only the dictionary.
+"""
+    ),
+    "quantifier_batch": Template(
+        """criterion = $criterion_json
+tasks = $tasks_json
+
+Quantify each of the tasks above separately. Return a dictionary where the keys are the task ids and the values are the dictionaries of assessed criteria for that task.
 """
     ),
 }
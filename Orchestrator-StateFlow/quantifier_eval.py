@@ -0,0 +1,186 @@
+# quantifier_eval.py -- Batched, parallel scoring of run transcripts with a Quantifier.
+#
+# Design Notes:
+#   * Input is many (task, transcript, criteria) items, eg. built from batch_testbed.py results.
+#   * Items that share the same criteria are packed into one request (up to items_per_request items or
+#       max_chars_per_request characters), using the "quantifier_batch" prompt template.
+#   * Requests run concurrently on a bounded thread pool. A failed request (eg. a rate limit error) leaves its items
+#       unscored (None) and does not stop the others.
+#   * Scores are cached by a content hash of (system message, criteria, task, transcript) in an append-only
+#       JSONL file, so re-scoring the same runs is free.
+#   * Results are returned, and written, column-wise: one column per criterion plus item_id and item_hash.
+#
+# Usage:
+#   evaluator = QuantifierEvaluator(quantifier, cache_path="scores_cache.jsonl", max_workers=8)
+#   columns = evaluator.evaluate(items)
+#   QuantifierEvaluator.write_columns(columns, "scores.json")
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+from prompt_templates import defaultPromptTemplates
+
+
+def transcript_to_text(transcript: Union[str, List[Dict]]) -> str:
+    """Renders a transcript (a string, or a list of OpenAI-style messages) as plain text."""
+    if isinstance(transcript, str):
+        return transcript
+    lines = []
+    for message in transcript:
+        name = message.get("name") or message.get("role", "")
+        lines.append(f"{name}: {message.get('content') or ''}")
+    return "\n".join(lines)
+
+
+def _parse_json_reply(reply: Any) -> Dict:
+    if isinstance(reply, dict):
+        reply = reply.get("content") or ""
+    # Tolerate replies wrapped in a ```json fenced block
+    match = re.search(r"```(?:json)?\s*(.*?)```", reply, re.DOTALL)
+    if match:
+        reply = match.group(1)
+    return json.loads(reply)
+
+
+class QuantifierEvaluator:
+    """Scores many items with a Quantifier. Each item is a Dict with keys:
+    - task: Dict (eg. {"question": ..., "answer": ...}) or str
+    - transcript: str or List of messages (optional)
+    - criteria: Dict in the Quantifier criterion format
+    - id: optional item id (defaults to the item's content hash)
+    """
+
+    def __init__(
+        self,
+        quantifier,
+        cache_path: Optional[str] = None,
+        max_workers: int = 4,
+        items_per_request: int = 5,
+        max_chars_per_request: int = 40000,
+    ):
+        self.quantifier = quantifier
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.items_per_request = max(1, items_per_request)
+        self.max_chars_per_request = max_chars_per_request
+        self._cache: Dict[str, Dict] = {}
+        self._cache_lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rt") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._cache[entry["hash"]] = entry["scores"]
+
+    def item_hash(self, item: Dict) -> str:
+        h = hashlib.sha256()
+        for part in (
+            self.quantifier.system_message,
+            json.dumps(item["criteria"], sort_keys=True),
+            json.dumps(item["task"], sort_keys=True),
+            transcript_to_text(item.get("transcript", "")),
+        ):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def evaluate(self, items: List[Dict]) -> Dict[str, List]:
+        """Scores the items. Returns columns: item_id, item_hash, and one column per criterion
+        (None where an item could not be scored)."""
+        hashes = [self.item_hash(item) for item in items]
+
+        # Pack uncached items with identical criteria into requests
+        groups: Dict[str, List[int]] = {}
+        seen = set()
+        for i, (item, h) in enumerate(zip(items, hashes)):
+            if h in self._cache or h in seen:
+                continue
+            seen.add(h)
+            groups.setdefault(json.dumps(item["criteria"], sort_keys=True), []).append(i)
+        batches = []
+        for indices in groups.values():
+            batch, batch_chars = [], 0
+            for i in indices:
+                item_chars = len(json.dumps(self._task_payload(items[i])))
+                if batch and (len(batch) >= self.items_per_request or batch_chars + item_chars > self.max_chars_per_request):
+                    batches.append(batch)
+                    batch, batch_chars = [], 0
+                batch.append(i)
+                batch_chars += item_chars
+            if batch:
+                batches.append(batch)
+
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="quantifier") as executor:
+                list(executor.map(lambda batch: self._score_batch(batch, items, hashes), batches))
+
+        criteria_names = []
+        for item in items:
+            for name in item["criteria"]:
+                if name not in criteria_names:
+                    criteria_names.append(name)
+        columns: Dict[str, List] = {"item_id": [], "item_hash": []}
+        columns.update({name: [] for name in criteria_names})
+        for item, h in zip(items, hashes):
+            scores = self._cache.get(h, {})
+            columns["item_id"].append(item.get("id", h))
+            columns["item_hash"].append(h)
+            for name in criteria_names:
+                columns[name].append(scores.get(name))
+        return columns
+
+    @staticmethod
+    def write_columns(columns: Dict[str, List], path: str):
+        with open(path, "wt") as fh:
+            json.dump({"num_rows": len(columns["item_id"]), "columns": columns}, fh)
+
+    @staticmethod
+    def _task_payload(item: Dict) -> Dict:
+        payload = {"task": item["task"]}
+        if item.get("transcript"):
+            payload["transcript"] = transcript_to_text(item["transcript"])
+        return payload
+
+    def _score_batch(self, batch: List[int], items: List[Dict], hashes: List[str]):
+        tasks = {str(n): self._task_payload(items[i]) for n, i in enumerate(batch)}
+        content = defaultPromptTemplates["quantifier_batch"].substitute(
+            criterion_json=json.dumps(items[batch[0]]["criteria"]), tasks_json=json.dumps(tasks)
+        )
+        try:
+            reply = self.quantifier.generate_reply(messages=[{"role": "user", "content": content, "name": "user"}])
+        except Exception as e:
+            # Eg. an API or rate limit error: leave this batch unscored (None), but let the other batches run.
+            logging.warning(f"QuantifierEvaluator: scoring a batch of {len(batch)} items failed ({type(e).__name__}: {e})")
+            return
+        try:
+            scored = _parse_json_reply(reply)
+        except (json.JSONDecodeError, TypeError) as e:
+            logging.info(f"QuantifierEvaluator: unparsable batch reply ({e})")
+            scored = {}
+
+        missing = []
+        for n, i in enumerate(batch):
+            scores = scored.get(str(n)) if isinstance(scored, dict) else None
+            if isinstance(scores, dict):
+                self._store(hashes[i], scores)
+            else:
+                missing.append(i)
+
+        # The model dropped or mangled some items: score those one at a time.
+        if len(batch) > 1:
+            for i in missing:
+                self._score_batch([i], items, hashes)
+
+    def _store(self, h: str, scores: Dict):
+        with self._cache_lock:
+            self._cache[h] = scores
+            if self.cache_path:
+                with open(self.cache_path, "at") as fh:
+                    fh.write(json.dumps({"hash": h, "scores": scores}) + "\n")
@@ -1,59 +1,198 @@
+# reflection_util.py -- Method tracing for agent and orchestrator classes.
+#
+# Design Notes:
+#   * Wrapped calls are recorded into a bounded in-memory ring buffer (a deque). Records hold no references to
+#       the traced objects: detailed arguments and results are formatted at capture time with reprlib (truncated
+#       to max_arg_chars), other results as their type and length, and exceptions as
+#       their type name and message. So the buffer's memory is bounded by buffer_size records of bounded size,
+#       and it never keeps agents, message lists or traceback frames alive.
+#   * Tracing is configured on the class at runtime, without re-wrapping classes: enabled, echo (also print
+#       each record as it happens, like the original %%% lines), sample_rate, buffer_size, max_arg_chars.
+#   * Sampling is per call: enter and return records of a call are kept or dropped together.
+#
+# Usage:
+#   ReflectionUtil.configure(enabled=True, sample_rate=0.1)
+#   ...
+#   ReflectionUtil.dump(last=100)
+
+from collections import deque
 from datetime import datetime
 import functools
+import random
+import reprlib
+import sys
+import threading
+import time
 import types
 import autogen
 import copy
 import inspect
-from typing import Dict, List
+from typing import Any, Deque, Dict, List, Optional, TextIO, Tuple
 
 
 class ReflectionUtil:
+    enabled: bool = True
+    echo: bool = False
+    sample_rate: float = 1.0
+    max_arg_chars: int = 200
+    buffer_size: int = 10000
+    # Records: (timestamp, tag, name, qualified method name, event, detailed, payload)
+    _buffer: Deque[Tuple] = deque(maxlen=10000)
+    _lock = threading.Lock()
+    _repr_cache: Optional[reprlib.Repr] = None
+
+    @classmethod
+    def configure(
+        cls,
+        enabled: Optional[bool] = None,
+        echo: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        buffer_size: Optional[int] = None,
+        max_arg_chars: Optional[int] = None,
+    ):
+        """Changes tracing at runtime. Takes effect for already wrapped methods, too."""
+        if enabled is not None:
+            cls.enabled = enabled
+        if echo is not None:
+            cls.echo = echo
+        if sample_rate is not None:
+            cls.sample_rate = sample_rate
+        if max_arg_chars is not None:
+            cls.max_arg_chars = max_arg_chars
+            cls._repr_cache = None
+        if buffer_size is not None and buffer_size != cls.buffer_size:
+            with cls._lock:
+                cls.buffer_size = buffer_size
+                cls._buffer = deque(cls._buffer, maxlen=buffer_size)
+
+    @classmethod
+    def _sampled(cls) -> bool:
+        return cls.sample_rate >= 1.0 or random.random() < cls.sample_rate
+
+    @classmethod
+    def _record(cls, tag: str, name: str, qualname: str, event: str, detailed: bool, payload: Any):
+        record = (time.time(), tag, name, qualname, event, detailed, payload)
+        cls._buffer.append(record)
+        if cls.echo:
+            print(cls.format_record(record))
+
+    @classmethod
+    def _enter_payload(cls, args: Tuple, kwargs: Dict, detailed: bool, arg_names: Optional[List[str]]):
+        if not detailed:
+            return len(args), len(kwargs)
+        if arg_names is not None:
+            kwargs = {k: kwargs[k] for k in arg_names if k in kwargs}
+        return cls._format(args), cls._format(kwargs)
+
+    @classmethod
+    def _return_payload(cls, result: Any, detailed: bool):
+        """Detailed: the formatted result. Otherwise (type name, len or None); format_record() formats it."""
+        if detailed:
+            return cls._format(result)
+        try:
+            return type(result).__name__, len(result)
+        except TypeError:
+            return type(result).__name__, None
+
     @staticmethod
-    def wrap_method(method, detailed=False, name=None, arg_names: List[str] = None, tag: str = None):
-        @functools.wraps(method)
-        def wrapper(*args, **kwargs):
+    def _error_payload(e: BaseException) -> Tuple[str, str]:
+        return type(e).__name__, ReflectionUtil._format(str(e))
+
+    @classmethod
+    def _format(cls, value: Any) -> str:
+        """reprlib repr of value, truncated to max_arg_chars."""
+        text = cls._repr().repr(value)
+        if len(text) > cls.max_arg_chars:
+            text = text[: max(0, cls.max_arg_chars - 3)] + "..."
+        return text
+
+    @staticmethod
+    def format_record(record: Tuple) -> str:
+        timestamp, tag, name, qualname, event, detailed, payload = record
+        timestamp = datetime.fromtimestamp(timestamp)
+        if event == "enter":
             if detailed:
-                if arg_names is None:
-                    to_print = kwargs
-                else:
-                    to_print = {k: kwargs[k] for k in arg_names if k in kwargs}
-                print(
-                    f"%%% {datetime.now()} {tag} {name} [enter] Calling {method.__module__}.{method.__name__} with args {args} and kwargs {to_print}"
-                )
+                what = f"with args {payload[0]} and kwargs {payload[1]}"
             else:
-                print(
-                    f"%%% {datetime.now()} {tag} {name} [enter] Calling {method.__module__}.{method.__name__} with args:count {len(args)} and kwargs:count {len(kwargs)}"
-                )
+                what = f"with args:count {payload[0]} and kwargs:count {payload[1]}"
+            return f"%%% {timestamp} {tag} {name} [enter] Calling {qualname} {what}"
+        if event == "error":
+            return f"%%% {timestamp} {tag} {name} [raise] Raising from {qualname} {payload[0]}: {payload[1]}"
+        if not detailed:
+            type_name, length = payload
+            payload = f"<{type_name}>" if length is None else f"<{type_name} len={length}>"
+        return f"%%% {timestamp} {tag} {name} [return] Returning from {qualname} with result {payload}"
 
-            result = method(*args, **kwargs)
-            print(
-                f"%%% {datetime.now()} {tag} {name} [return] Returning from {method.__module__}.{method.__name__} with result {result}"
-            )
+    @classmethod
+    def _repr(cls) -> reprlib.Repr:
+        r = cls._repr_cache
+        if r is None:
+            r = reprlib.Repr()
+            r.maxstring = r.maxother = r.maxlong = cls.max_arg_chars
+            r.maxlist = r.maxtuple = r.maxdict = r.maxset = 10
+            r.maxlevel = 4
+            cls._repr_cache = r
+        return r
+
+    @classmethod
+    def records(cls) -> List[Tuple]:
+        """Returns the raw records in the buffer, oldest first."""
+        with cls._lock:
+            return list(cls._buffer)
+
+    @classmethod
+    def dump(cls, file: Optional[TextIO] = None, last: Optional[int] = None) -> List[str]:
+        """Formats the buffered records (or the last n) and writes them to file (default: stdout)."""
+        records = cls.records()
+        if last is not None:
+            records = records[-last:]
+        lines = [cls.format_record(record) for record in records]
+        out = file if file is not None else sys.stdout
+        for line in lines:
+            print(line, file=out)
+        return lines
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._buffer.clear()
+
+    @staticmethod
+    def wrap_method(method, detailed=False, name=None, arg_names: List[str] = None, tag: str = None):
+        qualname = f"{method.__module__}.{method.__name__}"
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not ReflectionUtil.enabled or not ReflectionUtil._sampled():
+                return method(*args, **kwargs)
+            payload = ReflectionUtil._enter_payload(args, kwargs, detailed, arg_names)
+            ReflectionUtil._record(tag, name, qualname, "enter", detailed, payload)
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                ReflectionUtil._record(tag, name, qualname, "error", detailed, ReflectionUtil._error_payload(e))
+                raise
+            ReflectionUtil._record(tag, name, qualname, "return", detailed, ReflectionUtil._return_payload(result, detailed))
             return result
 
         return wrapper
 
     @staticmethod
     def awrap_method(method, detailed=False, arg_names: List[str] = None, name=None, tag: str = None):
+        qualname = f"async {method.__module__}.{method.__name__}"
+
         @functools.wraps(method)
         async def wrapper(*args, **kwargs):
-            if detailed:
-                if arg_names is None:
-                    to_print = kwargs
-                else:
-                    to_print = {k: kwargs[k] for k in arg_names if k in kwargs}
-                print(
-                    f"%%% {datetime.now()} {tag} {name} [enter] Calling async {method.__module__}.{method.__name__} with args {args} and kwargs {to_print}"
-                )
-            else:
-                print(
-                    f"%%% {datetime.now()} {tag} {name} [enter] Calling async {method.__module__}.{method.__name__} with args:count {len(args)} and kwargs:count {len(kwargs)}"
-                )
-
-            result = await method(*args, **kwargs)
-            print(
-                f"%%% {datetime.now()} {tag} {name} [return] Returning from async {method.__module__}.{method.__name__} with result {result}"
-            )
+            if not ReflectionUtil.enabled or not ReflectionUtil._sampled():
+                return await method(*args, **kwargs)
+            payload = ReflectionUtil._enter_payload(args, kwargs, detailed, arg_names)
+            ReflectionUtil._record(tag, name, qualname, "enter", detailed, payload)
+            try:
+                result = await method(*args, **kwargs)
+            except Exception as e:
+                ReflectionUtil._record(tag, name, qualname, "error", detailed, ReflectionUtil._error_payload(e))
+                raise
+            ReflectionUtil._record(tag, name, qualname, "return", detailed, ReflectionUtil._return_payload(result, detailed))
             return result
 
         return wrapper
@@ -1,11 +1,14 @@
 # !!rm -- taken from: https://github.com/microsoft/autogen/blob/289cb60db07106a0ba0f78c6bb5d77e5eb027c0a/autogen/agentchat/contrib/stateflow.py
 #   This was also radman modified (see "!!rm" tags, mostly) to improve it and use it with Orchestrator.
 
+import contextvars
 import logging
 import sys
 import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Callable, Deque, Tuple
 import re
 from autogen import ConversableAgent
 from abc import abstractmethod
@@ -23,6 +26,7 @@ from autogen.code_utils import (
     content_str,
 )
 from autogen.oai.client import OpenAIWrapper
+from instrumentation import NOOP_TRACER, Tracer
 
 
 # !!rm def in_n_th_msg(messages: List[Dict[str, str]], pattern: str, n: int = -1) -> bool:
@@ -48,6 +52,22 @@ from autogen.oai.client import OpenAIWrapper
 #     return in_n_th_msg(messages, pattern, -1)
 
 
+# !!rm -- added class:
+@dataclass
+class ParallelActions:
+    """A group of independent actions that run concurrently inside a single state.
+    Put an instance in a state's action list, eg. states["ANALYZE"]= [ParallelActions([_a, _b, agent])].
+    Each action is dispatched exactly as StateFlow.enter() would, but on a thread pool, so the state
+    takes as long as its slowest action. Results are merged in declaration order (not completion order),
+    so the transcript is deterministic. Actions in a group must not depend on each other's output.
+    """
+    actions: List
+    max_workers: Optional[int] = None
+
+
+EXTRACTION_METHODS = ("last_message", "all_messages", "running_summary")
+
+
 class StateFlow:
     """Controlled, deterministic chat flow via finite state machine. Args:
     - states: A Dict of state name and a List sequence of actions to be executed in that state.
@@ -59,6 +79,7 @@ class StateFlow:
                 appended to context history.
             - A Dict in the form of message with key "content" and "role" (ie, in OpenAI message
                 format) that will be appended to context history.
+            - A ParallelActions group of any of the above, run concurrently.
     - transitions: A Dict of a state name and a transition function to determine the next state.
         There are several types of transitions:
             - A static string of the next state
@@ -70,36 +91,68 @@ class StateFlow:
     - initial_state: initial state name (str)
     - final_states: list of final state names (str)
     - max_transitions: the maximum number of transitions allowed (int)
+    - history_size: the maximum number of states kept in state_history (int)
+    - extraction_method: how output_extraction() produces the final output (str), one of:
+            - "last_message": content of the last message
+            - "all_messages": contents of all messages, one per paragraph
+            - "running_summary": the rolling "answer so far" in context["running_summary"], kept up to date
+                per turn by the flow (eg. DefaultOrchestratorStateFlow), so no long final read is needed
+
+    state_hooks is a List of functions (state, next_state, context) called by run_state() at every state
+    boundary, ie. after a state and its transition have run, eg. to checkpoint the run.
+
+    tracer is an instrumentation.Tracer; run_state() and the actions emit "stateflow.state" and
+    "stateflow.action" spans to it. The default tracer has no sinks and costs nothing.
+
+    check_states() compiles the states and transitions once into a flat dispatch table of ready-to-call
+    closures, so run_state() does no type dispatching. All mutable state is per instance, so many
+    StateFlows can run in one process.
     """
+    # !!rm -- NOTE: No mutable class-level defaults here; they were shared by every instance.
     states: Dict[str, List]
-    transitions: Dict[str, Union[str, callable]] = {}
+    transitions: Dict[str, Union[str, callable]]
     initial_state: str = None
-    final_states: List[str] = []
+    final_states: List[str]
     max_transitions: int = 10
 
     # messages: List[Dict[str, str]]
     # current_state: str
-    state_history: List[str] = []
+    state_history: Deque[str]
+    state_hooks: List[Callable[[str, str, Dict], None]]
+    tracer: Tracer
     # turn_count: int = 0
     verbose: bool = True
     use_name: bool = False # append name to a message if True
 
-    def __init__(self, states, transitions, initial_state=None, final_states=[], max_transitions=10):
+    def __init__(self, states, transitions, initial_state=None, final_states=None, max_transitions=10,
+                 history_size: int = 1000, extraction_method: str = "last_message"):
+        assert extraction_method in EXTRACTION_METHODS, f"Unknown extraction method {extraction_method}"
         self.states= states
         self.initial_state= initial_state if initial_state else list(states)[0]
         self.final_states= final_states if final_states else [list(states)[-1]]
         self.transitions= transitions
         self.max_transitions= max_transitions
+        self.extraction_method= extraction_method
+        self.state_history= deque(maxlen=history_size)
+        self.state_hooks= []
+        self.tracer= NOOP_TRACER
+        # state -> (compiled actions, compiled transition). Built by check_states().
+        self._dispatch: Dict[str, Tuple[Tuple[Callable, ...], Callable]] = None
 
         # self.current_state = self.initial_state
 
     # @abstractmethod
-    def output_extraction(self, messages: List[Dict[str, str]]) -> str:
-        """Extract the output from the messages."""
+    def output_extraction(self, messages: List[Dict[str, str]], context: Optional[Dict] = None) -> str:
+        """Extract the output from the messages, according to self.extraction_method."""
         # Post processing method: called after the state machine finishes to generate the final output
-        # Future TODO: add self.extraction_method= "last_message"|"all_messages"|"llm_summary".
-        #   Similar to nested_chats summary method.
-        final_output= messages[-1]["content"]
+        # Future TODO: add "llm_summary", similar to nested_chats summary method.
+        summary = (context or {}).get("running_summary")
+        if self.extraction_method == "running_summary" and summary:
+            final_output= summary
+        elif self.extraction_method == "all_messages":
+            final_output= "\n\n".join(content_str(m.get("content") or "") for m in messages)
+        else:
+            final_output= messages[-1]["content"] if messages else ""
         # if self.verbose:
         #     print(colored(f"********* StateFlow output= = \"{final_output}\" *********", "blue"), flush=True)
         return final_output
@@ -116,6 +169,15 @@ class StateFlow:
         for state in self.states:
             assert state in self.transitions, f"Transition for state {state} not defined"
 
+        # !!rm -- compile once, instead of dispatching on type() every step.
+        self._dispatch = {
+            state: (
+                tuple(self._compile_action(output_func) for output_func in actions),
+                self._compile_transition(state, self.transitions[state]),
+            )
+            for state, actions in self.states.items()
+        }
+
     def reset(self):
         """Reset the state machine.
         Set state to initial state and clear the messages.
@@ -124,11 +186,18 @@ class StateFlow:
         # self.turn_count = 0
         # self.current_state = self.initial_state
         # self.messages = []
-        self.state_history = []
+        self.state_history.clear()
         for s in self.states:
-            for output_func in self.states[s]:
-                if isinstance(output_func, ConversableAgent):
-                    output_func.reset()
+            self._reset_actions(self.states[s])
+
+    @classmethod
+    def _reset_actions(cls, actions: List):
+        # Agents may also sit in (nested) ParallelActions groups.
+        for output_func in actions:
+            if isinstance(output_func, ConversableAgent):
+                output_func.reset()
+            elif isinstance(output_func, ParallelActions):
+                cls._reset_actions(output_func.actions)
 
     # !!rm def run(self, task: str, verbose: bool = True):
     #     self.reset()
@@ -172,47 +241,114 @@ class StateFlow:
         if verbose:
             print(colored(f"********* Running state \"{state}\" (turn={turn_count}) *********", "blue"), flush=True)
 
-        # Run the output functions for the current state
-        for output_func in self.states[state]:
-            self.enter(output_func, _messages, context, orchestrated_messages)
+        if self._dispatch is None:
+            self.check_states()
+        actions, transition = self._dispatch[state]
 
-        # Transition to the next state
-        transition= self.transitions[state]
-        next_state= ''
-        if type(transition) is str:
-            next_state = transition
-        else:
-            assert type(transition) is types.FunctionType or type(transition) is types.MethodType
+        with self.tracer.span("stateflow.state", state=state, turn=turn_count) as span:
+            # Run the output functions for the current state
+            for action in actions:
+                action(_messages, context, orchestrated_messages)
+
+            # Transition to the next state
             next_state = transition(_messages, context)
+            span.set(next_state=next_state)
 
         self.state_history.append(state)
+        for hook in self.state_hooks:
+            hook(state, next_state, context)
         return next_state
 
     # @@ !!rm s/b _process_output_func()
     def enter(self, output_func: Union[str, callable, dict], _messages: List[Dict[str, str]], context:Any, orchestrated_messages:List):
-        output_name = ""
+        return self._compile_action(output_func)(_messages, context, orchestrated_messages)
+
+    # !!rm -- added fn:
+    def enter_parallel(self, group: ParallelActions, _messages: List[Dict[str, str]], context: Any, orchestrated_messages: List) -> List:
+        """Runs a ParallelActions group concurrently, then records the results in declaration order."""
+        return self._compile_action(group)(_messages, context, orchestrated_messages)
+
+    def _compile_action(self, output_func: Union[str, callable, dict, ParallelActions]) -> Callable:
+        """Returns a closure (messages, context, orchestrated_messages) -> result that runs and records the action."""
+        if isinstance(output_func, ParallelActions):
+            producers = tuple(self._traced(self._compile_producer(f), self._action_name(f)) for f in output_func.actions)
+            max_workers = output_func.max_workers or len(producers)
+
+            def run_parallel(_messages, context, orchestrated_messages):
+                if not producers:
+                    return []
+                with self.tracer.span("stateflow.action", action="parallel", actions=len(producers)), \
+                        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stateflow") as executor:
+                    # Each action gets a copy of the caller's context so context vars (eg. the active session,
+                    # the current span) carry over.
+                    futures = [
+                        executor.submit(contextvars.copy_context().run, producer, _messages, context)
+                        for producer in producers
+                    ]
+                    outputs = [f.result() for f in futures]
+                return [self._record_output(result, output_name, _messages, orchestrated_messages) for result, output_name in outputs]
+
+            return run_parallel
+
+        producer = self._compile_producer(output_func)
+        action_name = self._action_name(output_func)
+
+        def run(_messages, context, orchestrated_messages):
+            with self.tracer.span("stateflow.action", action=action_name):
+                result, output_name = producer(_messages, context)
+                return self._record_output(result, output_name, _messages, orchestrated_messages)
+
+        return run
+
+    def _traced(self, producer: Callable, action_name: str) -> Callable:
+        def run(_messages, context):
+            with self.tracer.span("stateflow.action", action=action_name):
+                return producer(_messages, context)
+
+        return run
+
+    @staticmethod
+    def _action_name(output_func) -> str:
+        if isinstance(output_func, ConversableAgent):
+            return output_func.name
+        if type(output_func) is str:
+            return output_func
+        return getattr(output_func, "__name__", type(output_func).__name__)
+
+    def _compile_producer(self, output_func: Union[str, callable, dict]) -> Callable:
+        """Returns a closure (messages, context) -> (result, output_name) for a single action.
+        The closure does not touch any message list."""
         output_role = "user"  # TODO: s/b "assistant"?!?
-        result= None
         if type(output_func) is types.FunctionType or type(output_func) is types.MethodType:
-            result = output_func(_messages, context)
-            #result = output_func(self.messages)
+            return lambda _messages, context: self._as_message(output_func(_messages, context), output_role, "")
         elif isinstance(output_func, ConversableAgent):
-            result = output_func.generate_reply(_messages)
-            # result = output_func.generate_reply(self.messages)
             # output_role = output_func._role # Agents no longer have _role.
             output_name = output_func.name
+            return lambda _messages, context: self._as_message(output_func.generate_reply(_messages), output_role, output_name)
         elif type(output_func) is dict:
-            result = output_func
+            return lambda _messages, context: (output_func, "")
         elif type(output_func) is str:
-            pass
+            return lambda _messages, context: (None, "")
         else: 
             raise ValueError(f"Invalid output function type: {type(output_func)}")
 
+    def _compile_transition(self, state: str, transition: Union[str, callable]) -> Callable:
+        """Returns a closure (messages, context) -> next state."""
+        if type(transition) is str:
+            return lambda _messages, context: transition
+        elif type(transition) is types.FunctionType or type(transition) is types.MethodType:
+            return transition
+        raise ValueError(f"Invalid transition type for state {state}: {type(transition)}")
+
+    def _as_message(self, result, output_role: str, output_name: str):
         if result and isinstance(result, str):
             result = {"content": result, "role": output_role}
-        if self.use_name and output_name != "":
+        if self.use_name and output_name != "" and isinstance(result, dict):
             result['name'] = output_name
+        return result, output_name
 
+    def _record_output(self, result, output_name: str, _messages: List[Dict[str, str]], orchestrated_messages: List):
+        """Prints and appends a produced result to the message histories."""
         if isinstance(result, types.GeneratorType):
             # TODO: stream function_call / function_calls: update result
             pass
@@ -220,8 +356,8 @@ class StateFlow:
             if self.verbose and result:
                 self._print_received_message(result, len(_messages), name=output_name)
         if result:
-            self.messages.append(result)
-            if orchestrated_messages:
+            _messages.append(result)    # !!rm -- was self.messages, which no longer exists.
+            if orchestrated_messages is not None:
                 orchestrated_messages.append(result)
         
         return result
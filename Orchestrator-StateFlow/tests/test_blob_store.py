@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blob_store import BlobStore
+
+
+def test_get_reads_a_blob_appended_after_the_file_was_mapped(tmp_path):
+    store = BlobStore(str(tmp_path), "session")
+    try:
+        first = "a" * 100
+        second = "b" * 100
+        store.put(first)
+        assert store.get(0, 100) == first  # Maps the file as it is now
+        handle = store.put(second)
+        assert handle == "[[blob:session:100:100]]"
+        assert store.get(100, 100) == second
+        assert BlobStore.materialize_content(f"{handle}\npreview") == second
+    finally:
+        store.close()
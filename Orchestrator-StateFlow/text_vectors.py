@@ -0,0 +1,99 @@
+# text_vectors.py -- Local text vectors for similarity search: hashed bag-of-words (plus bigrams), optionally TF-IDF weighted.
+#
+# Design Notes:
+#   * No vocabulary: tokens are hashed (crc32, stable across processes) into n_features dimensions, so vectors of
+#       texts seen at different times (eg. cached tasks) are comparable without refitting anything.
+#   * Vectors are dense float32 rows, L2-normalized, so cosine similarity is a matrix-vector product. Keep
+#       n_features small (a few thousand): the texts compared here are short descriptions and tasks.
+#   * TfidfIndex fits IDF weights over a fixed set of documents (eg. agent descriptions), so words shared by every
+#       document (eg. "agent", "can") count for little.
+#
+# Usage:
+#   index = TfidfIndex(["web_surfer: searches the web", "computer_terminal: runs Python scripts"])
+#   index.top_k("look up the population of Paris", k=1)   # -> [0]
+
+import re
+import zlib
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by can do for from has have in is it its of on or that the this to was were will with "
+    "you your i we our what which who how".split()
+)
+
+
+def tokenize(text: str, ngrams: int = 2, stop_words=STOP_WORDS) -> List[str]:
+    """Lowercase word tokens (stop words removed), followed by their n-grams up to ngrams words."""
+    words = [w for w in _TOKEN_RE.findall(text.lower()) if w not in stop_words]
+    tokens = list(words)
+    for n in range(2, ngrams + 1):
+        tokens.extend(" ".join(words[i : i + n]) for i in range(len(words) - n + 1))
+    return tokens
+
+
+class HashingVectorizer:
+    """Maps texts to n_features-dimensional term-frequency vectors (sublinear tf: 1 + log(count))."""
+
+    def __init__(self, n_features: int = 4096, ngrams: int = 2, stop_words=STOP_WORDS):
+        self.n_features = n_features
+        self.ngrams = ngrams
+        self.stop_words = stop_words
+
+    def term_frequencies(self, texts: Iterable[str]) -> np.ndarray:
+        """Returns an (n_texts, n_features) float32 array of unnormalized sublinear term frequencies."""
+        texts = list(texts)
+        tf = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text or "", self.ngrams, self.stop_words)
+            if not tokens:
+                continue
+            buckets = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.int64, count=len(tokens))
+            counts = np.bincount(buckets % self.n_features, minlength=self.n_features)
+            nonzero = counts > 0
+            tf[row, nonzero] = 1.0 + np.log(counts[nonzero])
+        return tf
+
+    def transform(self, texts: Iterable[str], idf: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns L2-normalized vectors of texts, one row each, weighted by idf if given."""
+        vectors = self.term_frequencies(texts)
+        if idf is not None:
+            vectors *= idf
+        return normalize(vectors)
+
+    def embed(self, text: str) -> np.ndarray:
+        """The L2-normalized vector of a single text."""
+        return self.transform([text])[0]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes the rows of vectors, in place. All-zero rows stay zero."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class TfidfIndex:
+    """Cosine-similarity index over a fixed list of documents, with IDF weights fitted on those documents."""
+
+    def __init__(self, documents: Iterable[str], vectorizer: Optional[HashingVectorizer] = None):
+        self.vectorizer = vectorizer if vectorizer else HashingVectorizer()
+        tf = self.vectorizer.term_frequencies(documents)
+        n = tf.shape[0]
+        df = np.count_nonzero(tf, axis=0)
+        self.idf = (np.log((1.0 + n) / (1.0 + df)) + 1.0).astype(np.float32)
+        self.matrix = normalize(tf * self.idf)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of query to every document."""
+        return self.matrix @ self.vectorizer.transform([query], self.idf)[0]
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Indices of the k documents most similar to query, most similar first. Ties keep document order."""
+        order = np.argsort(-self.scores(query), kind="stable")
+        return order[:k].tolist()
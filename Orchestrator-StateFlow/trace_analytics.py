@@ -0,0 +1,223 @@
+# trace_analytics.py -- Vectorized analytics over a TraceStore (see trace_store.py).
+#
+# Design Notes:
+#   * load_table() reads a table's chunks with np.load() and concatenates them into a Table of NumPy arrays.
+#       String columns stay dictionary encoded: the per-chunk dictionaries are merged into one sorted
+#       dictionary and the codes are remapped with a lookup array, so millions of rows never become Python
+#       strings.
+#   * percentiles(), histogram() and group_by() work on those arrays; group_by() groups on (combined) codes
+#       with np.unique/np.bincount and only sorts once for the percentiles.
+#   * compact() merges a table's many small chunks into one; run it when no writer is active.
+#
+# Usage:
+#   t = load_table("trace_store", "transitions")
+#   group_by(t.where(t.eq("state", "OBTAIN_NEXTSTEP")), ["model"], "duration_s")
+#   python trace_analytics.py trace_store
+
+import argparse
+import os
+import shutil
+import sys
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from trace_store import SCHEMAS, write_chunk
+
+
+class Table:
+    """Columns of one table. String columns are int32 codes into dictionaries[column]."""
+
+    def __init__(self, name: str, columns: Dict[str, np.ndarray], dictionaries: Dict[str, np.ndarray]):
+        self.name = name
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def values(self, column: str) -> np.ndarray:
+        """Decoded values of a column (strings are materialized: use for small results only)."""
+        if column in self.dictionaries:
+            return self.dictionaries[column][self.columns[column]]
+        return self.columns[column]
+
+    def code(self, column: str, value: str) -> int:
+        """The code of value in a string column, or -1."""
+        dictionary = self.dictionaries[column]
+        i = int(np.searchsorted(dictionary, value))
+        return i if i < len(dictionary) and dictionary[i] == value else -1
+
+    def eq(self, column: str, value) -> np.ndarray:
+        if column in self.dictionaries:
+            return self.columns[column] == self.code(column, value)
+        return self.columns[column] == value
+
+    def isin(self, column: str, values: Sequence) -> np.ndarray:
+        if column in self.dictionaries:
+            return np.isin(self.columns[column], [self.code(column, v) for v in values])
+        return np.isin(self.columns[column], values)
+
+    def where(self, mask: np.ndarray) -> "Table":
+        return Table(self.name, {c: v[mask] for c, v in self.columns.items()}, self.dictionaries)
+
+
+def _chunk_dirs(table_dir: str) -> List[str]:
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(e.path for e in os.scandir(table_dir) if e.is_dir() and not e.name.startswith("."))
+
+
+def load_table(root: str, table: str, columns: Optional[Sequence[str]] = None) -> Table:
+    """Loads (the given columns of) a table. Chunks are memory mapped while they are concatenated."""
+    schema = SCHEMAS[table]
+    columns = list(columns) if columns else list(schema)
+    chunks = _chunk_dirs(os.path.join(root, table))
+    result: Dict[str, np.ndarray] = {}
+    dictionaries: Dict[str, np.ndarray] = {}
+    for column in columns:
+        if schema[column] != "str":
+            parts = [np.load(os.path.join(c, f"{column}.npy"), mmap_mode="r") for c in chunks]
+            result[column] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float64)
+            continue
+        chunk_dicts = [np.load(os.path.join(c, f"{column}.dict.npy")) for c in chunks]
+        dictionary = np.unique(np.concatenate(chunk_dicts)) if chunk_dicts else np.zeros(0, dtype=np.str_)
+        parts = []
+        for c, chunk_dict in zip(chunks, chunk_dicts):
+            codes = np.load(os.path.join(c, f"{column}.codes.npy"), mmap_mode="r")
+            remap = np.searchsorted(dictionary, chunk_dict).astype(np.int32)
+            parts.append(remap[codes] if len(remap) else np.asarray(codes, dtype=np.int32))
+        result[column] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        dictionaries[column] = dictionary
+    return Table(table, result, dictionaries)
+
+
+def compact(root: str, table: str):
+    """Rewrites a table's chunks as a single chunk. Not safe while writers append to the table."""
+    table_dir = os.path.join(root, table)
+    chunks = _chunk_dirs(table_dir)
+    if len(chunks) < 2:
+        return
+    t = load_table(root, table)
+    columns = {c: (t.columns[c], t.dictionaries[c]) if c in t.dictionaries else t.columns[c] for c in t.columns}
+    write_chunk(table_dir, f"compacted-{os.path.basename(chunks[-1])}", SCHEMAS[table], columns)
+    for c in chunks:
+        shutil.rmtree(c)
+
+
+def percentiles(values: np.ndarray, qs: Sequence[float] = (50, 95, 99)) -> Dict[str, float]:
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {f"p{q:g}": float("nan") for q in qs}
+    return {f"p{q:g}": float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+def histogram(values: np.ndarray, bins=20, range=None) -> Dict[str, List[float]]:
+    counts, edges = np.histogram(np.asarray(values, dtype=np.float64), bins=bins, range=range)
+    return {"counts": counts.tolist(), "edges": edges.tolist()}
+
+
+def group_by(
+    table: Table, keys: Sequence[str], value: Optional[str] = None, qs: Sequence[float] = (50, 95)
+) -> List[Dict]:
+    """Groups rows by keys (string or integer columns). Returns one dict per group: the key values, count
+    and, for value (a column name or a boolean/number array aligned with the table), sum, mean and
+    percentiles qs."""
+    n = len(table)
+    if n == 0:
+        return []
+    if keys:
+        key_codes = np.stack([np.asarray(table.columns[k], dtype=np.int64) for k in keys], axis=1)
+        unique_keys, inverse = np.unique(key_codes, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        unique_keys, inverse = np.zeros((1, 0), dtype=np.int64), np.zeros(n, dtype=np.int64)
+    n_groups = len(unique_keys)
+    counts = np.bincount(inverse, minlength=n_groups)
+
+    stats = {}
+    if value is not None:
+        v = np.asarray(table.columns[value] if isinstance(value, str) else value, dtype=np.float64)
+        sums = np.bincount(inverse, weights=v, minlength=n_groups)
+        stats = {"sum": sums, "mean": sums / np.maximum(counts, 1)}
+        # One sort by (group, value), then each group's percentiles are read from its slice.
+        order = np.lexsort((v, inverse))
+        sorted_v = v[order]
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        for q in qs:
+            stats[f"p{q:g}"] = np.array(
+                [np.percentile(sorted_v[bounds[g]:bounds[g + 1]], q) if counts[g] else np.nan for g in range(n_groups)]
+            )
+
+    rows = []
+    for g in range(n_groups):
+        row = {}
+        for i, k in enumerate(keys):
+            code = unique_keys[g, i]
+            row[k] = str(table.dictionaries[k][code]) if k in table.dictionaries else code.item()
+        row["count"] = int(counts[g])
+        for name, column in stats.items():
+            row[name] = float(column[g])
+        rows.append(row)
+    return rows
+
+
+def state_time_by_model(root: str, state: str = "OBTAIN_NEXTSTEP") -> List[Dict]:
+    """p50/p95 time spent in state, by model."""
+    t = load_table(root, "transitions", ["state", "model", "duration_s"])
+    return group_by(t.where(t.eq("state", state)), ["model"], "duration_s")
+
+
+def reset_rate_by_task_type(root: str) -> List[Dict]:
+    """Share of sessions with at least one reset, by task type (the mean column)."""
+    t = load_table(root, "sessions", ["task_type", "resets"])
+    return group_by(t, ["task_type"], t["resets"] > 0, qs=())
+
+
+def tokens_per_solved_task(root: str) -> Dict[str, float]:
+    """Total tokens of all sessions of solved tasks, divided by the number of solved tasks."""
+    tasks = load_table(root, "tasks", ["task_id", "solved"])
+    sessions = load_table(root, "sessions", ["task_id", "prompt_tokens", "completion_tokens"])
+    solved_ids = tasks.dictionaries["task_id"][tasks["task_id"][tasks["solved"] == 1]] if len(tasks) else []
+    solved_ids = np.unique(np.asarray(solved_ids, dtype=np.str_))
+    if not len(solved_ids) or not len(sessions):
+        return {"solved_tasks": float(len(solved_ids)), "tokens_per_solved_task": float("nan")}
+    mask = sessions.isin("task_id", solved_ids)
+    tokens = sessions["prompt_tokens"][mask].sum() + sessions["completion_tokens"][mask].sum()
+    return {"solved_tasks": float(len(solved_ids)), "tokens_per_solved_task": float(tokens) / len(solved_ids)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a trace store.")
+    parser.add_argument("root", help="TraceStore directory")
+    parser.add_argument("--state", default="OBTAIN_NEXTSTEP", help="State for the time-by-model report")
+    parser.add_argument("--compact", action="store_true", help="Merge each table's chunks first")
+    args = parser.parse_args(argv)
+
+    if args.compact:
+        for table in SCHEMAS:
+            compact(args.root, table)
+    for table in SCHEMAS:
+        print(f"{table}: {len(load_table(args.root, table, [next(iter(SCHEMAS[table]))]))} rows")
+    print(f"\nTime in {args.state} by model:")
+    for row in state_time_by_model(args.root, args.state):
+        print(f"  {row}")
+    print("\nTime per state:")
+    t = load_table(args.root, "transitions", ["state", "duration_s"])
+    for row in group_by(t, ["state"], "duration_s"):
+        print(f"  {row}")
+    print("\nLLM calls by call site:")
+    t = load_table(args.root, "llm_calls", ["call_site", "prompt_tokens"])
+    for row in group_by(t, ["call_site"], "prompt_tokens"):
+        print(f"  {row}")
+    print("\nReset rate by task type:")
+    for row in reset_rate_by_task_type(args.root):
+        print(f"  {row}")
+    print(f"\n{tokens_per_solved_task(args.root)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
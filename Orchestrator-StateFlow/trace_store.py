@@ -0,0 +1,206 @@
+# trace_store.py -- Columnar, append-only store of run records (state transitions, LLM calls, sessions, tasks).
+#
+# Design Notes:
+#   * A store is a directory with one subdirectory per table. Rows are buffered in memory and flushed as
+#       immutable chunks, one .npy file per column:
+#           <root>/<table>/<chunk id>/<column>.npy              numbers and booleans
+#           <root>/<table>/<chunk id>/<column>.codes.npy        strings: int32 codes into ...
+#           <root>/<table>/<chunk id>/<column>.dict.npy         ... the chunk's sorted distinct values
+#     A chunk is written to a temp dir and renamed into place, and chunk ids are unique per writer, so many
+#       processes (eg. batch_testbed.py workers) can append to one store without locking.
+#   * Tables and their column types are fixed by SCHEMAS. Missing values are "" / 0 / False.
+#   * Reading is done by trace_analytics.py, which loads chunks with np.load() (no JSON parsing) and unifies
+#       the string dictionaries.
+#   * TraceStoreSink is a span sink (see instrumentation.py) that turns the orchestrator's spans into
+#       transitions, llm_calls and sessions rows.
+#
+# Usage:
+#   store = TraceStore("trace_store")
+#   maestro = Orchestrator(..., tracer=Tracer([TraceStoreSink(store, task_id="t1", task_type="1")]))
+#   ...
+#   store.close()
+
+import os
+import threading
+import time
+import uuid
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from instrumentation import Span
+
+# table -> column -> type: "str", "f8", "i8", "i4" or "bool"
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    "transitions": {
+        "session_id": "str", "task_id": "str", "task_type": "str", "model": "str", "state": "str",
+        "next_state": "str", "turn": "i4", "start_s": "f8", "duration_s": "f8", "llm_calls": "i4",
+        "prompt_tokens": "i8", "completion_tokens": "i8",
+    },
+    "llm_calls": {
+        "session_id": "str", "task_id": "str", "task_type": "str", "state": "str", "call_site": "str",
+        "agent": "str", "model": "str", "start_s": "f8", "duration_s": "f8", "prompt_tokens": "i8",
+        "completion_tokens": "i8", "cache_hit": "bool", "error": "bool",
+    },
+    "sessions": {
+        "session_id": "str", "task_id": "str", "task_type": "str", "model": "str", "start_s": "f8",
+        "duration_s": "f8", "total_turns": "i4", "transitions": "i4", "resets": "i4", "llm_calls": "i4",
+        "prompt_tokens": "i8", "completion_tokens": "i8", "error": "bool",
+    },
+    "tasks": {
+        "task_id": "str", "task_type": "str", "status": "str", "solved": "i4", "duration_s": "f8", "finished_s": "f8",
+    },
+}
+_DEFAULTS = {"str": "", "f8": 0.0, "i8": 0, "i4": 0, "bool": False}
+_DTYPES = {"f8": np.float64, "i8": np.int64, "i4": np.int32, "bool": np.bool_}
+# Every reset runs this state once, whether or not INTROSPECT_AND_RESET led to it.
+RESET_STATE = "RESET"
+
+
+class TraceStore:
+    """Appends rows to a columnar store at root. Args:
+    - root: the store directory
+    - chunk_rows: rows buffered per table before a chunk is written
+    """
+
+    def __init__(self, root: str, chunk_rows: int = 65536):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self._writer_id = f"{int(time.time() * 1e6):x}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._seq = count()
+        self._buffers: Dict[str, Dict[str, List[Any]]] = {}
+        self._lock = threading.Lock()
+        for table in SCHEMAS:
+            os.makedirs(os.path.join(root, table), exist_ok=True)
+
+    def append(self, table: str, row: Dict[str, Any]):
+        schema = SCHEMAS[table]
+        with self._lock:
+            buffer = self._buffers.get(table)
+            if buffer is None:
+                buffer = self._buffers[table] = {column: [] for column in schema}
+            for column, kind in schema.items():
+                value = row.get(column)
+                buffer[column].append(_DEFAULTS[kind] if value is None else value)
+            if len(buffer[next(iter(schema))]) >= self.chunk_rows:
+                self._flush_table(table)
+
+    def flush(self):
+        with self._lock:
+            for table in list(self._buffers):
+                self._flush_table(table)
+
+    close = flush
+
+    def _flush_table(self, table: str):
+        buffer = self._buffers.pop(table, None)
+        if not buffer or not buffer[next(iter(buffer))]:
+            return
+        write_chunk(os.path.join(self.root, table), f"{self._writer_id}-{next(self._seq):06d}", SCHEMAS[table], buffer)
+
+
+def write_chunk(table_dir: str, chunk_id: str, schema: Dict[str, str], columns: Dict[str, Any]):
+    """Writes one chunk atomically. columns holds lists or arrays; string columns may also be given as
+    (codes, dictionary) tuples."""
+    tmp_dir = os.path.join(table_dir, f".{chunk_id}.tmp")
+    os.makedirs(tmp_dir)
+    for column, kind in schema.items():
+        values = columns[column]
+        if kind == "str":
+            if isinstance(values, tuple):
+                codes, dictionary = values
+            else:
+                dictionary, codes = np.unique(np.asarray([str(v) for v in values], dtype=np.str_), return_inverse=True)
+            np.save(os.path.join(tmp_dir, f"{column}.codes.npy"), np.asarray(codes, dtype=np.int32))
+            np.save(os.path.join(tmp_dir, f"{column}.dict.npy"), np.asarray(dictionary, dtype=np.str_))
+        else:
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), np.asarray(values, dtype=_DTYPES[kind]))
+    os.rename(tmp_dir, os.path.join(table_dir, chunk_id))
+
+
+class TraceStoreSink:
+    """Span sink writing transitions, llm_calls and sessions rows to a TraceStore. Args:
+    - store: the TraceStore
+    - task_id, task_type: labels copied into every row (eg. from the batch suite)
+    - model: default model label, for rows without an LLM call
+    """
+
+    def __init__(self, store: TraceStore, task_id: str = "", task_type: str = "", model: str = ""):
+        self.store = store
+        self.task_id = task_id
+        self.task_type = task_type
+        self.model = model
+        self._open: Dict[str, Span] = {}
+        self._totals: Dict[str, Dict[str, Any]] = {}  # open state/session span id -> accumulated LLM usage
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span):
+        with self._lock:
+            self._open[span.span_id] = span
+            if span.name in ("stateflow.state", "orchestrator.session"):
+                self._totals[span.span_id] = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "model": "",
+                                              "transitions": 0, "resets": 0}
+
+    def _ancestors(self, span: Span):
+        parent_id = span.parent_id
+        while parent_id is not None:
+            parent = self._open.get(parent_id)
+            if parent is None:
+                return
+            yield parent
+            parent_id = parent.parent_id
+
+    def export(self, span: Span):
+        with self._lock:
+            self._open.pop(span.span_id, None)
+            totals = self._totals.pop(span.span_id, None)
+            ancestors = list(self._ancestors(span))
+        state = next((a for a in ancestors if a.name == "stateflow.state"), None)
+        session = next((a for a in ancestors if a.name == "orchestrator.session"), None)
+        labels = {
+            "session_id": session.attributes.get("session_id", "") if session else span.attributes.get("session_id", ""),
+            "task_id": self.task_id,
+            "task_type": self.task_type,
+            "start_s": span.start_ns / 1e9,
+            "duration_s": span.duration_s,
+        }
+        a = span.attributes
+
+        if span.name == "orchestrator.llm" or (span.name == "agent.reply" and "prompt_tokens" in a):
+            prompt_tokens, completion_tokens = a.get("prompt_tokens", 0), a.get("completion_tokens", 0)
+            model = a.get("model") or self.model
+            self.store.append("llm_calls", dict(
+                labels, state=state.attributes.get("state", "") if state else "", call_site=a.get("call_site", "agent_reply"),
+                agent=a.get("agent", ""), model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                cache_hit=bool(a.get("cache_hit", False)), error=span.status == "error",
+            ))
+            with self._lock:
+                for owner in (state, session):
+                    t = self._totals.get(owner.span_id) if owner else None
+                    if t is not None:
+                        t["llm_calls"] += 1
+                        t["prompt_tokens"] += prompt_tokens
+                        t["completion_tokens"] += completion_tokens
+                        t["model"] = t["model"] or model
+        elif span.name == "stateflow.state" and totals is not None:
+            self.store.append("transitions", dict(
+                labels, model=totals["model"] or self.model, state=a.get("state", ""), next_state=a.get("next_state", ""),
+                turn=a.get("turn", 0), llm_calls=totals["llm_calls"], prompt_tokens=totals["prompt_tokens"],
+                completion_tokens=totals["completion_tokens"],
+            ))
+            with self._lock:
+                t = self._totals.get(session.span_id) if session else None
+                if t is not None:
+                    t["transitions"] += 1
+                    t["resets"] += a.get("state") == RESET_STATE
+        elif span.name == "orchestrator.session" and totals is not None:
+            self.store.append("sessions", dict(
+                labels, model=totals["model"] or self.model, total_turns=a.get("total_turns", 0),
+                transitions=totals["transitions"], resets=totals["resets"], llm_calls=totals["llm_calls"],
+                prompt_tokens=totals["prompt_tokens"], completion_tokens=totals["completion_tokens"],
+                error=span.status == "error",
+            ))
+
+    def close(self):
+        self.store.flush()
@@ -0,0 +1,248 @@
+# warm_kernel.py -- A warm, stateful Python execution backend for computer_terminal.
+#
+# Design Notes:
+#   * WarmPythonExecutor implements autogen's CodeExecutor protocol (code_extractor, execute_code_blocks(),
+#       restart()), so it is used as code_execution_config={"executor": WarmPythonExecutor(...)}.
+#   * ```python blocks run in one long-lived subprocess ("kernel") per executor, ie. per run. Imports, loaded
+#       data and variables survive from one block (and one turn) to the next, like in a notebook.
+#   * Protocol: requests are JSON lines on the kernel's stdin, replies JSON lines on a private copy of its
+#       stdout. While a block runs, fds 1 and 2 point to a capture file, so output of child processes
+#       (eg. os.system) is captured, too.
+#   * Limits: each block has a timeout; on timeout the kernel is interrupted (SIGINT, state is kept) and, if
+#       it does not respond, killed and restarted. The kernel's address space is capped (RLIMIT_AS).
+#   * Restart-on-crash: if the kernel dies (eg. segfault, OOM kill), it is restarted with a fresh state and
+#       the block reports the crash; after max_restarts crashes in a row, blocks fail without restarting.
+#   * ```sh blocks (and other shell languages) are delegated to a LocalCommandLineCodeExecutor.
+#
+# Usage:
+#   executor = WarmPythonExecutor(work_dir="coding", timeout=120, memory_limit_mb=4096)
+#   user_proxy = UserProxyAgent(..., code_execution_config={"executor": executor})
+#   ...
+#   executor.stop()
+
+import json
+import os
+import re
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from typing import List, Optional
+
+from autogen.coding import CodeBlock, CodeResult, LocalCommandLineCodeExecutor, MarkdownCodeExtractor
+
+PYTHON_LANGUAGES = ("python", "py", "python3")
+SHELL_LANGUAGES = ("sh", "bash", "shell", "zsh", "pwsh", "powershell", "ps1")
+_FILENAME_RE = re.compile(r"^\s*#\s*filename:\s*([\w./-]+)")
+
+# Runs in the kernel process. argv: capture file, memory limit in MB (0 = none).
+_KERNEL_SOURCE = r'''
+import json, os, sys, traceback
+capture_path, memory_limit_mb = sys.argv[1], int(sys.argv[2])
+if memory_limit_mb > 0:
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+reply = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+os.dup2(devnull, 2)
+namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+sys.argv = [""]
+sys.path.insert(0, os.getcwd())
+for line in sys.stdin:
+    request = json.loads(line)
+    exit_code = 0
+    with open(capture_path, "w+b") as capture:
+        os.dup2(capture.fileno(), 1)
+        os.dup2(capture.fileno(), 2)
+        try:
+            exec(compile(request["code"], request.get("filename", "<block>"), "exec"), namespace)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except KeyboardInterrupt:
+            print("KeyboardInterrupt: execution timed out", file=sys.stderr)
+            exit_code = 124
+        except BaseException:
+            etype, value, tb = sys.exc_info()
+            traceback.print_exception(etype, value, tb.tb_next)  # Skip this loop's frame
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        capture.seek(0)
+        output = capture.read().decode("utf-8", errors="replace")
+    reply.write(json.dumps({"exit_code": exit_code, "output": output}) + "\n")
+    reply.flush()
+'''
+
+
+class KernelDiedError(Exception):
+    pass
+
+
+class WarmPythonExecutor:
+    """Executes code blocks; Python in a warm, stateful kernel subprocess. Args:
+    - work_dir: the kernel's (and shell blocks') working directory
+    - timeout: seconds a single block may run
+    - memory_limit_mb: address space limit of the kernel (0 = none)
+    - max_restarts: crashes in a row after which the kernel is not restarted any more
+    - interrupt_grace: seconds to wait for an interrupted block before the kernel is killed
+    - python: the interpreter to run the kernel with
+    """
+
+    def __init__(
+        self,
+        work_dir: str = "coding",
+        timeout: float = 60,
+        memory_limit_mb: int = 4096,
+        max_restarts: int = 3,
+        interrupt_grace: float = 5,
+        python: str = sys.executable,
+    ):
+        self.work_dir = os.path.abspath(work_dir)
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_restarts = max_restarts
+        self.interrupt_grace = interrupt_grace
+        self.python = python
+        self._shell_executor = LocalCommandLineCodeExecutor(timeout=int(timeout), work_dir=self.work_dir)
+        self._proc: Optional[subprocess.Popen] = None
+        self._capture_path = None
+        self._buffer = b""
+        self._crashes = 0
+        self._lock = threading.Lock()
+        self._finalizer = None
+
+    # Blocks may depend on variables of earlier blocks (see execution_cache.py).
+    stateful = True
+
+    @property
+    def code_extractor(self):
+        return MarkdownCodeExtractor()
+
+    def _start(self):
+        fd, self._capture_path = tempfile.mkstemp(prefix="warm_kernel_", suffix=".out")
+        os.close(fd)
+        self._proc = subprocess.Popen(
+            [self.python, "-u", "-c", _KERNEL_SOURCE, self._capture_path, str(self.memory_limit_mb)],
+            cwd=self.work_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # SIGINTs sent to the terminal do not reach the kernel
+        )
+        self._buffer = b""
+        self._finalizer = weakref.finalize(self, WarmPythonExecutor._kill, self._proc, self._capture_path)
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen, capture_path: str):
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        for stream in (proc.stdin, proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        try:
+            os.remove(capture_path)
+        except FileNotFoundError:
+            pass
+
+    def stop(self):
+        """Terminates the kernel. The next Python block starts a new one."""
+        with self._lock:
+            if self._finalizer is not None:
+                self._finalizer()
+            self._proc = None
+
+    def restart(self):
+        """Restarts the kernel with a fresh state."""
+        self.stop()
+        self._crashes = 0
+
+    def _read_reply(self, timeout: float) -> Optional[dict]:
+        """Returns the kernel's next reply, or None on timeout. Raises KernelDiedError if the kernel exited."""
+        deadline = time.monotonic() + timeout
+        fd = self._proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise KernelDiedError(f"Kernel exited with code {self._proc.wait()}")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def _run_python(self, code: str) -> CodeResult:
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                if self._proc is not None:
+                    self._finalizer()
+                self._start()
+            request = {"code": code}
+            match = _FILENAME_RE.match(code)
+            if match:
+                # Like the command line executor, keep a copy of a named script in the work dir.
+                request["filename"] = match.group(1)
+                with open(os.path.join(self.work_dir, match.group(1)), "wt") as f:
+                    f.write(code)
+            try:
+                self._proc.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+                self._proc.stdin.flush()
+                reply = self._read_reply(self.timeout)
+                if reply is None:
+                    os.kill(self._proc.pid, signal.SIGINT)
+                    reply = self._read_reply(self.interrupt_grace)
+                    if reply is None:
+                        self._finalizer()
+                        self._proc = None
+                        return CodeResult(
+                            exit_code=124,
+                            output=f"Timeout: the block ran longer than {self.timeout}s. The kernel was restarted; variables and imports are lost.",
+                        )
+                self._crashes = 0
+                return CodeResult(exit_code=reply["exit_code"], output=reply["output"])
+            except (KernelDiedError, BrokenPipeError) as e:
+                self._finalizer()
+                self._proc = None
+                self._crashes += 1
+                if self._crashes > self.max_restarts:
+                    return CodeResult(exit_code=1, output=f"The Python kernel crashed ({e}) {self._crashes} times in a row; not restarting it.")
+                return CodeResult(exit_code=1, output=f"The Python kernel crashed ({e}), eg. out of memory. It is restarted for the next block; variables and imports are lost.")
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CodeResult:
+        """Runs the blocks in order, stopping at the first failure. Returns the combined output."""
+        outputs = []
+        exit_code = 0
+        for block in code_blocks:
+            language = block.language.lower()
+            if language in PYTHON_LANGUAGES:
+                if self._crashes > self.max_restarts:
+                    result = CodeResult(exit_code=1, output="The Python kernel is disabled after repeated crashes.")
+                else:
+                    result = self._run_python(block.code)
+            elif language in SHELL_LANGUAGES:
+                result = self._shell_executor.execute_code_blocks([block])
+            else:
+                result = CodeResult(exit_code=1, output=f"unknown language {block.language}")
+            outputs.append(result.output)
+            exit_code = result.exit_code
+            if exit_code != 0:
+                break
+        return CodeResult(exit_code=exit_code, output="".join(outputs))
@@ -0,0 +1,26 @@
+# web_researcher_stateflow.py -- StateFlow for self-contained research tasks, eg. the sub-tasks of a CompositeOrchestrator.
+#
+# Design Notes:
+#   - Same loop as DefaultOrchestratorStateFlow, but INIT takes a fixed research plan (search, read, derive, report)
+#     instead of asking the LLM for one: a research sub-task has no use for a bespoke plan, so this saves an LLM call
+#     (and its latency) per sub-task.
+#
+# Usage:
+#   orchestrator = Orchestrator("researcher", agents=team, llm_config=llm_config, state_flow_cls=WebResearcherStateFlow)
+
+from default_orchestrator_stateflow import DefaultOrchestratorStateFlow
+from abstract_orchestrator import AbstractOrchestrator
+
+
+class WebResearcherStateFlow(DefaultOrchestratorStateFlow):
+    """DefaultOrchestratorStateFlow with a fixed research plan. States are the same as the default flow's."""
+
+    def __init__(self, orchestrator: AbstractOrchestrator, extraction_method: str = None):
+        super().__init__(orchestrator, extraction_method=extraction_method)
+        _analyze_facts, _make_initial_plan = self.states["INIT"]
+
+        def _use_research_plan(messages, context):
+            METADATA = context["METADATA"]
+            METADATA["plan"] = self._prompt_templates["research_plan"].substitute(team=METADATA["team"]).strip()
+
+        self.states["INIT"] = [_analyze_facts, _use_research_plan]
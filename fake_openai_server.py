@@ -0,0 +1,276 @@
+# fake_openai_server.py: Local stand-in for the OpenAI chat completions API, for load tests and offline development.
+#   Replies are generated text with realistic token counts, after a latency drawn from a configurable distribution.
+#   Supports streaming (server-sent events), injected 429 rate-limit errors and GET /stats.
+#
+# Latency specs (seconds): "fixed:0.5", "uniform:0.2,1.5", "normal:1.0,0.3", "lognormal:0.0,0.5" (mu, sigma of
+#   the underlying normal), "exp:0.8" (mean).
+#
+# Usage:
+#   python fake_openai_server.py --port 8011 --latency lognormal:0.0,0.5 --tokens 60 --rate-limit-prob 0.05
+#   OAI_CONFIG_LIST='[{"model": "gpt-4-turbo-preview", "api_key": "sk-fake", "base_url": "http://localhost:8011/v1"}]'
+#
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+WORDS = (
+    "the agent reviewed the plan and suggests a short answer with one example so that the user can verify "
+    "each step quickly before we continue with the next part of the task"
+).split()
+SELECT_SPEAKER_RE = re.compile(r"select the next role from \[(.*?)\]", re.IGNORECASE | re.DOTALL)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Returns a sampler for a latency spec such as "lognormal:0.0,0.5" (see the header)."""
+    kind, _, args = spec.partition(":")
+    params = [float(a) for a in args.split(",") if a.strip()]
+    samplers = {
+        "fixed": (1, lambda r, p: p[0]),
+        "uniform": (2, lambda r, p: r.uniform(p[0], p[1])),
+        "normal": (2, lambda r, p: r.gauss(p[0], p[1])),
+        "lognormal": (2, lambda r, p: r.lognormvariate(p[0], p[1])),
+        "exp": (1, lambda r, p: r.expovariate(1.0 / p[0])),
+    }
+    if kind not in samplers or len(params) != samplers[kind][0]:
+        raise ValueError(f"Bad latency spec {spec!r}; expected eg. fixed:0.5, uniform:0.2,1.5, lognormal:0.0,0.5")
+    sample = samplers[kind][1]
+    return lambda r: max(0.0, sample(r, params))
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token."""
+    return max(1, (len(text) + 3) // 4)
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """Behaviour of the fake server:
+    - latency: spec of the time to the first token
+    - token_interval: seconds between streamed tokens (also added per token to non-streamed replies)
+    - completion_tokens: reply length, capped by the request's max_tokens
+    - rate_limit_prob: probability that a request fails with 429 (Retry-After: retry_after)
+    - seed: random seed, for reproducible runs
+    """
+
+    latency: str = "fixed:0.2"
+    token_interval: float = 0.0
+    completion_tokens: int = 40
+    rate_limit_prob: float = 0.0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeOpenAIStats:
+    requests: int = 0
+    streamed: int = 0
+    rate_limited: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    in_flight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **deltas):
+        with self.lock:
+            for k, v in deltas.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def as_dict(self) -> Dict:
+        with self.lock:
+            return {k: v for k, v in vars(self).items() if k != "lock"}
+
+
+def reply_text(messages: List[Dict], n_tokens: int, rng: random.Random) -> str:
+    """Generated reply. Answers a GroupChat speaker selection prompt with one of the offered role names."""
+    prompt = "\n".join(str(m.get("content") or "") for m in messages[-2:])
+    match = SELECT_SPEAKER_RE.search(prompt)
+    if match:
+        roles = [r.strip().strip("'\"") for r in match.group(1).split(",") if r.strip()]
+        if roles:
+            return rng.choice(roles)
+    words, length = [], 0
+    while length < n_tokens:
+        words.append(rng.choice(WORDS))
+        length = count_tokens(" ".join(words))
+    return " ".join(words).capitalize() + "."
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer serving /v1/chat/completions, /v1/models and /stats."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8011), config: Optional[FakeOpenAIConfig] = None):
+        self.config = config or FakeOpenAIConfig()
+        self.stats = FakeOpenAIStats()
+        self.sample_latency = parse_latency(self.config.latency)
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        super().__init__(address, _Handler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw(self, fn: Callable[[random.Random], object]):
+        with self._rng_lock:
+            return fn(self._rng)
+
+    def start(self) -> "FakeOpenAIServer":
+        """Serves on a daemon thread."""
+        threading.Thread(target=self.serve_forever, name="fake_openai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]})
+        elif path == "/stats":
+            self._send_json(200, self.server.stats.as_dict())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        if not self.path.split("?", 1)[0].rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        server, config = self.server, self.server.config
+        server.stats.add(requests=1, in_flight=1)
+        try:
+            if config.rate_limit_prob and server.draw(lambda r: r.random()) < config.rate_limit_prob:
+                server.stats.add(rate_limited=1)
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                    {"Retry-After": f"{config.retry_after:g}"},
+                )
+                return
+            self._complete(request)
+        finally:
+            server.stats.add(in_flight=-1)
+
+    def _complete(self, request: Dict):
+        server, config = self.server, self.server.config
+        messages = request.get("messages") or []
+        model = request.get("model") or "fake"
+        n_tokens = config.completion_tokens
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens")
+        if max_tokens:
+            n_tokens = min(n_tokens, int(max_tokens))
+        text = server.draw(lambda r: reply_text(messages, n_tokens, r))
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) + 4 for m in messages)
+        completion_tokens = count_tokens(text)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        server.stats.add(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        time.sleep(server.draw(server.sample_latency))
+        if not request.get("stream"):
+            time.sleep(config.token_interval * completion_tokens)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        server.stats.add(streamed=1)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict, finish_reason=None, **extra):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            event({"role": "assistant", "content": ""})
+            pieces = re.findall(r"\S+\s*", text)
+            for piece in pieces:
+                event({"content": piece})
+                if config.token_interval:
+                    time.sleep(config.token_interval * count_tokens(piece))
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            event({}, "stop", **({"usage": usage} if include_usage else {}))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", default="fixed:0.2", help="Time to first token, eg. lognormal:0.0,0.5")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--tokens", type=int, default=40, help="Completion tokens per reply")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = FakeOpenAIConfig(
+        latency=args.latency, token_interval=args.token_interval, completion_tokens=args.tokens,
+        rate_limit_prob=args.rate_limit_prob, retry_after=args.retry_after, seed=args.seed,
+    )
+    server = FakeOpenAIServer((args.host, args.port), config)
+    print(f"Fake OpenAI server at {server.base_url} ({config})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stats: {server.stats.as_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# load_test_gui.py: Multi-user load test for AutoGenGuiChat, against the local fake OpenAI server (no API quota used).
+#   Runs N simulated Panel sessions in one process and one event loop, as `panel serve` does: each session executes
+#   AutoGenGuiChat.py (like Panel does per browser session) and its user types messages through
+#   AutoGenChatView.callback. Reports:
+#   - time to first message: from the user's first message to the first agent message shown in the chat
+#       (includes the app's own 2s delay before initiating the chat)
+#   - reply time: from a user's answer to the next request for human input
+#   - event loop lag: how late a 50ms timer fires (high lag = a sluggish UI for every session)
+#   - memory: RSS growth per session, after creating the sessions and after chatting
+#
+# Usage:
+#   python load_test_gui.py --sessions 20 --turns 3 --latency lognormal:0.0,0.5 --ramp 5
+#   python load_test_gui.py --base-url http://localhost:8011/v1   # an already running fake_openai_server.py
+#
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import runpy
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "AutoGenGuiChat.py")
+MODEL = "gpt-4-turbo-preview"  # AutoGenGuiChat filters its config list on this model
+LAG_INTERVAL = 0.05
+
+
+@dataclass
+class SessionResult:
+    index: int
+    time_to_first_message: Optional[float] = None
+    reply_times: List[float] = field(default_factory=list)
+    messages: int = 0
+    error: Optional[str] = None
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"count": len(values), "mean": statistics.fmean(values), "p50": pick(0.5), "p95": pick(0.95), "max": values[-1]}
+
+
+async def monitor_event_loop(lags: List[float], stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(loop.time() - start - LAG_INTERVAL)
+
+
+def create_session(index: int) -> Dict:
+    """Executes the app like Panel does for a new browser session; returns its globals."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return runpy.run_path(APP, run_name=f"load_test_session_{index}")
+
+
+async def wait_for(predicate, timeout: float, poll: float = 0.02):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(poll)
+
+
+async def run_session(index: int, app: Dict, args, result: SessionResult):
+    view = app["autogen_chat_view"]
+    first_message = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    send = view.chat_interface.send
+
+    def counting_send(value, user=None, **kwargs):
+        if user not in (None, "System", "User"):
+            result.messages += 1
+            loop.call_soon_threadsafe(first_message.set)
+        return send(value, user=user, **kwargs)
+
+    view.chat_interface.send = counting_send
+    awaiting_input = lambda: view.input_future is not None and not view.input_future.done()
+    try:
+        start = time.perf_counter()
+        await view.callback(args.message, "User", view.chat_interface)
+        await asyncio.wait_for(first_message.wait(), args.timeout)
+        result.time_to_first_message = time.perf_counter() - start
+        await wait_for(awaiting_input, args.timeout)
+        for turn in range(1, args.turns):
+            await asyncio.sleep(args.think_time)
+            answered = view.input_future
+            start = time.perf_counter()
+            await view.callback(f"{args.message} (turn {turn + 1})", "User", view.chat_interface)
+            await wait_for(lambda: view.input_future is not answered and awaiting_input(), args.timeout)
+            result.reply_times.append(time.perf_counter() - start)
+    except (TimeoutError, asyncio.TimeoutError):
+        result.error = "timeout"
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        task = view.initiate_chat_task
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(BaseException):
+                await task
+
+
+async def run_load_test(args) -> Dict:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_event_loop(lags, stop))
+
+    import autogen, panel, AutoGenChatView  # noqa: F401 -- shared by all sessions: not part of their memory
+
+    rss_start = rss_bytes()
+    apps = [create_session(i) for i in range(args.sessions)]
+    rss_created = rss_bytes()
+
+    results = [SessionResult(i) for i in range(args.sessions)]
+    started = time.perf_counter()
+    tasks = []
+    for i, app in enumerate(apps):
+        tasks.append(asyncio.create_task(run_session(i, app, args, results[i])))
+        if args.ramp and args.sessions > 1:
+            await asyncio.sleep(args.ramp / (args.sessions - 1))
+    with contextlib.redirect_stdout(io.StringIO()):  # The app prints every message
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    rss_done = rss_bytes()
+    stop.set()
+    await monitor
+
+    ttfm = [r.time_to_first_message for r in results if r.time_to_first_message is not None]
+    return {
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "elapsed_s": elapsed,
+        "errors": {r.index: r.error for r in results if r.error},
+        "agent_messages": sum(r.messages for r in results),
+        "time_to_first_message_s": percentiles(ttfm),
+        "reply_time_s": percentiles([t for r in results for t in r.reply_times]),
+        "event_loop_lag_s": percentiles(lags),
+        "memory": {
+            "rss_start_mb": rss_start / 2**20,
+            "per_session_created_mb": (rss_created - rss_start) / 2**20 / max(1, args.sessions),
+            "per_session_after_chat_mb": (rss_done - rss_start) / 2**20 / max(1, args.sessions),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test AutoGenGuiChat with simulated Panel sessions.")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3, help="User messages per session")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which the sessions are started")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Seconds a user waits before answering")
+    parser.add_argument("--message", default="tell a joke")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for any one reply")
+    parser.add_argument("--base-url", default=None, help="Use this OpenAI-compatible server instead of starting one")
+    parser.add_argument("--latency", default="lognormal:-0.5,0.5", help="Fake server latency, see fake_openai_server.py")
+    parser.add_argument("--tokens", type=int, default=40, help="Fake server completion tokens")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Fake server 429 probability")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        from fake_openai_server import FakeOpenAIConfig, FakeOpenAIServer
+
+        config = FakeOpenAIConfig(
+            latency=args.latency, completion_tokens=args.tokens, rate_limit_prob=args.rate_limit_prob, seed=args.seed
+        )
+        server = FakeOpenAIServer(("127.0.0.1", 0), config).start()
+        base_url = server.base_url
+
+    # autogen.config_list_from_json() accepts the config list itself in the environment variable.
+    os.environ["OAI_CONFIG_LIST"] = json.dumps([{"model": MODEL, "api_key": "sk-fake", "base_url": base_url}])
+    os.environ.setdefault("AUTOGEN_METRICS_PORT", "0")
+    sys.path.insert(0, HERE)
+
+    try:
+        report = asyncio.run(run_load_test(args))
+    finally:
+        if server is not None:
+            server.stop()
+    if server is not None:
+        report["fake_server"] = server.stats.as_dict()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
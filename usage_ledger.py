@@ -0,0 +1,175 @@
+# usage_ledger.py: Incremental LLM token/cost ledger, broken down by session, agent, model, orchestrator call site
+#       and state.
+#   Every completion is recorded once, as it happens: the entry for its labels and one running total per label
+#   (and the grand total) are updated, so totals are O(1) no matter how long the conversation gets. Subscribers
+#   receive each delta, eg. to update the UI or the metrics endpoint (see AutoGenChatView.on_usage).
+#   Completions get into the ledger in two ways:
+#   - track_agent(agent) wraps the agent's OpenAIWrapper.create (AutoGen agents, GroupChatManager, ...).
+#   - The ledger is also a span sink (duck typed, see Orchestrator-StateFlow/instrumentation.py): pass it to the
+#       Orchestrator's Tracer to record its "orchestrator.llm" and "agent.reply" spans with their session,
+#       call site and state. Don't also track_agent() the agents of such an Orchestrator: that counts twice.
+#
+# Usage:
+#   ledger = UsageLedger()
+#   ledger.track_agent(assistant, session="s1")
+#   ledger.subscribe(lambda delta: print(delta))
+#   ledger.total(agent="Assistant").total_tokens
+#   ledger.breakdown("model")
+#
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+LABELS = ("session", "agent", "model", "call_site", "state")
+
+
+@dataclass
+class Usage:
+    """Accumulated usage of a set of completions."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost += other.cost
+
+    def as_dict(self) -> Dict:
+        return dict(asdict(self), total_tokens=self.total_tokens)
+
+
+class UsageLedger:
+    """Running usage totals. record() is O(1); so are total() with at most one label and breakdown()."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, ...], Usage] = {}  # (session, agent, model, call_site, state) -> usage
+        self._rollups: Dict[Tuple[str, str], Usage] = {}  # (label, value) -> usage; ("", "") is the grand total
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._open_spans: Dict[str, Tuple[str, str]] = {}  # span id -> (session, state)
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[Dict], None]):
+        """listener(delta) is called after each record() with the labels and the usage of that completion."""
+        self._listeners.append(listener)
+
+    def record(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost: float = 0.0,
+        session: str = "",
+        agent: str = "",
+        model: str = "",
+        call_site: str = "",
+        state: str = "",
+    ) -> Dict:
+        """Records one completion. Returns the delta passed to the subscribers."""
+        usage = Usage(1, int(prompt_tokens or 0), int(completion_tokens or 0), float(cost or 0.0))
+        labels = (session, agent, model, call_site, state)
+        with self._lock:
+            entry = self._entries.get(labels)
+            if entry is None:
+                entry = self._entries[labels] = Usage()
+            entry.add(usage)
+            for rollup in zip(("",) + LABELS, ("",) + labels):
+                total = self._rollups.get(rollup)
+                if total is None:
+                    total = self._rollups[rollup] = Usage()
+                total.add(usage)
+        delta = dict(zip(LABELS, labels), **usage.as_dict())
+        for listener in list(self._listeners):
+            try:
+                listener(delta)
+            except Exception:
+                log.exception("Usage ledger listener failed")
+        return delta
+
+    def record_response(self, response, **labels) -> Optional[Dict]:
+        """Records an OpenAI(Wrapper) response: its usage, model and, if AutoGen estimated it, its cost."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        labels.setdefault("model", getattr(response, "model", None) or "")
+        return self.record(
+            getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), getattr(response, "cost", 0.0), **labels
+        )
+
+    def total(self, **labels) -> Usage:
+        """Usage of the completions matching labels (eg. session="s1", agent="Assistant"), or of all of them.
+        One label (or none) is a lookup; more labels scan the distinct label combinations."""
+        unknown = set(labels) - set(LABELS)
+        if unknown:
+            raise ValueError(f"Unknown labels: {sorted(unknown)}")
+        with self._lock:
+            if len(labels) <= 1:
+                (rollup,) = labels.items() if labels else (("", ""),)
+                return Usage(**asdict(self._rollups.get(rollup, Usage())))
+            result = Usage()
+            for key, usage in self._entries.items():
+                entry_labels = dict(zip(LABELS, key))
+                if all(entry_labels[k] == v for k, v in labels.items()):
+                    result.add(usage)
+            return result
+
+    def breakdown(self, label: str) -> Dict[str, Usage]:
+        """Usage per value of label, eg. breakdown("agent") -> {"Assistant": Usage(...), ...}."""
+        if label not in LABELS:
+            raise ValueError(f"Unknown label: {label}")
+        with self._lock:
+            return {value: Usage(**asdict(usage)) for (name, value), usage in self._rollups.items() if name == label}
+
+    def track_agent(self, agent, session: str = "", call_site: str = "generate_reply"):
+        """Records every completion of agent's client (an autogen OpenAIWrapper) from now on."""
+        client = getattr(agent, "client", None)
+        if client is None or getattr(client, "_usage_ledger", None) is self:
+            return
+        create = client.create
+
+        def tracked_create(*args, **kwargs):
+            response = create(*args, **kwargs)
+            self.record_response(response, session=session, agent=agent.name, call_site=call_site)
+            return response
+
+        client.create = tracked_create
+        client._usage_ledger = self
+
+    # --- span sink (see Orchestrator-StateFlow/instrumentation.py) ---
+
+    def on_start(self, span):
+        a = span.attributes
+        with self._lock:
+            session, state = self._open_spans.get(span.parent_id, ("", ""))
+            if span.name == "orchestrator.session":
+                session = a.get("session_id", "")
+            elif span.name == "stateflow.state":
+                state = a.get("state", "")
+            self._open_spans[span.span_id] = (session, state)
+
+    def export(self, span):
+        with self._lock:
+            session, state = self._open_spans.pop(span.span_id, ("", ""))
+        a = span.attributes
+        if span.name == "orchestrator.llm" or (span.name == "agent.reply" and "prompt_tokens" in a):
+            if span.name == "agent.reply" and not (a["prompt_tokens"] or a.get("completion_tokens")):
+                return  # The agent replied without calling its LLM
+            self.record(
+                a.get("prompt_tokens", 0),
+                a.get("completion_tokens", 0),
+                a.get("cost", 0.0),
+                session=session,
+                agent=a.get("agent", ""),
+                model=a.get("model", ""),
+                call_site=a.get("call_site", "agent_reply"),
+                state=state,
+            )